@@ -0,0 +1,155 @@
+"""
+Поиск товаров под WSGI и ASGI: ProductSearchView в пуле потоков WSGI-сервера (как gunicorn --threads)
+против того же представления и AsyncProductSearchView под uvicorn в одном процессе.
+Django 4.2 выполняет синхронный код каждого ASGI-запроса в своем потоке (ThreadSensitiveContext на запрос),
+поэтому запросы к базе разных запросов не выстраиваются в одну очередь, но поток и его соединение с базой
+живут один запрос - постоянные соединения под ASGI не переиспользуются.
+Нагрузку дает отдельный процесс (httpx, без keep-alive для обоих серверов).
+Запуск: python -m pytest benchmarks/bench_asgi.py -s
+Параметры: BENCH_SHOPS (магазинов, по умолчанию 5), BENCH_GOODS (товаров в магазине, 2000),
+BENCH_REQUESTS (запросов на сценарий, 1000), BENCH_CONCURRENCY (одновременных запросов, 32),
+BENCH_THREADS (потоков WSGI-сервера, 8).
+"""
+import asyncio
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import httpx
+import pytest
+from django.core.asgi import get_asgi_application
+from django.core.servers.basehttp import WSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connections, DEFAULT_DB_ALIAS
+from benchmarks.catalog import generate_catalog
+from shop_backend.importer import CatalogImporter
+from shop_backend.models import User, Shop
+
+uvicorn = pytest.importorskip('uvicorn')
+
+SHOPS = int(os.environ.get('BENCH_SHOPS', 5))
+GOODS_COUNT = int(os.environ.get('BENCH_GOODS', 2000))
+REQUESTS = int(os.environ.get('BENCH_REQUESTS', 1000))
+CONCURRENCY = int(os.environ.get('BENCH_CONCURRENCY', 32))
+THREADS = int(os.environ.get('BENCH_THREADS', 8))
+WARMUP = 50
+QUERY = {'category_id': 1001, 'parameter': 'Цвет:черный', 'limit': 20}
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """
+    WSGI-сервер с постоянным пулом потоков: соединение с базой живет в потоке и переиспользуется
+    """
+
+    def __init__(self, *args, threads, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = ThreadPoolExecutor(threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def wsgi_server():
+    server = PooledWSGIServer(('127.0.0.1', 0), QuietHandler, threads=THREADS)
+    server.set_app(get_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.pool.shutdown()
+
+
+@contextmanager
+def asgi_server():
+    # соединение ASGI-запроса не переиспользуется, поэтому под ASGI постоянные соединения выключают
+    database = connections.settings[DEFAULT_DB_ALIAS]
+    conn_max_age, database['CONN_MAX_AGE'] = database['CONN_MAX_AGE'], 0
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(get_asgi_application(), host='127.0.0.1', port=port,
+                                           log_level='warning', lifespan='off'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f'http://127.0.0.1:{port}'
+    server.should_exit = True
+    thread.join()
+    database['CONN_MAX_AGE'] = conn_max_age
+
+
+@pytest.fixture
+def seeded(settings):
+    settings.THROTTLE_RATES = {}
+    for index in range(SHOPS):
+        owner = User.objects.create(email=f'shop{index}@store.ru', type='shop', is_active=True)
+        shop = Shop.objects.create(user=owner, name=f'Магазин {index}', state=True)
+        catalog = generate_catalog(GOODS_COUNT, seed=index)
+        CatalogImporter(shop).run(catalog['categories'], catalog['goods'])
+
+
+def load(url, requests_count, concurrency):
+    """
+    Выполняется в отдельном процессе: requests_count запросов по concurrency одновременно,
+    возвращаем (время, отсортированные задержки)
+    """
+    async def run():
+        latencies = []
+        numbers = iter(range(requests_count))
+        limits = httpx.Limits(max_keepalive_connections=0)
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+            async def worker():
+                for _ in numbers:
+                    start = time.perf_counter()
+                    response = await client.get(url, params=QUERY)
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return time.perf_counter() - start, sorted(latencies)
+
+    return asyncio.run(run())
+
+
+def measure(name, url):
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('fork')) as executor:
+        executor.submit(load, url, WARMUP, CONCURRENCY).result()
+        elapsed, latencies = executor.submit(load, url, REQUESTS, CONCURRENCY).result()
+    p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+    print(f'{name}: {len(latencies)} requests in {elapsed:.2f}s, {len(latencies) / elapsed:.0f} req/s, '
+          f'p50 {p50 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bench_asgi(seeded):
+    print()
+    with wsgi_server() as url:
+        measure(f'WSGI, threads x{THREADS}, sync view', url + '/api/v1/product/search')
+    with asgi_server() as url:
+        measure('ASGI, sync view', url + '/api/v1/product/search')
+        measure('ASGI, async view', url + '/api/v1/product/search/async')
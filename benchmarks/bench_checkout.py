@@ -0,0 +1,61 @@
+"""
+Бенчмарк оформления заказов под конкуренцией: много покупателей одновременно покупают один товар.
+Запуск: python -m pytest benchmarks/bench_checkout.py -s
+Параметры: BENCH_BUYERS (покупателей, по умолчанию 200), BENCH_STOCK (остаток, 50), BENCH_THREADS (потоков, 16).
+"""
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.db import connection
+from shop_backend.checkout import checkout, CheckoutError
+from shop_backend.models import User, Shop, Category, Product, ProductInfo, Order, OrderItem, Contact
+
+BUYERS = int(os.environ.get('BENCH_BUYERS', 200))
+STOCK = int(os.environ.get('BENCH_STOCK', 50))
+THREADS = int(os.environ.get('BENCH_THREADS', 16))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bench_checkout():
+    shop_user = User.objects.create_user(email='bench@store.ru', password='bench', type='shop')
+    shop = Shop.objects.create(user=shop_user, name='Бенчмарк')
+    product = Product.objects.create(name='Горячий товар', category=Category.objects.create(name='Бенчмарк'))
+    info = ProductInfo.objects.create(product=product, shop=shop, external_id=1, model='hot', quantity=STOCK,
+                                      price=1000, price_rrc=1000)
+    baskets = []
+    for index in range(BUYERS):
+        user = User.objects.create(email=f'buyer{index}@mail.ru', is_active=True)
+        contact = Contact.objects.create(user=user, city='Moskow', street='Lenin', phone='+7777777777')
+        order = Order.objects.create(user=user, state='basket')
+        OrderItem.objects.create(order=order, product_info=info, shop=shop, quantity=1)
+        baskets.append((user.id, order.id, contact.id))
+
+    def buy(basket):
+        start = time.perf_counter()
+        try:
+            placed = checkout(*basket)
+        except CheckoutError:
+            placed = False
+        finally:
+            connection.close()
+        return placed, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(buy, baskets))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for _, latency in results)
+    sold = sum(placed for placed, _ in results)
+    info.refresh_from_db()
+    oversell = sold - STOCK if sold > STOCK else 0
+    print(f'\ncheckout: {BUYERS} buyers, {THREADS} threads, stock {STOCK}: sold {sold}, oversell {oversell}, '
+          f'{BUYERS / elapsed:.0f} checkouts/s, latency p50 {statistics.median(latencies) * 1000:.1f} ms, '
+          f'p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms')
+    assert oversell == 0
+    assert sold == min(STOCK, BUYERS)
+    assert info.quantity == STOCK - sold
+    assert Order.objects.filter(state='new').count() == sold
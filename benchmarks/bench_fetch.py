@@ -0,0 +1,104 @@
+"""
+Нагрузочный тест скачивания прайсов: потоковый воркер (requests, по потоку на скачивание)
+против асинхронного (httpx, одна петля событий на все скачивания) на локальном медленном сервере поставщика.
+Запуск: python -m pytest benchmarks/bench_fetch.py -s
+Параметры: BENCH_JOBS (задач, по умолчанию 40), BENCH_DELAY (сколько сервер отдает один прайс, 1.0 с),
+BENCH_GOODS (товаров в прайсе, 50), BENCH_THREADS (потоков импорта у обоих воркеров, 4).
+"""
+import asyncio
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+from django.db import connection
+from ujson import dumps as json_dump
+from benchmarks.catalog import generate_catalog
+from shop_backend import jobs
+from shop_backend.models import User, ImportJob
+
+JOBS = int(os.environ.get('BENCH_JOBS', 40))
+DELAY = float(os.environ.get('BENCH_DELAY', 1.0))
+GOODS_COUNT = int(os.environ.get('BENCH_GOODS', 50))
+THREADS = int(os.environ.get('BENCH_THREADS', 4))
+CHUNKS = 10
+
+
+def ndjson_catalog():
+    catalog = generate_catalog(GOODS_COUNT)
+    lines = [json_dump({'shop': catalog['shop'], 'categories': catalog['categories']}, ensure_ascii=False)]
+    lines += [json_dump(item, ensure_ascii=False) for item in catalog['goods']]
+    return '\n'.join(lines).encode()
+
+
+@pytest.fixture
+def supplier():
+    """
+    Сервер поставщика отдает прайс частями в течение DELAY секунд
+    """
+    body = ndjson_catalog()
+    step = len(body) // CHUNKS + 1
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            for offset in range(0, len(body), step):
+                time.sleep(DELAY / CHUNKS)
+                self.wfile.write(body[offset:offset + step])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/catalog.jsonl'
+    server.shutdown()
+
+
+def enqueue(url, prefix):
+    for index in range(JOBS):
+        user = User.objects.create(email=f'{prefix}{index}@store.ru', type='shop', is_active=True)
+        jobs.enqueue_import(user, url)
+
+
+def run_threads():
+    def worker():
+        try:
+            jobs.work(once=True)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def measure(name, run):
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    done = ImportJob.objects.filter(state='done').count()
+    print(f'{name}: {done} jobs in {elapsed:.2f}s, {done / elapsed:.1f} jobs/s')
+    assert done == JOBS
+    ImportJob.objects.all().delete()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bench_fetch(supplier):
+    print()
+    enqueue(supplier, 'threads')
+    measure(f'threads x{THREADS}', run_threads)
+
+    enqueue(supplier, 'async')
+    measure(f'async, import threads x{THREADS}',
+            lambda: asyncio.run(jobs.work_async(concurrency=JOBS, import_workers=THREADS, once=True)))
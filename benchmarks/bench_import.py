@@ -0,0 +1,31 @@
+"""
+Бенчмарк пакетного импорта прайс-листа.
+Запуск: python -m pytest benchmarks/bench_import.py -s
+Размер каталога задается переменной окружения BENCH_GOODS (по умолчанию 50000).
+"""
+import os
+import time
+
+import pytest
+from benchmarks.catalog import generate_catalog
+from shop_backend.importer import CatalogImporter
+from shop_backend.models import User, Shop, ProductInfo, ProductParameter
+
+GOODS_COUNT = int(os.environ.get('BENCH_GOODS', 50000))
+
+
+@pytest.mark.django_db
+def test_bench_import():
+    catalog = generate_catalog(GOODS_COUNT)
+    user = User.objects.create_user(email='bench@store.ru', password='bench', type='shop')
+    shop = Shop.objects.create(user_id=user.id, name=catalog['shop'])
+
+    start = time.perf_counter()
+    stats = CatalogImporter(shop).run(catalog['categories'], catalog['goods'])
+    elapsed = time.perf_counter() - start
+
+    rows = stats['goods'] + stats['parameters']
+    print(f'\nimport: {stats["goods"]} goods, {stats["parameters"]} parameters in {elapsed:.2f}s, '
+          f'{rows / elapsed:.0f} rows/s')
+    assert ProductInfo.objects.filter(shop=shop).count() == GOODS_COUNT
+    assert ProductParameter.objects.filter(product_info__shop=shop).count() == stats['parameters']
@@ -0,0 +1,110 @@
+"""
+Проверка плана индексов: на засеянной базе каждый горячий запрос API и импорта должен идти через индекс.
+Запуск: python -m pytest benchmarks/bench_indexes.py -s
+Объем данных: BENCH_SHOPS (магазинов, по умолчанию 10), BENCH_GOODS (товаров в магазине, 2000),
+BENCH_BUYERS (покупателей, 2000; у каждого 10 заказов и корзина).
+"""
+import os
+from datetime import timedelta
+
+import pytest
+import ujson
+from django.db import connection
+from django.utils import timezone
+from benchmarks.catalog import generate_catalog
+from shop_backend.importer import CatalogImporter
+from shop_backend.models import User, Shop, Product, ProductInfo, Order, ShopOrder, PriceHistory
+
+SHOPS = int(os.environ.get('BENCH_SHOPS', 10))
+GOODS_COUNT = int(os.environ.get('BENCH_GOODS', 2000))
+BUYERS = int(os.environ.get('BENCH_BUYERS', 2000))
+ORDERS_PER_BUYER = 10
+
+SCAN_NODES = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+
+
+def plan_indexes(queryset):
+    """
+    Возвращаем (использованные индексы, таблицы, прочитанные последовательным сканированием)
+    """
+    plans = [ujson.loads(queryset.explain(format='json'))[0]['Plan']]
+    indexes, seq_scans = set(), set()
+    while plans:
+        plan = plans.pop()
+        if plan['Node Type'] in SCAN_NODES:
+            indexes.add(plan['Index Name'])
+        elif plan['Node Type'] == 'Seq Scan':
+            seq_scans.add(plan['Relation Name'])
+        plans.extend(plan.get('Plans', []))
+    return indexes, seq_scans
+
+
+@pytest.fixture
+def seeded():
+    shops = []
+    for index in range(SHOPS):
+        owner = User.objects.create(email=f'shop{index}@store.ru', type='shop', is_active=True)
+        shop = Shop.objects.create(user=owner, name=f'Магазин {index}', state=True)
+        catalog = generate_catalog(GOODS_COUNT, seed=index)
+        CatalogImporter(shop).run(catalog['categories'], catalog['goods'])
+        shops.append(shop)
+    buyers = User.objects.bulk_create([User(email=f'buyer{index}@mail.ru', username=f'buyer{index}')
+                                       for index in range(BUYERS)])
+    now = timezone.now()
+    Order.objects.bulk_create([Order(user=buyer, state='basket' if number == 0 else 'new')
+                               for buyer in buyers for number in range(ORDERS_PER_BUYER + 1)])
+    # разносим заказы по времени, иначе у всех одна дата
+    with connection.cursor() as cursor:
+        cursor.execute("UPDATE shop_backend_order SET dt = %s - id * interval '1 minute'", [now])
+        cursor.execute("UPDATE shop_backend_pricehistory SET dt = %s - id * interval '1 second'", [now])
+        # каждый оформленный заказ раскладываем на части двух магазинов
+        cursor.execute("""
+            INSERT INTO shop_backend_shoporder (order_id, shop_id, state, dt, total_sum, items_count)
+            SELECT ord.id, shop.id, ord.state, ord.dt, 1000, 1
+            FROM shop_backend_order ord
+            JOIN shop_backend_shop shop ON shop.id IN (%s + ord.id %% %s, %s + (ord.id + 1) %% %s)
+            WHERE ord.state <> 'basket'
+        """, [shops[0].id, SHOPS, shops[0].id, SHOPS])
+        cursor.execute('ANALYZE')
+    return shops, buyers, catalog, now
+
+
+@pytest.mark.django_db
+def test_index_plan(seeded):
+    shops, buyers, catalog, now = seeded
+    shop, buyer = shops[-1], buyers[len(buyers) // 2]
+    external_ids = [item['id'] for item in catalog['goods'][:1000]]
+    names = {item['name'] for item in catalog['goods'][:1000]}
+    categories = {item['category'] for item in catalog['goods'][:1000]}
+
+    # (запрос, допустимые индексы)
+    queries = {
+        'basket': (Order.objects.filter(user_id=buyer.id, state='basket'), {'order_user_state'}),
+        'user_orders': (Order.objects.filter(user_id=buyer.id).exclude(state='basket').order_by('-dt'),
+                        {'order_user_state'}),
+        'orders_by_state': (Order.objects.filter(state='new').order_by('-dt')[:50],
+                            {'order_state_dt'}),
+        'shop_feed': (ShopOrder.objects.filter(shop_id=shop.id, dt__gt=now - timedelta(hours=1)).order_by(
+            'dt', 'id')[:50], {'shop_order_feed'}),
+        'shop_orders_by_state': (ShopOrder.objects.filter(shop_id=shop.id, state='new').order_by('-dt')[:50],
+                                 {'shop_order_state', 'shop_order_feed'}),
+        'price_at': (PriceHistory.objects.filter(product_info_id=ProductInfo.objects.filter(shop=shop).first().id,
+                                                 dt__lte=now).order_by('-dt', '-id')[:1], {'price_history_sku'}),
+        'price_window': (PriceHistory.objects.filter(shop_id=shop.id, dt__gte=now - timedelta(minutes=5),
+                                                     dt__lt=now).order_by('dt', 'id')[:100], {'price_history_dt'}),
+        'shop_products': (ProductInfo.objects.filter(shop_id=shop.id, shop__state=True).order_by('id')[:21],
+                          {'product_info_shop'}),
+        'import_infos': (ProductInfo.objects.filter(shop_id=shop.id, external_id__in=external_ids),
+                         {'unique_product_info_external'}),
+        'import_products': (Product.objects.filter(name__in=names, category_id__in=categories),
+                            {'product_name_category'}),
+    }
+    print()
+    failures = []
+    for name, (queryset, expected) in queries.items():
+        indexes, seq_scans = plan_indexes(queryset)
+        print(f'{name}: indexes {sorted(indexes)}, seq scans {sorted(seq_scans)}')
+        table = queryset.model._meta.db_table
+        if not indexes & expected or table in seq_scans:
+            failures.append(name)
+    assert not failures, f'запросы без ожидаемого индекса: {failures}'
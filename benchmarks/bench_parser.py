@@ -0,0 +1,85 @@
+"""
+Бенчмарк разбора прайса: загрузка документа целиком через yaml.Loader против потокового чтения.
+Запуск: python -m pytest benchmarks/bench_parser.py -s
+Размер прайса задается переменной окружения BENCH_GOODS (по умолчанию 100000).
+"""
+import multiprocessing
+import os
+import resource
+import time
+
+import ujson
+from yaml import load as yaml_load, Loader
+from benchmarks.catalog import generate_catalog
+from shop_backend.parsers import YamlCatalogReader, NdjsonCatalogReader
+
+GOODS_COUNT = int(os.environ.get('BENCH_GOODS', 100000))
+
+
+def write_yaml(path, catalog):
+    with open(path, 'w') as f:
+        f.write(f'shop: {catalog["shop"]}\n\ncategories:\n')
+        for category in catalog['categories']:
+            f.write(f'  - id: {category["id"]}\n    name: {category["name"]}\n')
+        f.write('\ngoods:\n')
+        for item in catalog['goods']:
+            f.write(f'  - id: {item["id"]}\n    category: {item["category"]}\n    model: {item["model"]}\n'
+                    f'    name: {item["name"]}\n    price: {item["price"]}\n    price_rrc: {item["price_rrc"]}\n'
+                    f'    quantity: {item["quantity"]}\n    parameters:\n')
+            for name, value in item['parameters'].items():
+                f.write(f'      "{name}": {value}\n')
+
+
+def write_ndjson(path, catalog):
+    with open(path, 'w') as f:
+        f.write(ujson.dumps({'shop': catalog['shop'], 'categories': catalog['categories']}, ensure_ascii=False))
+        for item in catalog['goods']:
+            f.write('\n' + ujson.dumps(item, ensure_ascii=False))
+
+
+def _run(parse, queue):
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    count = parse()
+    elapsed = time.perf_counter() - start
+    queue.put((count, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before))
+
+
+def measure(label, parse):
+    """
+    Каждый разбор запускаем в отдельном процессе, чтобы прирост пиковой памяти не смешивался
+    """
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    process = context.Process(target=_run, args=(parse, queue))
+    process.start()
+    count, elapsed, rss_growth = queue.get()
+    process.join()
+    print(f'{label}: {count} goods in {elapsed:.2f}s, {count / elapsed:.0f} goods/s, '
+          f'peak memory growth {rss_growth / 1024:.1f} MiB')
+    return count
+
+
+def test_bench_parser(tmp_path):
+    catalog = generate_catalog(GOODS_COUNT)
+    yaml_path, ndjson_path = tmp_path / 'price.yaml', tmp_path / 'price.jsonl'
+    write_yaml(yaml_path, catalog)
+    write_ndjson(ndjson_path, catalog)
+    del catalog
+    print()
+
+    def full_load():
+        with open(yaml_path, 'rb') as f:
+            return len(yaml_load(f.read(), Loader=Loader)['goods'])
+
+    def stream(reader_class, path):
+        def parse():
+            with open(path, 'rb') as f:
+                reader = reader_class(f)
+                reader.read_header()
+                return sum(1 for _ in reader.goods())
+        return parse
+
+    assert measure('yaml.Loader, whole document', full_load) == GOODS_COUNT
+    assert measure('YamlCatalogReader, streaming', stream(YamlCatalogReader, yaml_path)) == GOODS_COUNT
+    assert measure('NdjsonCatalogReader, streaming', stream(NdjsonCatalogReader, ndjson_path)) == GOODS_COUNT
@@ -0,0 +1,56 @@
+"""
+Бенчмарк отрисовки товаров и заказов: сериализаторы DRF против быстрого пути из shop_backend.payloads.
+Запуск: python -m pytest benchmarks/bench_serialization.py -s
+Количество строк задается переменной окружения BENCH_ROWS (по умолчанию 5000).
+"""
+import os
+import time
+
+import pytest
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from benchmarks.catalog import generate_catalog
+from shop_backend.importer import CatalogImporter
+from shop_backend.models import User, Shop, ProductInfo, ProductParameter, Order, OrderItem
+from shop_backend.payloads import PRODUCT_INFO_FIELDS, ORDER_FIELDS, product_infos, orders, render_json
+from shop_backend.serializers import ProductInfoSerializer, OrderSerializer
+
+ROWS = int(os.environ.get('BENCH_ROWS', 5000))
+# быстрый путь отдает связанные строки по id, сериализаторам задаем тот же порядок
+PARAMETERS = Prefetch('product_parameters', ProductParameter.objects.select_related('parameter').order_by('id'))
+ITEMS = Prefetch('ordered_items', OrderItem.objects.order_by('id'))
+
+
+def measure(name, rows, render):
+    start = time.perf_counter()
+    body = render()
+    elapsed = time.perf_counter() - start
+    print(f'{name}: {rows} rows in {elapsed:.3f}s, {rows / elapsed:.0f} rows/s')
+    return body
+
+
+@pytest.mark.django_db
+def test_bench_serialization():
+    catalog = generate_catalog(ROWS)
+    user = User.objects.create_user(email='bench@store.ru', password='bench', type='shop')
+    shop = Shop.objects.create(user_id=user.id, name=catalog['shop'], state=True)
+    CatalogImporter(shop).run(catalog['categories'], catalog['goods'])
+
+    # по пять позиций в заказе
+    infos = list(ProductInfo.objects.order_by('id').values_list('id', 'model', 'price'))
+    created = Order.objects.bulk_create([Order(user=user, state='new') for _ in range(ROWS // 5)])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product_info_id=info_id, shop=shop, quantity=1, model=model, price=price)
+        for index, order in enumerate(created) for info_id, model, price in infos[index * 5:index * 5 + 5]])
+
+    print()
+    products = ProductInfo.objects.order_by('id')
+    expected = measure('products drf', ROWS, lambda: JSONRenderer().render(ProductInfoSerializer(
+        products.select_related('product__category').prefetch_related(PARAMETERS), many=True).data))
+    assert measure('products fast', ROWS,
+                   lambda: render_json(product_infos(products.values(*PRODUCT_INFO_FIELDS)))) == expected
+
+    expected = measure('orders drf', ROWS, lambda: JSONRenderer().render(OrderSerializer(
+        Order.objects.prefetch_related(ITEMS).select_related('contact'), many=True).data))
+    assert measure('orders fast', ROWS,
+                   lambda: render_json(orders(Order.objects.values(*ORDER_FIELDS)))) == expected
@@ -0,0 +1,31 @@
+"""
+Генератор синтетических прайс-листов в формате shop1.yaml для бенчмарков
+"""
+import random
+
+COLORS = ('золотистый', 'красный', 'черный', 'синий', 'белый')
+
+
+def generate_catalog(goods_count, categories_count=20, seed=0):
+    rnd = random.Random(seed)
+    categories = [{'id': 1000 + index, 'name': f'Категория {index}'} for index in range(categories_count)]
+    goods = []
+    for index in range(goods_count):
+        memory = rnd.choice((64, 128, 256, 512))
+        color = rnd.choice(COLORS)
+        goods.append({
+            'id': 5000000 + index,
+            'category': categories[index % categories_count]['id'],
+            'model': f'vendor/model-{index % 500}',
+            'name': f'Смартфон {index} {memory}GB ({color})',
+            'price': rnd.randint(1000, 150000),
+            'price_rrc': rnd.randint(1000, 160000),
+            'quantity': rnd.randint(0, 50),
+            'parameters': {
+                'Диагональ (дюйм)': rnd.choice((5.8, 6.1, 6.5)),
+                'Разрешение (пикс)': rnd.choice(('2688x1242', '1792x828')),
+                'Встроенная память (Гб)': memory,
+                'Цвет': color,
+            },
+        })
+    return {'shop': 'Бенчмарк', 'categories': categories, 'goods': goods}
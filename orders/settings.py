@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 import local_settings
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'shop_backend.apps.ShopBackendConfig',
     'rest_framework',
     'rest_framework.authtoken',
@@ -46,6 +48,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'shop_backend.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,17 +82,78 @@ WSGI_APPLICATION = 'orders.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# Соединения с базой постоянные (CONN_MAX_AGE) и проверяются перед повторным использованием.
+# DB_POOL_SIZE в local_settings включает пул соединений процесса (shop_backend.postgresql_pool):
+# соединение возвращается в пул после каждого запроса, поэтому CONN_MAX_AGE в этом режиме 0
+DB_POOL_SIZE = getattr(local_settings, 'DB_POOL_SIZE', 0)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'shop_backend.postgresql_pool' if DB_POOL_SIZE else 'django.db.backends.postgresql',
         'NAME': local_settings.NAME,
         'USER': local_settings.USER,
         'PASSWORD': local_settings.PASSWORD,
         'HOST': local_settings.HOST,
         'PORT': local_settings.PORT,
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else getattr(local_settings, 'CONN_MAX_AGE', 60),
+        'CONN_HEALTH_CHECKS': True,
+        'POOL_SIZE': DB_POOL_SIZE,
+        'POOL_TIMEOUT': getattr(local_settings, 'DB_POOL_TIMEOUT', 10),
     }
 }
 
+# Бюджет запросов к базе на один HTTP-запрос (None - без ограничения), см. shop_backend.middleware.
+# Превышение пишется в лог; QUERY_BUDGET_RAISE (включен в тестах) делает его ошибкой для GET/HEAD/OPTIONS
+QUERY_BUDGET = getattr(local_settings, 'QUERY_BUDGET', 20)
+QUERY_BUDGET_RAISE = getattr(local_settings, 'QUERY_BUDGET_RAISE', False)
+
+
+# Cache
+# По умолчанию кеш локальный для процесса; в продакшене в local_settings.CACHES задается общий
+# (Redis/Memcached), чтобы сброс версий каталога был виден всем воркерам
+
+CACHES = getattr(local_settings, 'CACHES', {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+})
+
+# время жизни закешированной страницы списка товаров, секунды
+PRODUCT_CACHE_TIMEOUT = 60
+# время жизни закешированных ответов справочников, секунды: версия в ключе делает старые ответы
+# недостижимыми, а конечный срок не дает им копиться в кеше
+DIRECTORY_CACHE_TIMEOUT = 60 * 60
+
+# кеш аутентификации по токену: размер LRU процесса и время жизни записей в нем, секунды;
+# TOKEN_SHARED_CACHE_TTL > 0 включает второй уровень в общем кеше CACHES
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 30
+TOKEN_SHARED_CACHE_TTL = 0
+
+# сколько держится резерв товара по оформленному, но не подтвержденному заказу, секунды
+ORDER_RESERVATION_TIMEOUT = 24 * 60 * 60
+
+# Ограничение частоты запросов по throttle_scope представления, см. shop_backend.throttling.
+# Корзины жетонов общие для воркеров машины и лежат в файле THROTTLE_FILE на THROTTLE_BUCKETS корзин.
+# Магазин принадлежит одному пользователю, поэтому корзина пользователя ограничивает и его магазин
+THROTTLE_RATES = getattr(local_settings, 'THROTTLE_RATES', {
+    'products': '300/min',
+    'partner_orders': '120/min',
+    'export': '10/hour',
+    'import': '30/hour',
+})
+THROTTLE_BUCKETS = 100000
+THROTTLE_FILE = getattr(local_settings, 'THROTTLE_FILE', os.path.join(tempfile.gettempdir(), 'shop_backend_throttle'))
+
+# Допуск задач импорта: активных (в очереди и выполняющихся) задач у магазина и всего.
+# Сверх лимита ProductUpdate отвечает 429 с Retry-After = IMPORT_RETRY_AFTER секунд.
+# Выполняющаяся задача, не отмечавшаяся о работе (ImportJob.heartbeat_at) дольше IMPORT_STALE_AFTER секунд,
+# считается зависшей: она не учитывается в лимитах и снова забирается воркером
+IMPORT_MAX_PER_SHOP = getattr(local_settings, 'IMPORT_MAX_PER_SHOP', 1)
+IMPORT_MAX_ACTIVE = getattr(local_settings, 'IMPORT_MAX_ACTIVE', 50)
+IMPORT_RETRY_AFTER = 60
+IMPORT_STALE_AFTER = 60 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -161,7 +225,7 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         # 'rest_framework.authentication.SessionAuthentication',
         # 'rest_framework.authentication.BasicAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'shop_backend.authentication.CachedTokenAuthentication',
     ),
 }
 DJANGO_SETTINGS_MODULE = 'orders.settings'
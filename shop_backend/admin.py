@@ -1,8 +1,11 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
 
 from .models import User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, OrderItem,\
-    Contact, ConfirmEmailToken
+    Contact, ConfirmEmailToken, ImportJob, EmailOutbox, OrderTransition, \
+    ShopOrder, PriceHistory
+from .parameters import refresh_attributes
+from .workflow import PARTNER_STATES, STATE_NAMES, transition_orders
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -47,19 +50,86 @@ class ParameterAdmin(admin.ModelAdmin):
     pass
 
 
+@admin.register(PriceHistory)
+class PriceHistoryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'product_info_id', 'shop_id', 'dt', 'price', 'price_rrc', 'quantity',)
+
+    # журнал только пополняется
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(ProductParameter)
 class ProductParameterAdmin(admin.ModelAdmin):
-    pass
+    # сохранение обрабатывает сигнал, удаление - здесь, см. signals.product_parameter_saved_signal
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_attributes([obj.product_info_id])
+
+    def delete_queryset(self, request, queryset):
+        info_ids = set(queryset.values_list('product_info_id', flat=True))
+        super().delete_queryset(request, queryset)
+        refresh_attributes(info_ids)
+
+
+def transition_action(state):
+    def action(modeladmin, request, queryset):
+        moved, errors = transition_orders(queryset.values_list('id', flat=True), state, user_id=request.user.id,
+                                          sender=modeladmin.__class__)
+        modeladmin.message_user(request, f'Обновлено заказов: {len(moved)}')
+        if errors:
+            modeladmin.message_user(request, f'Не обновлено заказов: {len(errors)}', messages.WARNING)
+
+    action.__name__ = f'transition_to_{state}'
+    action.short_description = f'Перевести в статус "{STATE_NAMES[state]}"'
+    return action
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    pass
+    list_display = ('id', 'user', 'state', 'dt', 'total_sum', 'items_count',)
+    list_filter = ('state',)
+    # статус меняется только действиями: они переводят части заказа, пишут журнал и возвращают товар на склад
+    readonly_fields = ('state', 'total_sum', 'items_count', 'reserved_until',)
+    actions = [transition_action(state) for state in PARTNER_STATES]
+
+
+@admin.register(ShopOrder)
+class ShopOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'shop', 'state', 'dt', 'total_sum', 'items_count',)
+    list_filter = ('state',)
+    readonly_fields = ('order', 'shop', 'state', 'dt', 'total_sum', 'items_count',)
+
+
+@admin.register(OrderTransition)
+class OrderTransitionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'shop', 'from_state', 'to_state', 'user', 'dt',)
+    list_filter = ('to_state',)
+
+    # журнал только пополняется
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    pass
+    list_display = ('id', 'order', 'product_info', 'shop', 'quantity', 'price',)
+
+    # позиции меняются через корзину: правка здесь не пересчитала бы итоги заказа и его частей и остатки
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Contact)
@@ -70,3 +140,15 @@ class ContactAdmin(admin.ModelAdmin):
 @admin.register(ConfirmEmailToken)
 class ConfirmEmailTokenAdmin(admin.ModelAdmin):
     list_display = ('user', 'key', 'created_at',)
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'state', 'rows_processed', 'created_at', 'finished_at',)
+    list_filter = ('state',)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subject', 'to', 'state', 'attempts', 'send_after', 'sent_at',)
+    list_filter = ('state',)
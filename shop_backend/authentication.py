@@ -0,0 +1,124 @@
+"""
+Аутентификация по токену с кешированием.
+Соответствие токен -> пользователь (вместе с магазином) хранится в ограниченном LRU процесса с TTL
+и, если задан TOKEN_SHARED_CACHE_TTL, в общем кеше Django. Записи сбрасываются сигналами при изменении
+пользователя или магазина и при удалении токена; TTL локального кеша ограничивает устаревание
+в остальных процессах.
+"""
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import User, Shop
+
+SHARED_KEY = 'auth:token:{}'
+# хеш пароля не кешируем: поле остается отложенным и читается из базы только при обращении
+USER_FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+SHOP_FIELDS = [field.attname for field in Shop._meta.concrete_fields]
+
+
+class TTLCache:
+    """
+    Потокобезопасный LRU с ограничением размера и временем жизни записей
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def delete_where(self, predicate):
+        with self.lock:
+            for key in [key for key, (_, value) in self.data.items() if predicate(value)]:
+                del self.data[key]
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+local_cache = TTLCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+
+def _snapshot(user):
+    shop = getattr(user, 'shop', None)
+    return (tuple(getattr(user, name) for name in USER_FIELDS),
+            tuple(getattr(shop, name) for name in SHOP_FIELDS) if shop is not None else None)
+
+
+def _restore(snapshot):
+    """
+    Собираем пользователя из кеша заново на каждый запрос, чтобы запросы не делили один объект
+    """
+    user_values, shop_values = snapshot
+    user = User.from_db('default', USER_FIELDS, user_values)
+    shop = Shop.from_db('default', SHOP_FIELDS, shop_values) if shop_values is not None else None
+    User._meta.get_field('shop').set_cached_value(user, shop)
+    return user
+
+
+def invalidate_token(key):
+    local_cache.delete(key)
+    if settings.TOKEN_SHARED_CACHE_TTL:
+        cache.delete(SHARED_KEY.format(key))
+
+
+def invalidate_user(user_id):
+    user_index = USER_FIELDS.index('id')
+    local_cache.delete_where(lambda snapshot: snapshot[0][user_index] == user_id)
+    if settings.TOKEN_SHARED_CACHE_TTL:
+        cache.delete_many([SHARED_KEY.format(key) for key in
+                           Token.objects.filter(user_id=user_id).values_list('key', flat=True)])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        snapshot = local_cache.get(key)
+        if snapshot is None and settings.TOKEN_SHARED_CACHE_TTL:
+            snapshot = cache.get(SHARED_KEY.format(key))
+            if snapshot is not None:
+                local_cache.set(key, snapshot)
+        if snapshot is None:
+            try:
+                token = Token.objects.select_related('user__shop').get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed('User inactive or deleted.')
+            snapshot = _snapshot(token.user)
+            local_cache.set(key, snapshot)
+            if settings.TOKEN_SHARED_CACHE_TTL:
+                cache.set(SHARED_KEY.format(key), snapshot, settings.TOKEN_SHARED_CACHE_TTL)
+        user = _restore(snapshot)
+        return user, Token.from_db('default', ('key', 'user_id'), (key, user.id))
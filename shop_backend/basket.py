@@ -0,0 +1,102 @@
+"""
+Пакетное изменение корзины: все строки запроса проверяются по заранее выбранным данным,
+а запись выполняется одним bulk_create/bulk_update в одной транзакции. Если хоть одна строка
+неверна, корзина не меняется, а в ответе возвращаются ошибки по номерам строк.
+"""
+from django.db import transaction
+
+from .models import Order, OrderItem, ProductInfo
+from .summary import refresh_order_summary
+
+
+def _positive_int(value):
+    return type(value) == int and value > 0
+
+
+def resolve_basket(user_id):
+    """
+    Возвращаем id корзины пользователя, создавая ее при необходимости. Обычно это один поиск
+    по индексу. Вторую корзину не даст создать уникальный частичный индекс unique_basket:
+    при гонке INSERT ... ON CONFLICT DO NOTHING ничего не вставит, и мы прочитаем корзину,
+    созданную параллельным запросом
+    """
+    baskets = Order.objects.filter(user_id=user_id, state='basket').values_list('id', flat=True)
+    basket_id = baskets.first()
+    if basket_id is None:
+        Order.objects.bulk_create([Order(user_id=user_id, state='basket')], ignore_conflicts=True)
+        basket_id = baskets.first()
+    return basket_id
+
+
+def request_basket(request):
+    """
+    Корзина текущего пользователя, разрешается один раз за запрос
+    """
+    basket_id = getattr(request, 'basket_id', None)
+    if basket_id is None:
+        basket_id = request.basket_id = resolve_basket(request.user.id)
+    return basket_id
+
+
+def add_items(basket_id, items):
+    """
+    Добавляем позиции [{'product_info': id, 'quantity': n, 'shop': id}] в корзину,
+    возвращаем (количество созданных позиций, ошибки по номерам строк)
+    """
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return 0, {'items': 'Ожидается список позиций'}
+    info_ids = {item.get('product_info') for item in items if _positive_int(item.get('product_info'))}
+    infos = dict(ProductInfo.objects.filter(id__in=info_ids).values_list('id', 'shop_id'))
+    in_basket = set(OrderItem.objects.filter(order_id=basket_id, product_info_id__in=info_ids).values_list(
+        'product_info_id', flat=True))
+
+    errors, lines = {}, []
+    for index, item in enumerate(items):
+        info_id, quantity, shop_id = item.get('product_info'), item.get('quantity'), item.get('shop')
+        # id проверяется до поиска: список или словарь из JSON нельзя искать в словаре
+        if not _positive_int(info_id) or info_id not in infos:
+            errors[index] = {'product_info': 'Товар не найден'}
+        elif not _positive_int(quantity):
+            errors[index] = {'quantity': 'Количество должно быть положительным целым числом'}
+        elif shop_id is not None and shop_id != infos[info_id]:
+            errors[index] = {'shop': 'Товар не продается в указанном магазине'}
+        elif info_id in in_basket:
+            errors[index] = {'product_info': 'Товар уже есть в корзине'}
+        else:
+            in_basket.add(info_id)
+            lines.append(OrderItem(order_id=basket_id, product_info_id=info_id, shop_id=infos[info_id],
+                                   quantity=quantity))
+    if errors:
+        return 0, errors
+
+    with transaction.atomic():
+        OrderItem.objects.bulk_create(lines)
+        refresh_order_summary([basket_id])
+    return len(lines), {}
+
+
+def update_items(basket_id, items):
+    """
+    Меняем количество позиций [{'id': id, 'quantity': n}] одним UPDATE ... CASE,
+    возвращаем (количество обновленных позиций, ошибки по номерам строк)
+    """
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return 0, {'items': 'Ожидается список позиций'}
+    item_ids = {item.get('id') for item in items if _positive_int(item.get('id'))}
+    lines = OrderItem.objects.filter(order_id=basket_id, id__in=item_ids).only('id', 'quantity').in_bulk()
+
+    errors = {}
+    for index, item in enumerate(items):
+        if not _positive_int(item.get('id')) or item['id'] not in lines:
+            errors[index] = {'id': 'Позиция не найдена в корзине'}
+        elif not _positive_int(item.get('quantity')):
+            errors[index] = {'quantity': 'Количество должно быть положительным целым числом'}
+        else:
+            lines[item['id']].quantity = item['quantity']
+    if errors:
+        return 0, errors
+
+    with transaction.atomic():
+        OrderItem.objects.bulk_update(lines.values(), ('quantity',))
+        refresh_order_summary([basket_id])
+    return len(lines), {}
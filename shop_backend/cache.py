@@ -0,0 +1,64 @@
+"""
+Версионированный кеш ответов каталога.
+Вместо поиска и удаления конкретных ключей при изменении данных увеличиваем номер версии:
+ключи со старой версией перестают читаться и вытесняются по таймауту.
+"""
+import time
+
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'catalog:version'
+SHOP_VERSION_KEY = 'catalog:shop:{}:version'
+DIRECTORY_VERSION_KEY = 'directory:version'
+DIRECTORY_MODIFIED_KEY = 'directory:modified'
+PARAMETERS_VERSION_KEY = 'parameters:version'
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 2, timeout=None)
+        return cache.get(key, 2)
+
+
+def bump_catalog_version(shop_id=None):
+    """
+    Сбрасываем закешированные страницы каталога: общие и, если указан, конкретного магазина
+    """
+    bump_version(CATALOG_VERSION_KEY)
+    if shop_id is not None:
+        bump_version(SHOP_VERSION_KEY.format(shop_id))
+
+
+def product_page_key(shop_id, category_id, cursor, limit):
+    # выборка по одному магазину зависит только от его версии, иначе - от общей версии каталога
+    version = get_version(SHOP_VERSION_KEY.format(shop_id) if shop_id else CATALOG_VERSION_KEY)
+    return f'products:{version}:{shop_id or ""}:{category_id or ""}:{cursor or ""}:{limit}'
+
+
+def bump_directory_version():
+    """
+    Сбрасываем закешированные справочники категорий и магазинов и запоминаем время изменения
+    """
+    bump_version(DIRECTORY_VERSION_KEY)
+    cache.set(DIRECTORY_MODIFIED_KEY, int(time.time()), timeout=None)
+
+
+def directory_version():
+    """
+    Возвращаем (версию справочников, время их последнего изменения в секундах)
+    """
+    modified = cache.get(DIRECTORY_MODIFIED_KEY)
+    if modified is None:
+        cache.add(DIRECTORY_MODIFIED_KEY, int(time.time()), timeout=None)
+        modified = cache.get(DIRECTORY_MODIFIED_KEY)
+    return get_version(DIRECTORY_VERSION_KEY), modified
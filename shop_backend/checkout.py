@@ -0,0 +1,85 @@
+"""
+Оформление заказа с резервированием товара.
+Остатки списываются условным UPDATE ... SET quantity = quantity - n WHERE quantity >= n в порядке
+возрастания id товара: строки блокируются в одном и том же порядке, поэтому параллельные оформления
+не взаимоблокируются, а нехватка товара откатывает всю транзакцию - перепродажа невозможна.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Order, OrderItem, ProductInfo
+from .signals import new_order
+from .summary import refresh_order_summary, refresh_shop_orders
+from .workflow import log_transitions, move_shop_orders
+
+RELEASE_BATCH_SIZE = 500
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class OutOfStock(CheckoutError):
+    def __init__(self, product_info_ids):
+        super().__init__(f'Недостаточно товара на складе: {", ".join(map(str, product_info_ids))}')
+        self.product_info_ids = product_info_ids
+
+
+def checkout(user_id, order_id, contact_id, sender=None):
+    """
+    Переводим корзину в статус new, резервируя товар. Возвращаем False, если корзина не найдена
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().filter(id=order_id, user_id=user_id, state='basket').first()
+        if order is None:
+            return False
+        items = list(OrderItem.objects.filter(order_id=order.id).order_by('product_info_id').values_list(
+            'product_info_id', 'quantity'))
+        if not items:
+            raise CheckoutError('Корзина пуста')
+        # быстрый отказ без блокировок, окончательную проверку делает условный UPDATE ниже
+        stock = dict(ProductInfo.objects.filter(id__in=[info_id for info_id, _ in items]).values_list(
+            'id', 'quantity'))
+        short = [info_id for info_id, quantity in items if stock.get(info_id, 0) < quantity]
+        if short:
+            raise OutOfStock(short)
+
+        # фиксируем цены и сумму заказа на момент оформления
+        refresh_order_summary([order.id])
+        # дата заказа - момент оформления, чтобы заказ попал в ленту поставщика как новый
+        now = timezone.now()
+        Order.objects.filter(id=order.id).update(
+            contact_id=contact_id, state='new', dt=now,
+            reserved_until=now + timedelta(seconds=settings.ORDER_RESERVATION_TIMEOUT))
+        # части заказа по магазинам для ленты поставщиков
+        refresh_shop_orders([order.id])
+        log_transitions([(order.id, None, 'basket')], 'new', user_id)
+        # письмо попадает в очередь в той же транзакции, что и заказ
+        new_order.send(sender=sender, user_id=user_id)
+
+        # остатки списываем последними: блокировки горячих строк товара держатся только до фиксации
+        short = [info_id for info_id, quantity in items
+                 if not ProductInfo.objects.filter(id=info_id, quantity__gte=quantity).update(
+                     quantity=F('quantity') - quantity)]
+        if short:
+            raise OutOfStock(short)
+    return True
+
+
+def release_expired_reservations(now=None, batch_size=RELEASE_BATCH_SIZE):
+    """
+    Отменяем новые заказы с истекшим резервом и возвращаем их товар на склад, возвращаем число заказов
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        orders = dict(Order.objects.select_for_update(skip_locked=True).filter(
+            state='new', reserved_until__lt=now).values_list('id', 'state')[:batch_size])
+        if not orders:
+            return 0
+        # части, уже подтвержденные магазинами, остаются в работе
+        move_shop_orders(orders, 'canceled', sources=('new',))
+    return len(orders)
@@ -0,0 +1,152 @@
+"""
+Потоковая выгрузка заказов и каталога для аналитики.
+Строки читаются серверным курсором (iterator(chunk_size=...)) и сразу кодируются в CSV или NDJSON,
+при необходимости сжимаются gzip на лету, поэтому память не зависит от объема выгрузки.
+Используется представлениями ExportOrders/ExportProducts и командой export_data.
+"""
+import csv
+import zlib
+from datetime import datetime
+
+from ujson import dumps as json_dump
+
+from .models import OrderItem, ProductInfo, ShopOrder
+from .parameters import product_parameters
+
+EXPORT_CHUNK_SIZE = 2000
+# сколько байт копим перед отдачей очередного куска ответа
+BUFFER_SIZE = 64 * 1024
+FORMATS = ('csv', 'ndjson')
+
+ORDER_COLUMNS = ('order_id', 'dt', 'state', 'user_id', 'contact_id', 'total_sum', 'items_count',
+                 'item_id', 'product_info_id', 'shop_id', 'product_name', 'model', 'price', 'quantity')
+# выгрузка магазина: статус, сумма и число позиций - его части заказа, без данных покупателя
+SHOP_ORDER_COLUMNS = ('order_id', 'dt', 'state', 'total_sum', 'items_count',
+                      'item_id', 'product_info_id', 'shop_id', 'product_name', 'model', 'price', 'quantity')
+PRODUCT_COLUMNS = ('id', 'shop_id', 'external_id', 'product', 'category', 'model', 'price', 'price_rrc',
+                   'quantity', 'parameters')
+
+
+def order_rows(since=None, until=None):
+    """
+    Позиции оформленных заказов вместе со сводкой заказа, по одной строке на позицию
+    """
+    items = OrderItem.objects.exclude(order__state='basket')
+    if since is not None:
+        items = items.filter(order__dt__gte=since)
+    if until is not None:
+        items = items.filter(order__dt__lt=until)
+    return items.order_by('order_id', 'id').values_list(
+        'order_id', 'order__dt', 'order__state', 'order__user_id', 'order__contact_id', 'order__total_sum',
+        'order__items_count', 'id', 'product_info_id', 'shop_id', 'product_name', 'model', 'price',
+        'quantity').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def shop_order_rows(shop_user_id, since=None, until=None):
+    """
+    Позиции заказов магазина пользователя shop_user_id вместе со сводкой его части заказа (SHOP_ORDER_COLUMNS).
+    Части и позиции читаются двумя курсорами в порядке order_id и сливаются на лету
+    """
+    parts = ShopOrder.objects.filter(shop__user_id=shop_user_id)
+    items = OrderItem.objects.filter(shop__user_id=shop_user_id)
+    if since is not None:
+        parts, items = parts.filter(dt__gte=since), items.filter(order__dt__gte=since)
+    if until is not None:
+        parts, items = parts.filter(dt__lt=until), items.filter(order__dt__lt=until)
+    parts = parts.order_by('order_id').values_list('order_id', 'dt', 'state', 'total_sum', 'items_count').iterator(
+        chunk_size=EXPORT_CHUNK_SIZE)
+    part = next(parts, None)
+    for item in items.exclude(order__state='basket').order_by('order_id', 'id').values_list(
+            'order_id', 'id', 'product_info_id', 'shop_id', 'product_name', 'model', 'price',
+            'quantity').iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        while part is not None and part[0] < item[0]:
+            part = next(parts, None)
+        if part is not None and part[0] == item[0]:
+            yield (*part, *item[1:])
+
+
+def product_rows(shop_id=None, shop_user_id=None):
+    """
+    Позиции каталога с параметрами в виде [{'parameter': имя, 'value': значение}], как в API.
+    shop_user_id ограничивает выгрузку каталогом магазина этого пользователя
+    """
+    infos = ProductInfo.objects.all()
+    if shop_id is not None:
+        infos = infos.filter(shop_id=shop_id)
+    if shop_user_id is not None:
+        infos = infos.filter(shop__user_id=shop_user_id)
+    for *row, attributes in infos.order_by('id').values_list(
+            'id', 'shop_id', 'external_id', 'product__name', 'product__category__name', 'model', 'price',
+            'price_rrc', 'quantity', 'attributes').iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield (*row, product_parameters(attributes))
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return json_dump(value, ensure_ascii=False)
+    return value
+
+
+class _Line:
+    """
+    Файлоподобный объект для csv.writer: writerow возвращает записанную строку
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_plain(value) for value in row])
+
+
+def ndjson_lines(columns, rows):
+    for row in rows:
+        yield json_dump({column: value.isoformat() if isinstance(value, datetime) else value
+                         for column, value in zip(columns, row)}, ensure_ascii=False) + '\n'
+
+
+def encode(lines, compress=False):
+    """
+    Склеиваем строки в куски по BUFFER_SIZE байт и при compress сжимаем их потоково в gzip
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            chunk = b''.join(buffer)
+            buffer, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b''.join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def export(columns, rows, export_format='csv', compress=False):
+    """
+    Возвращаем итератор байтов выгрузки в формате csv или ndjson
+    """
+    lines = csv_lines(columns, rows) if export_format == 'csv' else ndjson_lines(columns, rows)
+    return encode(lines, compress)
+
+
+def content_type(export_format, compress=False):
+    if compress:
+        return 'application/gzip'
+    return 'text/csv; charset=utf-8' if export_format == 'csv' else 'application/x-ndjson'
+
+
+def file_name(name, export_format, compress=False):
+    return f'{name}.{export_format}' + ('.gz' if compress else '')
@@ -0,0 +1,56 @@
+"""
+История цен и остатков (PriceHistory).
+Импорт пишет строку только при изменении цены, РРЦ или остатка; цена на момент времени читается
+одной строкой по индексу (product_info, dt), изменения магазина за окно - по BRIN-индексу на dt.
+"""
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import PriceHistory
+from .payloads import datetime_field
+
+HISTORY_FIELDS = ('price', 'price_rrc', 'quantity')
+ENTRY_FIELDS = ('id', 'product_info_id', 'dt') + HISTORY_FIELDS
+
+
+def record_history(infos, now=None):
+    """
+    Добавляем в журнал текущие значения позиций infos (объекты ProductInfo)
+    """
+    now = now or timezone.now()
+    PriceHistory.objects.bulk_create([PriceHistory(product_info_id=info.id, shop_id=info.shop_id, dt=now,
+                                                   **{field: getattr(info, field) for field in HISTORY_FIELDS})
+                                      for info in infos])
+
+
+def history_changed(info, values):
+    return any(getattr(info, field) != values[field] for field in HISTORY_FIELDS)
+
+
+def price_at(product_info_id, at):
+    """
+    Цена и остаток позиции на момент at или None, если позиции тогда не было
+    """
+    return PriceHistory.objects.filter(product_info_id=product_info_id, dt__lte=at).order_by(
+        '-dt', '-id').values(*ENTRY_FIELDS).first()
+
+
+def shop_changes(shop_id, since, until, after=None, limit=None):
+    """
+    Изменения цен и остатков магазина в окне [since, until) в порядке (dt, id); after - (dt, id)
+    последней строки предыдущей страницы
+    """
+    entries = PriceHistory.objects.filter(shop_id=shop_id, dt__gte=since, dt__lt=until)
+    if after is not None:
+        dt, pk = after
+        entries = entries.filter(Q(dt__gt=dt) | Q(dt=dt, id__gt=pk))
+    entries = entries.order_by('dt', 'id').values(*ENTRY_FIELDS)
+    return entries[:limit] if limit is not None else entries
+
+
+def history_entry(row):
+    return {'product_info': row['product_info_id'],
+            'dt': datetime_field.to_representation(row['dt']),
+            'price': row['price'],
+            'price_rrc': row['price_rrc'],
+            'quantity': row['quantity']}
@@ -0,0 +1,215 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_catalog_version, bump_directory_version
+from .history import record_history, history_changed
+from .models import Shop, Category, Product, ProductInfo, ProductParameter, OrderItem, ProductFacet
+from .parameters import parameter_ids, refresh_attributes
+from .search import update_search_vectors, rebuild_facets
+
+# количество товаров, обрабатываемых за одну пачку запросов
+BATCH_SIZE = 1000
+
+
+def chunked(iterable, size):
+    """
+    Разбиваем последовательность на списки длиной не более size
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class CatalogImporter:
+    """
+    Класс для пакетной синхронизации прайса поставщика.
+    Категории, продукты и имена параметров разрешаются несколькими запросами на пачку товаров,
+    недостающие создаются через bulk_create. Входящие товары сравниваются с уже загруженными
+    по (shop, external_id): новые вставляются, изменившиеся обновляются одним bulk_update,
+    пропавшие из прайса удаляются (или снимаются с продажи, если на них ссылаются заказы).
+    Новые цены и остатки дописываются в историю PriceHistory.
+    """
+    info_fields = ('product_id', 'model', 'price', 'price_rrc', 'quantity')
+
+    def __init__(self, shop, batch_size=BATCH_SIZE, progress=None):
+        self.shop = shop
+        self.batch_size = batch_size
+        self.progress = progress
+        # имена параметров -> id и словарь значений: одинаковые значения разных товаров - одна строка в памяти
+        self.parameters = {}
+        self.values = {}
+        self.seen = set()
+        self.stats = {'categories': 0, 'goods': 0, 'parameters': 0,
+                      'inserted': 0, 'updated': 0, 'unchanged': 0, 'removed': 0}
+
+    def import_categories(self, categories):
+        categories = {int(category['id']): category['name'] for category in categories}
+        if not categories:
+            return
+        existing = set(Category.objects.filter(id__in=categories).values_list('id', flat=True))
+        Category.objects.bulk_create(
+            [Category(id=category_id, name=name) for category_id, name in categories.items()
+             if category_id not in existing], ignore_conflicts=True)
+        Category.shops.through.objects.bulk_create(
+            [Category.shops.through(category_id=category_id, shop_id=self.shop.id) for category_id in categories],
+            ignore_conflicts=True)
+        self.stats['categories'] += len(categories)
+
+    def import_goods(self, goods):
+        for chunk in chunked(goods, self.batch_size):
+            with transaction.atomic():
+                self._import_chunk(chunk)
+            if self.progress:
+                self.progress(self.stats)
+
+    def remove_missing(self):
+        """
+        Удаляем товары магазина, которых нет в прайсе. Позиции, на которые ссылаются заказы,
+        не удаляются (каскад снес бы корзины), а снимаются с продажи обнулением остатка;
+        уже снятые с продажи позиции не трогаем.
+        """
+        missing = [info_id for info_id, external_id in
+                   ProductInfo.objects.filter(shop_id=self.shop.id).values_list('id', 'external_id')
+                   if external_id not in self.seen]
+        for chunk in chunked(missing, self.batch_size):
+            ordered = set(OrderItem.objects.filter(product_info_id__in=chunk).values_list('product_info_id', flat=True))
+            withdrawn = list(ProductInfo.objects.filter(id__in=ordered).exclude(quantity=0).only(
+                'id', 'shop_id', 'price', 'price_rrc'))
+            ProductInfo.objects.filter(id__in=[info.id for info in withdrawn]).update(quantity=0)
+            for info in withdrawn:
+                info.quantity = 0
+            record_history(withdrawn)
+            deleted = set(chunk) - ordered
+            ProductInfo.objects.filter(id__in=deleted).delete()
+            self.stats['removed'] += len(withdrawn) + len(deleted)
+
+    def run(self, categories, goods):
+        """
+        Каждая пачка пишется в своей транзакции, чтобы длинный импорт не держал блокировки
+        и прогресс был виден снаружи. Пропавшие товары удаляются только после успешной загрузки
+        всего прайса, поэтому прерванный импорт ничего не теряет и его можно просто повторить.
+        """
+        with transaction.atomic():
+            self.import_categories(categories)
+            # отметка ставится до первой пачки: пачки фиксируются по одной, и остаток любой позиции
+            # может оказаться уже перезаписанным, а лишний возврат на склад хуже недостающего
+            Shop.objects.filter(id=self.shop.id).update(stock_updated_at=timezone.now())
+        self.import_goods(goods)
+        with transaction.atomic():
+            self.remove_missing()
+        bump_catalog_version(self.shop.id)
+        bump_directory_version()
+        return self.stats
+
+    def _resolve_products(self, chunk):
+        keys = {(item['name'], int(item['category'])) for item in chunk}
+        products = {}
+        existing = Product.objects.filter(name__in={name for name, _ in keys},
+                                          category_id__in={category_id for _, category_id in keys})
+        for product_id, name, category_id in existing.values_list('id', 'name', 'category_id'):
+            products.setdefault((name, category_id), product_id)
+        missing = [Product(name=name, category_id=category_id) for name, category_id in keys
+                   if (name, category_id) not in products]
+        for product in Product.objects.bulk_create(missing):
+            products[(product.name, product.category_id)] = product.id
+        return products
+
+    def _resolve_parameters(self, chunk):
+        names = {name for item in chunk for name in item.get('parameters', {})} - self.parameters.keys()
+        if names:
+            self.parameters.update(parameter_ids(names))
+
+    def _import_chunk(self, chunk):
+        products = self._resolve_products(chunk)
+        self._resolve_parameters(chunk)
+
+        # повторяющиеся в одной пачке позиции схлопываем: побеждает последняя
+        goods = {int(item['id']): item for item in chunk}
+        self.seen.update(goods)
+
+        existing = {}
+        for info in ProductInfo.objects.filter(shop_id=self.shop.id, external_id__in=goods).only(
+                'id', 'external_id', *self.info_fields):
+            existing.setdefault(info.external_id, info)
+
+        created, changed, repriced = [], {}, []
+        for external_id, item in goods.items():
+            values = {'product_id': products[(item['name'], int(item['category']))],
+                      'model': item.get('model', ''), 'price': int(item['price']),
+                      'price_rrc': int(item['price_rrc']), 'quantity': int(item['quantity'])}
+            info = existing.get(external_id)
+            if info is None:
+                created.append(ProductInfo(shop_id=self.shop.id, external_id=external_id, **values))
+            elif any(getattr(info, field) != value for field, value in values.items()):
+                if history_changed(info, values):
+                    repriced.append(info)
+                for field, value in values.items():
+                    setattr(info, field, value)
+                changed[info.id] = info
+        ProductInfo.objects.bulk_create(created)
+        ProductInfo.objects.bulk_update(changed.values(), self.info_fields)
+        record_history(created + repriced)
+        infos = {info.external_id: info.id for info in created}
+        infos.update({external_id: info.id for external_id, info in existing.items()})
+
+        params_changed = self._sync_parameters(goods, infos, existing)
+        refresh_attributes({info.id for info in created} | params_changed)
+        self._index_chunk(goods, infos, {info.id for info in created} | changed.keys(), params_changed)
+
+        updated = len(changed.keys() | params_changed)
+        self.stats['goods'] += len(goods)
+        self.stats['inserted'] += len(created)
+        self.stats['updated'] += updated
+        self.stats['unchanged'] += len(existing) - updated
+
+    def _sync_parameters(self, goods, infos, existing):
+        """
+        Приводим параметры пачки к значениям из прайса, возвращаем id позиций с измененными параметрами
+        """
+        current = {}
+        for param in ProductParameter.objects.filter(
+                product_info_id__in=[info.id for info in existing.values()]).only(
+                'id', 'product_info_id', 'parameter_id', 'value'):
+            current[(param.product_info_id, param.parameter_id)] = param
+
+        created, updated, changed = [], [], set()
+        for external_id, item in goods.items():
+            info_id = infos[external_id]
+            for name, value in item.get('parameters', {}).items():
+                value = str(value)
+                value = self.values.setdefault(value, value)
+                param = current.pop((info_id, self.parameters[name]), None)
+                if param is None:
+                    created.append(ProductParameter(product_info_id=info_id, parameter_id=self.parameters[name],
+                                                    value=value))
+                elif param.value != value:
+                    param.value = value
+                    updated.append(param)
+                else:
+                    continue
+                changed.add(info_id)
+            self.stats['parameters'] += len(item.get('parameters', {}))
+        ProductParameter.objects.bulk_create(created, batch_size=self.batch_size)
+        ProductParameter.objects.bulk_update(updated, ('value',), batch_size=self.batch_size)
+        ProductParameter.objects.filter(id__in=[param.id for param in current.values()]).delete()
+        changed.update(param.product_info_id for param in current.values())
+        # новые позиции считаются вставленными, а не обновленными
+        return changed & {info.id for info in existing.values()}
+
+    def _index_chunk(self, goods, infos, info_changed, params_changed):
+        """
+        Обновляем поисковый вектор и фасеты позиций, которые изменились в этой пачке
+        """
+        update_search_vectors(info_changed)
+        touched = info_changed | params_changed
+        facets = [ProductFacet(product_info_id=infos[external_id], shop_id=self.shop.id,
+                               category_id=int(item['category']), parameter_id=self.parameters[name],
+                               value=str(value))
+                  for external_id, item in goods.items() if infos[external_id] in touched
+                  for name, value in item.get('parameters', {}).items()]
+        rebuild_facets(facets, touched)
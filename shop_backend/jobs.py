@@ -0,0 +1,241 @@
+"""
+Фоновый импорт прайсов поставщиков.
+Очередь хранится в таблице ImportJob, воркеры забирают задачи через SELECT ... FOR UPDATE SKIP LOCKED,
+поэтому несколько процессов и потоков могут разбирать ее одновременно без внешнего брокера.
+Асинхронный воркер (work_async) скачивает много прайсов одновременно в одном процессе через httpx,
+а сам импорт в базу выполняет в небольшом пуле потоков.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from tempfile import SpooledTemporaryFile
+
+import httpx
+from django.conf import settings
+from django.db import connection, transaction, close_old_connections
+from django.db.models import Count, Q
+from django.utils import timezone
+from requests import get
+
+from .importer import CatalogImporter
+from .models import ImportJob, Shop
+from .parsers import catalog_reader
+
+logger = logging.getLogger(__name__)
+
+# таймаут на скачивание прайса, секунды (соединение, чтение)
+FETCH_TIMEOUT = (10, 300)
+# сколько прайсов асинхронный воркер скачивает одновременно
+DOWNLOAD_CONCURRENCY = 20
+# прайсы меньше этого размера скачиваются в память, больше - во временный файл
+SPOOL_SIZE = 8 * 1024 * 1024
+# ключ advisory-блокировки, под которой admit_import проверяет лимиты импорта
+IMPORT_ADMISSION_LOCK = 4108001
+
+
+def enqueue_import(user, url):
+    return ImportJob.objects.create(user=user, url=url)
+
+
+class ImportLimitExceeded(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def admit_import(user, url):
+    """
+    Ставим задачу в очередь, если у магазина меньше IMPORT_MAX_PER_SHOP активных задач, а всего их
+    меньше IMPORT_MAX_ACTIVE; иначе ImportLimitExceeded. Выполняющаяся задача без отметки о работе дольше
+    IMPORT_STALE_AFTER не учитывается. Проверка и вставка идут под транзакционной
+    advisory-блокировкой: иначе параллельные запросы разных магазинов прошли бы общий лимит одновременно
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [IMPORT_ADMISSION_LOCK])
+        stale = timezone.now() - timedelta(seconds=settings.IMPORT_STALE_AFTER)
+        active = ImportJob.objects.filter(Q(state='queued') | Q(state='running', heartbeat_at__gt=stale)).aggregate(
+            shop=Count('id', filter=Q(user_id=user.id)), total=Count('id'))
+        if active['shop'] >= settings.IMPORT_MAX_PER_SHOP:
+            raise ImportLimitExceeded('Предыдущий импорт прайса еще не завершен', settings.IMPORT_RETRY_AFTER)
+        if active['total'] >= settings.IMPORT_MAX_ACTIVE:
+            raise ImportLimitExceeded('Очередь импорта переполнена', settings.IMPORT_RETRY_AFTER)
+        return enqueue_import(user, url)
+
+
+def claim_job():
+    """
+    Забираем самую старую задачу из очереди, None - если очередь пуста. Выполняющаяся задача, которая
+    дольше IMPORT_STALE_AFTER не отмечалась о работе, считается брошенной упавшим воркером и забирается заново
+    """
+    stale = timezone.now() - timedelta(seconds=settings.IMPORT_STALE_AFTER)
+    with transaction.atomic():
+        job = ImportJob.objects.select_for_update(skip_locked=True).filter(
+            Q(state='queued') | Q(state='running', heartbeat_at__lte=stale)).order_by('created_at').first()
+        if job is None:
+            return None
+        job.state = 'running'
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.save(update_fields=('state', 'started_at', 'heartbeat_at'))
+    return job
+
+
+def import_catalog(job, stream, content_type=''):
+    """
+    Читаем прайс задачи из файлоподобного объекта и импортируем его, возвращаем статистику.
+    Каждая пачка продлевает heartbeat_at: живой длинный импорт не считается зависшим
+    """
+    def progress(stats):
+        ImportJob.objects.filter(id=job.id).update(rows_processed=stats['goods'], heartbeat_at=timezone.now())
+
+    # скачивание асинхронным воркером могло занять время до начала импорта
+    ImportJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now())
+
+    reader = catalog_reader(stream, name=job.url, content_type=content_type)
+    header = reader.read_header()
+    shop, _ = Shop.objects.get_or_create(user_id=job.user_id, defaults={'name': str(header['shop'])})
+    return CatalogImporter(shop, progress=progress).run(header['categories'], reader.goods())
+
+
+def fail_job(job, error):
+    """
+    Задача завершилась ошибкой: магазину показываем только ее текст, трассировка - в лог
+    """
+    logger.error('Импорт %s (задача %s) завершился ошибкой', job.url, job.id, exc_info=error)
+    return finish_job(job, errors=str(error) or type(error).__name__)
+
+
+def finish_job(job, stats=None, errors=''):
+    if errors:
+        job.state = 'failed'
+        job.errors = errors
+    else:
+        job.state = 'done'
+        job.rows_processed = stats['goods']
+        job.stats = stats
+    job.finished_at = timezone.now()
+    job.save(update_fields=('state', 'errors', 'rows_processed', 'stats', 'finished_at'))
+    return job
+
+
+def run_job(job):
+    try:
+        # прайс не скачивается целиком: товары читаются из сокета по мере импорта пачек
+        with get(job.url, timeout=FETCH_TIMEOUT, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            stats = import_catalog(job, response.raw, response.headers.get('Content-Type', ''))
+    except Exception as error:
+        return fail_job(job, error)
+    return finish_job(job, stats)
+
+
+def work(poll_interval=1.0, once=False, stop=None):
+    """
+    Цикл воркера: выполняем задачи, пока они есть, затем ждем новые.
+    При once=True выходим, как только очередь опустела.
+    """
+    try:
+        while stop is None or not stop.is_set():
+            close_old_connections()
+            job = claim_job()
+            if job is not None:
+                run_job(job)
+            elif once:
+                break
+            else:
+                time.sleep(poll_interval)
+    finally:
+        close_old_connections()
+
+
+def _with_connection(func, *args):
+    """
+    Обращения к базе из пулов асинхронного воркера: как и запрос Django, закрываем
+    устаревшие соединения потока до и после вызова
+    """
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+def _import_file(job, target, content_type):
+    try:
+        stats = import_catalog(job, target, content_type)
+    except Exception as error:
+        job = fail_job(job, error)
+    else:
+        job = finish_job(job, stats)
+    # импорт длинный, а потоков пула несколько: постоянное соединение потоку не нужно
+    connection.close()
+    return job
+
+
+async def download(client, url, target):
+    """
+    Скачиваем прайс в target, возвращаем Content-Type ответа
+    """
+    async with client.stream('GET', url) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            target.write(chunk)
+        return response.headers.get('Content-Type', '')
+
+
+async def work_async(concurrency=DOWNLOAD_CONCURRENCY, import_workers=2, poll_interval=1.0, once=False, stop=None,
+                     client=None):
+    """
+    Асинхронный цикл воркера: до concurrency скачиваний идут одновременно в одном потоке,
+    очередь опрашивается в отдельном потоке, скачанные прайсы импортируются пулом из import_workers потоков
+    """
+    loop = asyncio.get_running_loop()
+    queue_pool, import_pool = ThreadPoolExecutor(1), ThreadPoolExecutor(import_workers)
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    def call(pool, func, *args):
+        return loop.run_in_executor(pool, partial(_with_connection, func, *args))
+
+    async def process(job):
+        try:
+            with SpooledTemporaryFile(SPOOL_SIZE) as target:
+                try:
+                    content_type = await download(client, job.url, target)
+                except Exception as error:
+                    await call(queue_pool, fail_job, job, error)
+                    return
+                target.seek(0)
+                await call(import_pool, _import_file, job, target, content_type)
+        finally:
+            slots.release()
+
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(timeout=httpx.Timeout(FETCH_TIMEOUT[1], connect=FETCH_TIMEOUT[0]),
+                                   follow_redirects=True)
+    try:
+        while stop is None or not stop.is_set():
+            await slots.acquire()
+            job = await call(queue_pool, claim_job)
+            if job is None:
+                slots.release()
+                if once:
+                    break
+                await asyncio.sleep(poll_interval)
+                continue
+            task = asyncio.create_task(process(job))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+    finally:
+        if own_client:
+            await client.aclose()
+        # connection.close нельзя передать напрямую: прокси разрешился бы в соединение текущего потока
+        queue_pool.submit(lambda: connection.close())
+        queue_pool.shutdown()
+        import_pool.shutdown()
@@ -0,0 +1,111 @@
+"""
+Отправка писем из таблицы EmailOutbox.
+Воркер забирает пачку готовых к отправке писем через SELECT ... FOR UPDATE SKIP LOCKED в короткой транзакции,
+помечая их отправляемыми с арендой на SEND_LEASE, и отправляет уже вне транзакции через одно SMTP-соединение:
+медленный SMTP-сервер не держит блокировки и соединение с базой в транзакции. Письма упавшего воркера
+забираются заново по истечении аренды, поэтому доставка - "хотя бы один раз". Неудачные письма
+откладываются с экспоненциальной задержкой.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction, close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 8
+# задержка перед повторной отправкой: RETRY_DELAY * 2 ** (попытка - 1), но не более MAX_RETRY_DELAY
+RETRY_DELAY = timedelta(seconds=30)
+MAX_RETRY_DELAY = timedelta(hours=1)
+# сколько письмо считается отправляемым забравшим его воркером; должно с запасом покрывать отправку пачки
+SEND_LEASE = timedelta(minutes=10)
+
+
+def queue_email(subject, body, to, from_email=None):
+    """
+    Ставим письмо в очередь. Вызывается внутри транзакции изменения, которое его порождает
+    """
+    return EmailOutbox.objects.create(subject=subject, body=body, to=list(to),
+                                      from_email=from_email or settings.EMAIL_HOST_USER)
+
+
+def queue_emails(messages, from_email=None):
+    """
+    Ставим в очередь пачку писем [(тема, текст, получатели)] одним INSERT
+    """
+    from_email = from_email or settings.EMAIL_HOST_USER
+    return EmailOutbox.objects.bulk_create([EmailOutbox(subject=subject, body=body, to=list(to), from_email=from_email)
+                                            for subject, body, to in messages])
+
+
+def retry_delay(attempts):
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def claim_pending(batch_size=BATCH_SIZE):
+    """
+    Забираем пачку писем, готовых к отправке, и писем с истекшей арендой; каждый захват - попытка отправки
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(EmailOutbox.objects.select_for_update(skip_locked=True).filter(
+            state__in=('pending', 'sending'), send_after__lte=now).order_by('send_after', 'id')[:batch_size])
+        EmailOutbox.objects.filter(id__in=[message.id for message in messages]).update(
+            state='sending', send_after=now + SEND_LEASE, attempts=F('attempts') + 1)
+    for message in messages:
+        message.attempts += 1
+    return messages
+
+
+def send_pending(batch_size=BATCH_SIZE, connection=None):
+    """
+    Отправляем одну пачку писем, возвращаем количество обработанных
+    """
+    messages = claim_pending(batch_size)
+    if not messages:
+        return 0
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        for message in messages:
+            _fail(message, error)
+    else:
+        try:
+            for message in messages:
+                try:
+                    EmailMultiAlternatives(message.subject, message.body, message.from_email, message.to,
+                                           connection=connection).send()
+                except Exception as error:
+                    _fail(message, error)
+                else:
+                    message.state = 'sent'
+                    message.sent_at = timezone.now()
+        finally:
+            connection.close()
+    EmailOutbox.objects.bulk_update(messages, ('state', 'send_after', 'sent_at', 'last_error'))
+    return len(messages)
+
+
+def _fail(message, error):
+    message.last_error = str(error)
+    if message.attempts >= MAX_ATTEMPTS:
+        message.state = 'failed'
+    else:
+        message.state = 'pending'
+        message.send_after = timezone.now() + retry_delay(message.attempts)
+
+
+def work(batch_size=BATCH_SIZE, poll_interval=5.0, once=False):
+    while True:
+        close_old_connections()
+        if send_pending(batch_size):
+            continue
+        if once:
+            break
+        time.sleep(poll_interval)
@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from shop_backend.export import ORDER_COLUMNS, PRODUCT_COLUMNS, FORMATS, order_rows, product_rows, export
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает заказы или каталог в CSV/NDJSON для аналитики'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=('orders', 'products'), help='Что выгружать')
+        parser.add_argument('--output-format', choices=FORMATS, default='csv', help='Формат выгрузки')
+        parser.add_argument('--gzip', action='store_true', help='Сжимать выгрузку gzip')
+        parser.add_argument('--output', help='Файл выгрузки, по умолчанию stdout')
+        parser.add_argument('--shop-id', type=int, help='Только каталог этого магазина')
+        parser.add_argument('--since', help='Заказы не раньше этой даты (ISO 8601)')
+        parser.add_argument('--until', help='Заказы раньше этой даты (ISO 8601)')
+
+    def handle(self, *args, **options):
+        if options['dataset'] == 'orders':
+            bounds = {}
+            for name in ('since', 'until'):
+                if options[name]:
+                    bounds[name] = parse_datetime(options[name])
+                    if bounds[name] is None:
+                        raise CommandError(f'Неверный формат --{name}')
+            columns, rows = ORDER_COLUMNS, order_rows(**bounds)
+        else:
+            columns, rows = PRODUCT_COLUMNS, product_rows(shop_id=options['shop_id'])
+
+        chunks = export(columns, rows, options['output_format'], options['gzip'])
+        if options['output']:
+            with open(options['output'], 'wb') as file:
+                for chunk in chunks:
+                    file.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from shop_backend.jobs import work, work_async, DOWNLOAD_CONCURRENCY
+
+
+class Command(BaseCommand):
+    help = 'Запускает пул воркеров, выполняющих задачи импорта прайсов из очереди ImportJob'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Количество потоков-воркеров')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Пауза между опросами пустой очереди, секунды')
+        parser.add_argument('--once', action='store_true', help='Разобрать очередь и завершиться')
+        parser.add_argument('--async', dest='use_async', action='store_true',
+                            help='Скачивать прайсы асинхронно в одном потоке, --workers потоков только импортируют')
+        parser.add_argument('--concurrency', type=int, default=DOWNLOAD_CONCURRENCY,
+                            help='Количество одновременных скачиваний в режиме --async')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        if options['use_async']:
+            try:
+                asyncio.run(work_async(concurrency=options['concurrency'], import_workers=options['workers'],
+                                       poll_interval=options['poll_interval'], once=options['once'], stop=stop))
+            except KeyboardInterrupt:
+                stop.set()
+            return
+
+        threads = [threading.Thread(target=self._work, args=(options['poll_interval'], options['once'], stop),
+                                    daemon=True) for _ in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    @staticmethod
+    def _work(poll_interval, once, stop):
+        try:
+            work(poll_interval=poll_interval, once=once, stop=stop)
+        finally:
+            connection.close()
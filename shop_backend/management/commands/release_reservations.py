@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from shop_backend.checkout import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Отменяет неподтвержденные заказы с истекшим резервом и возвращает товар на склад'
+
+    def handle(self, *args, **options):
+        released = 0
+        while True:
+            count = release_expired_reservations()
+            if not count:
+                break
+            released += count
+        self.stdout.write(f'Отменено заказов: {released}')
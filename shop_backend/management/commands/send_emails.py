@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from shop_backend.mailer import work, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди EmailOutbox пачками через одно SMTP-соединение'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Писем за одно соединение')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Пауза между опросами очереди, секунды')
+        parser.add_argument('--once', action='store_true', help='Отправить накопившиеся письма и завершиться')
+
+    def handle(self, *args, **options):
+        try:
+            work(batch_size=options['batch_size'], poll_interval=options['poll_interval'], once=options['once'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,66 @@
+"""
+Учет запросов к базе на каждый HTTP-запрос.
+Считаем количество и время SQL-запросов; превышение бюджета QUERY_BUDGET (или атрибута query_budget
+у класса представления) пишется в лог, а при QUERY_BUDGET_RAISE - приводит к ошибке, чтобы N+1
+в представлениях ловился в тестах. Ошибка бывает только у безопасных методов: изменяющий запрос к этому
+моменту уже зафиксировал свою транзакцию, и 500 скрыл бы от клиента выполненное изменение.
+При DEBUG итог отдается в заголовке Server-Timing.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class QueryBudgetMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_budget = settings.QUERY_BUDGET
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+
+        if settings.DEBUG:
+            response['Server-Timing'] = f'db;dur={counter.duration * 1000:.1f};desc="{counter.count} queries"'
+        budget = request.query_budget
+        if budget is not None and counter.count > budget:
+            message = f'{request.method} {request.path}: {counter.count} запросов к базе при бюджете {budget} ' \
+                      f'({counter.duration * 1000:.1f} мс)'
+            if settings.QUERY_BUDGET_RAISE and request.method in SAFE_METHODS:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # APIView.as_view() сохраняет класс в view.cls, View.as_view() - в view.view_class
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        budget = getattr(view_class, 'query_budget', None)
+        if budget is not None:
+            request.query_budget = budget
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0002_alter_order_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(verbose_name='Ссылка на прайс')),
+                ('state', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('done', 'Завершен'), ('failed', 'Ошибка')], default='queued', max_length=10, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('rows_processed', models.PositiveIntegerField(default=0, verbose_name='Обработано позиций')),
+                ('errors', models.TextField(blank=True, verbose_name='Ошибки')),
+                ('stats', models.JSONField(blank=True, default=dict, verbose_name='Итоги импорта')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Задача импорта',
+                'verbose_name_plural': 'Список задач импорта',
+                'ordering': ('-created_at',),
+                'indexes': [models.Index(fields=['state', 'created_at'], name='import_job_queue')],
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:35
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0003_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=100, verbose_name='Значение')),
+            ],
+            options={
+                'verbose_name': 'Фасет товара',
+                'verbose_name_plural': 'Список фасетов товаров',
+            },
+        ),
+        migrations.AddField(
+            model_name='productinfo',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='productinfo',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_info_search'),
+        ),
+        migrations.AddField(
+            model_name='productfacet',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='shop_backend.category', verbose_name='Категория'),
+        ),
+        migrations.AddField(
+            model_name='productfacet',
+            name='parameter',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='shop_backend.parameter', verbose_name='Параметр'),
+        ),
+        migrations.AddField(
+            model_name='productfacet',
+            name='product_info',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='shop_backend.productinfo', verbose_name='Информация о продукте'),
+        ),
+        migrations.AddField(
+            model_name='productfacet',
+            name='shop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='shop_backend.shop', verbose_name='Магазин'),
+        ),
+        migrations.AddIndex(
+            model_name='productfacet',
+            index=models.Index(fields=['parameter', 'value'], name='product_facet_value'),
+        ),
+        migrations.AddIndex(
+            model_name='productfacet',
+            index=models.Index(fields=['category', 'parameter', 'value'], name='product_facet_category'),
+        ),
+        migrations.AddConstraint(
+            model_name='productfacet',
+            constraint=models.UniqueConstraint(fields=('product_info', 'parameter'), name='unique_product_facet'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE shop_backend_productinfo AS info
+                SET search_vector = setweight(to_tsvector('russian', product.name), 'A') ||
+                                    setweight(to_tsvector('simple', info.model), 'B')
+                FROM shop_backend_product AS product
+                WHERE product.id = info.product_id;
+
+                INSERT INTO shop_backend_productfacet (product_info_id, shop_id, category_id, parameter_id, value)
+                SELECT param.product_info_id, info.shop_id, product.category_id, param.parameter_id, param.value
+                FROM shop_backend_productparameter AS param
+                JOIN shop_backend_productinfo AS info ON info.id = param.product_info_id
+                JOIN shop_backend_product AS product ON product.id = info.product_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0004_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество позиций'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Сумма заказа'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='model',
+            field=models.CharField(blank=True, max_length=80, verbose_name='Модель'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.PositiveIntegerField(default=0, verbose_name='Цена'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=80, verbose_name='Название'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE shop_backend_orderitem AS item
+                SET price = info.price, model = info.model, product_name = product.name
+                FROM shop_backend_productinfo AS info
+                JOIN shop_backend_product AS product ON product.id = info.product_id
+                WHERE info.id = item.product_info_id;
+
+                UPDATE shop_backend_order AS orders
+                SET total_sum = totals.total_sum, items_count = totals.items_count
+                FROM (SELECT order_id, SUM(quantity * price) AS total_sum, COUNT(*) AS items_count
+                      FROM shop_backend_orderitem GROUP BY order_id) AS totals
+                WHERE totals.order_id = orders.id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
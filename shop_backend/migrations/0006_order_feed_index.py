@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0005_order_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('state', 'basket'), _negated=True), fields=['dt', 'id'], name='order_feed'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0006_order_feed_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255, verbose_name='Тема')),
+                ('body', models.TextField(verbose_name='Текст')),
+                ('from_email', models.CharField(blank=True, max_length=255, verbose_name='Отправитель')),
+                ('to', models.JSONField(default=list, verbose_name='Получатели')),
+                ('state', models.CharField(choices=[('pending', 'Ожидает отправки'), ('sent', 'Отправлено'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток отправки')),
+                ('send_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Отправить после')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+            ],
+            options={
+                'verbose_name': 'Исходящее письмо',
+                'verbose_name_plural': 'Очередь исходящих писем',
+                'ordering': ('id',),
+                'indexes': [models.Index(condition=models.Q(('state', 'pending')), fields=['send_after', 'id'], name='email_outbox_pending')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0007_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='reserved_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Резерв до'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('state', 'new')), fields=['reserved_until'], name='order_reservation'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0008_order_reservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'state', 'dt'], name='order_user_state'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['state', 'dt'], name='order_state_dt'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'category'], name='product_name_category'),
+        ),
+        migrations.AddIndex(
+            model_name='productinfo',
+            index=models.Index(fields=['shop', 'id'], name='product_info_shop'),
+        ),
+        migrations.AddIndex(
+            model_name='productinfo',
+            index=models.Index(fields=['shop', 'external_id'], name='product_info_external'),
+        ),
+        # одиночные индексы по FK удаляем только после создания покрывающих составных
+        migrations.AlterField(
+            model_name='order',
+            name='user',
+            field=models.ForeignKey(blank=True, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='productinfo',
+            name='shop',
+            field=models.ForeignKey(blank=True, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='product_infos', to='shop_backend.shop', verbose_name='Магазин'),
+        ),
+    ]
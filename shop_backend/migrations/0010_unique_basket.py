@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0009_index_plan'),
+    ]
+
+    operations = [
+        # сливаем дубли корзин в самую раннюю: переносим позиции с товарами, которых в ней нет
+        # (из дублей с одинаковым товаром берем первую позицию), остальное удаляется вместе с дублями
+        migrations.RunSQL(
+            sql="""
+                CREATE TEMPORARY TABLE basket_duplicates ON COMMIT DROP AS
+                SELECT orders.id, keepers.id AS keeper_id
+                FROM shop_backend_order AS orders
+                JOIN (SELECT user_id, MIN(id) AS id FROM shop_backend_order
+                      WHERE state = 'basket' GROUP BY user_id HAVING COUNT(*) > 1) AS keepers
+                  ON keepers.user_id = orders.user_id
+                WHERE orders.state = 'basket' AND orders.id <> keepers.id;
+
+                UPDATE shop_backend_orderitem AS item SET order_id = moved.keeper_id
+                FROM (SELECT DISTINCT ON (duplicates.keeper_id, item.product_info_id) item.id, duplicates.keeper_id
+                      FROM shop_backend_orderitem AS item
+                      JOIN basket_duplicates AS duplicates ON duplicates.id = item.order_id
+                      WHERE NOT EXISTS (SELECT 1 FROM shop_backend_orderitem AS kept
+                                        WHERE kept.order_id = duplicates.keeper_id
+                                          AND kept.product_info_id = item.product_info_id)
+                      ORDER BY duplicates.keeper_id, item.product_info_id, item.id) AS moved
+                WHERE item.id = moved.id;
+
+                DELETE FROM shop_backend_orderitem WHERE order_id IN (SELECT id FROM basket_duplicates);
+                DELETE FROM shop_backend_order WHERE id IN (SELECT id FROM basket_duplicates);
+
+                UPDATE shop_backend_order AS orders
+                SET total_sum = totals.total_sum, items_count = totals.items_count
+                FROM (SELECT order_id, SUM(quantity * price) AS total_sum, COUNT(*) AS items_count
+                      FROM shop_backend_orderitem
+                      WHERE order_id IN (SELECT keeper_id FROM basket_duplicates)
+                      GROUP BY order_id) AS totals
+                WHERE totals.order_id = orders.id;
+
+                -- проверяем отложенные внешние ключи сейчас, иначе индекс нельзя создать в этой же транзакции
+                SET CONSTRAINTS ALL IMMEDIATE;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('state', 'basket')), fields=('user',), name='unique_basket'),
+        ),
+    ]
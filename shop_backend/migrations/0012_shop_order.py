@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0011_order_transition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('basket', 'Статус корзины'), ('new', 'Новый'), ('confirmed', 'Подтвержден'), ('assembled', 'Собран'), ('sent', 'Отправлен'), ('delivered', 'Доставлен'), ('canceled', 'Отменен')], max_length=15, verbose_name='Статус')),
+                ('dt', models.DateTimeField()),
+                ('total_sum', models.PositiveIntegerField(default=0, verbose_name='Сумма')),
+                ('items_count', models.PositiveIntegerField(default=0, verbose_name='Количество позиций')),
+                ('order', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shop_orders', to='shop_backend.order', verbose_name='Заказ')),
+                ('shop', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shop_orders', to='shop_backend.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Заказ магазина',
+                'verbose_name_plural': 'Список заказов магазинов',
+                'indexes': [models.Index(fields=['shop', 'dt', 'id'], name='shop_order_feed'), models.Index(fields=['shop', 'state', 'dt'], name='shop_order_state')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoporder',
+            constraint=models.UniqueConstraint(fields=('order', 'shop'), name='unique_shop_order'),
+        ),
+        # раскладываем уже оформленные заказы по магазинам
+        migrations.RunSQL(
+            """
+            INSERT INTO shop_backend_shoporder (order_id, shop_id, state, dt, total_sum, items_count)
+            SELECT item.order_id, item.shop_id, ord.state, ord.dt, SUM(item.quantity * item.price), COUNT(*)
+            FROM shop_backend_orderitem item
+            JOIN shop_backend_order ord ON ord.id = item.order_id
+            WHERE ord.state <> 'basket'
+            GROUP BY item.order_id, item.shop_id, ord.state, ord.dt
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
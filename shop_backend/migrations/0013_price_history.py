@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:09
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0012_shop_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('price', models.PositiveIntegerField(verbose_name='Цена')),
+                ('price_rrc', models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('product_info', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shop_backend.productinfo', verbose_name='Информация о продукте')),
+                ('shop', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shop_backend.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Цена и остаток товара',
+                'verbose_name_plural': 'История цен и остатков',
+                'indexes': [django.contrib.postgres.indexes.BrinIndex(fields=['dt'], name='price_history_dt', pages_per_range=32), models.Index(fields=['product_info', 'dt'], name='price_history_sku')],
+            },
+        ),
+        # начальный снимок текущих цен и остатков
+        migrations.RunSQL(
+            """
+            INSERT INTO shop_backend_pricehistory (product_info_id, shop_id, dt, price, price_rrc, quantity)
+            SELECT id, shop_id, now(), price, price_rrc, quantity FROM shop_backend_productinfo
+            WHERE shop_id IS NOT NULL ORDER BY id
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
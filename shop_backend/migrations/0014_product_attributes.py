@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:13
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0013_price_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productinfo',
+            name='attributes',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='Параметры'),
+        ),
+        # переносим параметры в новое поле до построения индекса
+        migrations.RunSQL(
+            """
+            UPDATE shop_backend_productinfo info SET attributes = params.items
+            FROM (
+                SELECT pp.product_info_id, jsonb_agg(jsonb_build_array(p.name, pp.value) ORDER BY pp.id) AS items
+                FROM shop_backend_productparameter pp
+                JOIN shop_backend_parameter p ON p.id = pp.parameter_id
+                GROUP BY pp.product_info_id
+            ) params
+            WHERE params.product_info_id = info.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='productinfo',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['attributes'], name='product_info_attributes', opclasses=['jsonb_path_ops']),
+        ),
+    ]
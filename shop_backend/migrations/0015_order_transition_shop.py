@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0014_product_attributes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordertransition',
+            name='shop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop_backend.shop', verbose_name='Магазин'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0015_order_transition_shop'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='stock_updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Остатки загружены'),
+        ),
+    ]
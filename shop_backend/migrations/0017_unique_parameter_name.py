@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0016_shop_stock_updated_at'),
+    ]
+
+    operations = [
+        # сливаем одноименные параметры в параметр с меньшим id; если у позиции оказалось два значения
+        # одного параметра, остается первое по id
+        migrations.RunSQL(
+            """
+            CREATE TEMPORARY TABLE parameter_map ON COMMIT DROP AS
+            SELECT id, min(id) OVER (PARTITION BY name) AS keep_id FROM shop_backend_parameter
+            WHERE name IN (SELECT name FROM shop_backend_parameter GROUP BY name HAVING count(*) > 1);
+
+            DELETE FROM shop_backend_productparameter pp
+            USING parameter_map m, shop_backend_productparameter other, parameter_map om
+            WHERE pp.parameter_id = m.id AND other.parameter_id = om.id AND om.keep_id = m.keep_id
+              AND other.product_info_id = pp.product_info_id AND other.id < pp.id;
+            UPDATE shop_backend_productparameter pp SET parameter_id = m.keep_id
+            FROM parameter_map m WHERE pp.parameter_id = m.id AND m.id <> m.keep_id;
+
+            DELETE FROM shop_backend_productfacet pf
+            USING parameter_map m, shop_backend_productfacet other, parameter_map om
+            WHERE pf.parameter_id = m.id AND other.parameter_id = om.id AND om.keep_id = m.keep_id
+              AND other.product_info_id = pf.product_info_id AND other.id < pf.id;
+            UPDATE shop_backend_productfacet pf SET parameter_id = m.keep_id
+            FROM parameter_map m WHERE pf.parameter_id = m.id AND m.id <> m.keep_id;
+
+            DELETE FROM shop_backend_parameter p USING parameter_map m WHERE p.id = m.id AND m.id <> m.keep_id;
+            -- отложенные проверки внешних ключей выполняем сейчас, иначе ALTER TABLE ниже откажет
+            SET CONSTRAINTS ALL IMMEDIATE;
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='parameter',
+            constraint=models.UniqueConstraint(fields=('name',), name='unique_parameter_name'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0017_unique_parameter_name'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='productinfo',
+            name='unique_product_info',
+        ),
+        migrations.RemoveIndex(
+            model_name='productinfo',
+            name='product_info_external',
+        ),
+        # повторы (shop, external_id) сливаем в позицию с меньшим id: позиции заказов переводим на нее
+        # (в одном заказе - в одну позицию с суммарным количеством и пересчетом итогов), параметры и фасеты
+        # повторов удаляем; журнал цен не трогаем - как и у удаленных товаров, его строки остаются
+        migrations.RunSQL(
+            """
+            CREATE TEMPORARY TABLE product_info_map ON COMMIT DROP AS
+            SELECT id, keep_id FROM (
+                SELECT id, min(id) OVER (PARTITION BY shop_id, external_id) AS keep_id FROM shop_backend_productinfo
+            ) infos WHERE id <> keep_id;
+
+            CREATE TEMPORARY TABLE order_item_map ON COMMIT DROP AS
+            SELECT oi.id, oi.order_id, coalesce(m.keep_id, oi.product_info_id) AS keep_id,
+                   min(oi.id) OVER items AS keep_item_id, sum(oi.quantity) OVER items AS quantity
+            FROM shop_backend_orderitem oi LEFT JOIN product_info_map m ON m.id = oi.product_info_id
+            WHERE oi.product_info_id IN (SELECT id FROM product_info_map UNION SELECT keep_id FROM product_info_map)
+            WINDOW items AS (PARTITION BY oi.order_id, coalesce(m.keep_id, oi.product_info_id));
+
+            DELETE FROM shop_backend_orderitem oi USING order_item_map im
+            WHERE oi.id = im.id AND im.id <> im.keep_item_id;
+            UPDATE shop_backend_orderitem oi SET product_info_id = im.keep_id, quantity = im.quantity
+            FROM order_item_map im WHERE oi.id = im.id AND im.id = im.keep_item_id;
+
+            UPDATE shop_backend_order o SET total_sum = t.total, items_count = t.count FROM (
+                SELECT order_id, sum(quantity * price) AS total, count(*) AS count FROM shop_backend_orderitem
+                WHERE order_id IN (SELECT order_id FROM order_item_map WHERE id <> keep_item_id) GROUP BY order_id
+            ) t WHERE o.id = t.order_id;
+            UPDATE shop_backend_shoporder so SET total_sum = t.total, items_count = t.count FROM (
+                SELECT order_id, shop_id, sum(quantity * price) AS total, count(*) AS count
+                FROM shop_backend_orderitem
+                WHERE order_id IN (SELECT order_id FROM order_item_map WHERE id <> keep_item_id)
+                GROUP BY order_id, shop_id
+            ) t WHERE so.order_id = t.order_id AND so.shop_id = t.shop_id;
+
+            DELETE FROM shop_backend_productparameter WHERE product_info_id IN (SELECT id FROM product_info_map);
+            DELETE FROM shop_backend_productfacet WHERE product_info_id IN (SELECT id FROM product_info_map);
+            DELETE FROM shop_backend_productinfo WHERE id IN (SELECT id FROM product_info_map);
+            -- отложенные проверки внешних ключей выполняем сейчас, иначе ALTER TABLE ниже откажет
+            SET CONSTRAINTS ALL IMMEDIATE;
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='productinfo',
+            constraint=models.UniqueConstraint(fields=('shop', 'external_id'), name='unique_product_info_external'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0018_unique_product_info_external'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='emailoutbox',
+            name='email_outbox_pending',
+        ),
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='state',
+            field=models.CharField(choices=[('pending', 'Ожидает отправки'), ('sending', 'Отправляется'), ('sent', 'Отправлено'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус'),
+        ),
+        migrations.AddIndex(
+            model_name='emailoutbox',
+            index=models.Index(condition=models.Q(('state__in', ['pending', 'sending'])), fields=['send_after', 'id'], name='email_outbox_pending'),
+        ),
+    ]
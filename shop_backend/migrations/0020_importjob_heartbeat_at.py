@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0019_email_outbox_sending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        # выполняющиеся задачи до миграции отмечались только при старте
+        migrations.RunSQL(
+            "UPDATE shop_backend_importjob SET heartbeat_at = started_at WHERE state = 'running'",
+            migrations.RunSQL.noop,
+        ),
+    ]
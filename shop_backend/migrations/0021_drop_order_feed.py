@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:18
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_backend', '0020_importjob_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_feed',
+        ),
+    ]
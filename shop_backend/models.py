@@ -1,7 +1,10 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_rest_passwordreset.tokens import get_token_generator
 
@@ -15,6 +18,20 @@ STATE_CHOICES = (
     ('canceled', 'Отменен'),
 )
 
+IMPORT_STATE_CHOICES = (
+    ('queued', 'В очереди'),
+    ('running', 'Выполняется'),
+    ('done', 'Завершен'),
+    ('failed', 'Ошибка'),
+)
+
+OUTBOX_STATE_CHOICES = (
+    ('pending', 'Ожидает отправки'),
+    ('sending', 'Отправляется'),
+    ('sent', 'Отправлено'),
+    ('failed', 'Ошибка'),
+)
+
 USER_TYPE_CHOICES = (
     ('shop', 'Магазин'),
     ('buyer', 'Покупатель'),
@@ -105,6 +122,9 @@ class Shop(models.Model):
                                 blank=True, null=True,
                                 on_delete=models.CASCADE)
     state = models.BooleanField(verbose_name='статус получения заказов', default=True)
+    # начало последнего импорта прайса: с него остатки позиций - остатки поставщика,
+    # уже без товара заказов, оформленных раньше
+    stock_updated_at = models.DateTimeField(verbose_name='Остатки загружены', blank=True, null=True, editable=False)
 
     # filename
 
@@ -139,6 +159,10 @@ class Product(models.Model):
         verbose_name = 'Продукт'
         verbose_name_plural = "Список продуктов"
         ordering = ('-name',)
+        indexes = [
+            # импорт ищет продукты по (название, категория)
+            models.Index(fields=['name', 'category'], name='product_name_category'),
+        ]
 
     def __str__(self):
         return self.name
@@ -149,17 +173,29 @@ class ProductInfo(models.Model):
     external_id = models.PositiveIntegerField(verbose_name='Внешний ИД')
     product = models.ForeignKey(Product, verbose_name='Продукт', related_name='product_infos', blank=True,
                                 on_delete=models.CASCADE)
+    # одиночный индекс по shop_id не нужен: его покрывают составные индексы ниже
     shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='product_infos', blank=True,
-                             on_delete=models.CASCADE)
+                             on_delete=models.CASCADE, db_index=False)
     quantity = models.PositiveIntegerField(verbose_name='Количество')
     price = models.PositiveIntegerField(verbose_name='Цена')
     price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    # название продукта и модель для полнотекстового поиска, заполняется импортом
+    search_vector = SearchVectorField(null=True, editable=False)
+    # параметры позиции парами [имя, значение] в порядке ProductParameter, см. parameters.refresh_attributes
+    attributes = models.JSONField(verbose_name='Параметры', default=list, blank=True, editable=False)
 
     class Meta:
         verbose_name = 'Информация о продукте'
         verbose_name_plural = "Информационный список о продуктах"
         constraints = [
-            models.UniqueConstraint(fields=['product', 'shop', 'external_id'], name='unique_product_info'),
+            # импорт сверяет прайс с загруженными позициями по (shop, external_id)
+            models.UniqueConstraint(fields=['shop', 'external_id'], name='unique_product_info_external'),
+        ]
+        indexes = [
+            GinIndex(fields=['search_vector'], name='product_info_search'),
+            GinIndex(fields=['attributes'], name='product_info_attributes', opclasses=['jsonb_path_ops']),
+            # выдача товаров магазина постранично по id
+            models.Index(fields=['shop', 'id'], name='product_info_shop'),
         ]
 
 
@@ -170,6 +206,9 @@ class Parameter(models.Model):
         verbose_name = 'Имя параметра'
         verbose_name_plural = "Список имен параметров"
         ordering = ('-name',)
+        constraints = [
+            models.UniqueConstraint(fields=['name'], name='unique_parameter_name'),
+        ]
 
     def __str__(self):
         return self.name
@@ -191,6 +230,57 @@ class ProductParameter(models.Model):
         ]
 
 
+class ProductFacet(models.Model):
+    """
+    Денормализованная копия ProductParameter с магазином и категорией для подсчета фасетов без соединений
+    """
+    product_info = models.ForeignKey(ProductInfo, verbose_name='Информация о продукте', related_name='facets',
+                                     on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='facets', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='facets',
+                                 on_delete=models.CASCADE)
+    parameter = models.ForeignKey(Parameter, verbose_name='Параметр', related_name='facets',
+                                  on_delete=models.CASCADE)
+    value = models.CharField(verbose_name='Значение', max_length=100)
+
+    class Meta:
+        verbose_name = 'Фасет товара'
+        verbose_name_plural = "Список фасетов товаров"
+        constraints = [
+            models.UniqueConstraint(fields=['product_info', 'parameter'], name='unique_product_facet'),
+        ]
+        indexes = [
+            models.Index(fields=['parameter', 'value'], name='product_facet_value'),
+            models.Index(fields=['category', 'parameter', 'value'], name='product_facet_category'),
+        ]
+
+
+class PriceHistory(models.Model):
+    """
+    Журнал цен и остатков позиций: импорт добавляет строку, только когда цена, РРЦ или остаток меняются.
+    Строки не меняются и не удаляются вместе с товаром (связи без ограничений в базе), а их dt растет
+    вместе с порядком вставки, поэтому окна по времени ищет компактный BRIN-индекс
+    """
+    product_info = models.ForeignKey(ProductInfo, verbose_name='Информация о продукте', related_name='+',
+                                     on_delete=models.DO_NOTHING, db_constraint=False, db_index=False)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='+', on_delete=models.DO_NOTHING,
+                             db_constraint=False, db_index=False)
+    dt = models.DateTimeField(default=timezone.now)
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Цена и остаток товара'
+        verbose_name_plural = "История цен и остатков"
+        indexes = [
+            # изменения магазина за период
+            BrinIndex(fields=['dt'], name='price_history_dt', pages_per_range=32),
+            # цена позиции на момент времени: последняя строка с dt не позже заданного
+            models.Index(fields=['product_info', 'dt'], name='price_history_sku'),
+        ]
+
+
 class Contact(models.Model):
     user = models.ForeignKey(User, verbose_name='Пользователь',
                              related_name='contacts', blank=True,
@@ -213,19 +303,36 @@ class Contact(models.Model):
 
 
 class Order(models.Model):
+    # одиночный индекс по user_id не нужен: его покрывает order_user_state
     user = models.ForeignKey(User, verbose_name='Пользователь',
                              related_name='orders', blank=True,
-                             on_delete=models.CASCADE)
+                             on_delete=models.CASCADE, db_index=False)
     dt = models.DateTimeField(auto_now_add=True)
     state = models.CharField(verbose_name='Статус', choices=STATE_CHOICES, max_length=15)
     contact = models.ForeignKey(Contact, verbose_name='Контакт',
                                 blank=True, null=True,
                                 on_delete=models.CASCADE)
+    # сводка по позициям, пересчитывается при изменении корзины и фиксируется при оформлении заказа
+    total_sum = models.PositiveIntegerField(verbose_name='Сумма заказа', default=0)
+    items_count = models.PositiveIntegerField(verbose_name='Количество позиций', default=0)
+    # до этого момента товар нового заказа зарезервирован, потом резерв возвращается на склад
+    reserved_until = models.DateTimeField(verbose_name='Резерв до', null=True, blank=True)
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = "Список-заказ"
         ordering = ('-dt',)
+        indexes = [
+            models.Index(fields=['reserved_until'], name='order_reservation', condition=models.Q(state='new')),
+            # корзина и заказы пользователя: (user, state), история заказов - по убыванию dt
+            models.Index(fields=['user', 'state', 'dt'], name='order_user_state'),
+            # заказы в статусе по дате
+            models.Index(fields=['state', 'dt'], name='order_state_dt'),
+        ]
+        constraints = [
+            # у пользователя не больше одной корзины, см. basket.resolve_basket
+            models.UniqueConstraint(fields=['user'], name='unique_basket', condition=models.Q(state='basket')),
+        ]
 
     def __str__(self):
         return str(self.dt)
@@ -242,6 +349,10 @@ class OrderItem(models.Model):
 
     shop = models.ForeignKey(Shop, verbose_name='Магазин ', related_name='ordered_items', blank=True,
                              on_delete=models.CASCADE)
+    # снимок товара на момент заказа, чтобы не зависеть от последующих импортов прайса
+    product_name = models.CharField(max_length=80, verbose_name='Название', blank=True)
+    model = models.CharField(max_length=80, verbose_name='Модель', blank=True)
+    price = models.PositiveIntegerField(verbose_name='Цена', default=0)
 
     class Meta:
         verbose_name = 'Заказанная позиция'
@@ -251,6 +362,62 @@ class OrderItem(models.Model):
         ]
 
 
+class ShopOrder(models.Model):
+    """
+    Часть заказа, приходящаяся на один магазин: создается при оформлении, статус следует за заказом.
+    Лента поставщика читает только свои части по индексам shop_order_*, без соединения с позициями
+    """
+    # одиночные индексы не нужны: order покрывает unique_shop_order, shop - индексы ленты
+    order = models.ForeignKey(Order, verbose_name='Заказ', related_name='shop_orders', on_delete=models.CASCADE,
+                              db_index=False)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='shop_orders', on_delete=models.CASCADE,
+                             db_index=False)
+    state = models.CharField(verbose_name='Статус', choices=STATE_CHOICES, max_length=15)
+    dt = models.DateTimeField()
+    # сумма и количество позиций магазина в заказе
+    total_sum = models.PositiveIntegerField(verbose_name='Сумма', default=0)
+    items_count = models.PositiveIntegerField(verbose_name='Количество позиций', default=0)
+
+    class Meta:
+        verbose_name = 'Заказ магазина'
+        verbose_name_plural = "Список заказов магазинов"
+        indexes = [
+            # лента поставщика по (dt, id) и выборка по статусу
+            models.Index(fields=['shop', 'dt', 'id'], name='shop_order_feed'),
+            models.Index(fields=['shop', 'state', 'dt'], name='shop_order_state'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'shop'], name='unique_shop_order'),
+        ]
+
+    def __str__(self):
+        return f'{self.order_id}: {self.shop_id}'
+
+
+class OrderTransition(models.Model):
+    """
+    Журнал смены статусов заказов: записи только добавляются, см. workflow.transition_orders
+    """
+    order = models.ForeignKey(Order, verbose_name='Заказ', related_name='transitions', on_delete=models.CASCADE)
+    # часть заказа, статус которой сменился; пусто - сменился статус заказа целиком
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='+', blank=True, null=True,
+                             on_delete=models.CASCADE)
+    from_state = models.CharField(verbose_name='Из статуса', choices=STATE_CHOICES, max_length=15)
+    to_state = models.CharField(verbose_name='В статус', choices=STATE_CHOICES, max_length=15)
+    # кто сменил статус; пусто, если статус сменил сам сервис (например, истек резерв)
+    user = models.ForeignKey(User, verbose_name='Пользователь', related_name='+', blank=True, null=True,
+                             on_delete=models.SET_NULL)
+    dt = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Смена статуса заказа'
+        verbose_name_plural = "Журнал статусов заказов"
+        ordering = ('id',)
+
+    def __str__(self):
+        return f'{self.order_id}: {self.from_state} -> {self.to_state}'
+
+
 class ConfirmEmailToken(models.Model):
     class Meta:
         verbose_name = 'Токен подтверждения Email'
@@ -288,3 +455,58 @@ class ConfirmEmailToken(models.Model):
 
     def __str__(self):
         return "Password reset token for user {user}".format(user=self.user)
+
+
+class ImportJob(models.Model):
+    user = models.ForeignKey(User, verbose_name='Пользователь', related_name='import_jobs',
+                             on_delete=models.CASCADE)
+    url = models.URLField(verbose_name='Ссылка на прайс')
+    state = models.CharField(verbose_name='Статус', choices=IMPORT_STATE_CHOICES, max_length=10, default='queued')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # последняя отметка выполняющейся задачи о работе, см. jobs.claim_job
+    heartbeat_at = models.DateTimeField(null=True, blank=True, editable=False)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    rows_processed = models.PositiveIntegerField(verbose_name='Обработано позиций', default=0)
+    errors = models.TextField(verbose_name='Ошибки', blank=True)
+    stats = models.JSONField(verbose_name='Итоги импорта', default=dict, blank=True)
+
+    class Meta:
+        verbose_name = 'Задача импорта'
+        verbose_name_plural = "Список задач импорта"
+        ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['state', 'created_at'], name='import_job_queue'),
+        ]
+
+    def __str__(self):
+        return f'{self.url} ({self.state})'
+
+
+class EmailOutbox(models.Model):
+    """
+    Исходящие письма: пишутся в той же транзакции, что и изменение, и отправляются воркером send_emails
+    """
+    subject = models.CharField(verbose_name='Тема', max_length=255)
+    body = models.TextField(verbose_name='Текст')
+    from_email = models.CharField(verbose_name='Отправитель', max_length=255, blank=True)
+    to = models.JSONField(verbose_name='Получатели', default=list)
+    state = models.CharField(verbose_name='Статус', choices=OUTBOX_STATE_CHOICES, max_length=10, default='pending')
+    attempts = models.PositiveSmallIntegerField(verbose_name='Попыток отправки', default=0)
+    send_after = models.DateTimeField(verbose_name='Отправить после', default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(verbose_name='Последняя ошибка', blank=True)
+
+    class Meta:
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = "Очередь исходящих писем"
+        ordering = ('id',)
+        indexes = [
+            # у отправляемых писем send_after - срок аренды, по его истечении письмо забирается заново
+            models.Index(fields=['send_after', 'id'], name='email_outbox_pending',
+                         condition=models.Q(state__in=['pending', 'sending'])),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.to)}'
@@ -0,0 +1,43 @@
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from rest_framework.pagination import CursorPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация списка товаров по id: каждая страница - индексный диапазон id > курсора
+    """
+    ordering = 'id'
+    page_size_query_param = 'limit'
+    max_page_size = 200
+
+
+def encode_feed_cursor(dt, pk):
+    """
+    Курсор ленты (заказов, истории цен) - позиция последней отданной записи (dt, id)
+    """
+    return urlsafe_b64encode(f'{dt.isoformat()}|{pk}'.encode()).decode()
+
+
+def decode_feed_cursor(value):
+    try:
+        dt, pk = urlsafe_b64decode(value.encode()).decode().split('|')
+        dt = parse_datetime(dt)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Неверный курсор')
+    if dt is None:
+        raise ValueError('Неверный курсор')
+    return dt, pk
+
+
+def parse_limit(params, max_limit):
+    """
+    Размер страницы из параметра limit: по умолчанию PAGE_SIZE, не больше max_limit; ValueError, если не положительный
+    """
+    limit = int(params.get('limit', settings.REST_FRAMEWORK['PAGE_SIZE']))
+    if limit < 1:
+        raise ValueError('limit должен быть положительным')
+    return min(limit, max_limit)
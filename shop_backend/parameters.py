@@ -0,0 +1,82 @@
+"""
+Интернирование параметров товаров.
+Имена параметров разрешаются в id через кеш процесса: импорт обращается к базе только за именами,
+которых процесс еще не видел. Кеш процесса сбрасывается по общей версии PARAMETERS_VERSION_KEY,
+поэтому переименование или удаление параметра в одном процессе видят все. Параметры позиции дублируются
+в ProductInfo.attributes парами [имя, значение] в порядке ProductParameter, поэтому карточка товара
+читается одной строкой, а фильтр по значению (attributes @> '[["Цвет", "черный"]]') идет по GIN-индексу.
+"""
+from threading import Lock
+
+from django.contrib.postgres.aggregates import JSONBAgg
+from django.db import transaction
+from django.db.models import F, Func, JSONField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .cache import PARAMETERS_VERSION_KEY, get_version, bump_version
+from .models import Parameter, ProductInfo, ProductParameter
+
+# имя параметра -> id, общий для всех импортов процесса, и версия, при которой он собран
+_parameter_ids = {}
+_version = None
+_lock = Lock()
+
+
+def parameter_ids(names):
+    """
+    Возвращаем {имя: id} для имен names, создавая недостающие параметры
+    """
+    global _version
+    names = set(names)
+    version = get_version(PARAMETERS_VERSION_KEY)
+    with _lock:
+        if version != _version:
+            _parameter_ids.clear()
+            _version = version
+        ids = {name: _parameter_ids[name] for name in names if name in _parameter_ids}
+    missing = names - ids.keys()
+    if not missing:
+        return ids
+    found = dict(Parameter.objects.filter(name__in=missing).values_list('name', 'id'))
+    created = missing - found.keys()
+    if created:
+        # параллельный импорт мог создать те же имена: конфликты пропускаем и перечитываем id
+        Parameter.objects.bulk_create([Parameter(name=name) for name in created], ignore_conflicts=True)
+        found.update(Parameter.objects.filter(name__in=created).values_list('name', 'id'))
+    ids.update(found)
+    # новые параметры попадают в кеш только после фиксации: откат не должен оставить в нем чужие id
+    transaction.on_commit(lambda: _remember(found, version))
+    return ids
+
+
+def _remember(ids, version):
+    with _lock:
+        if version == _version:
+            _parameter_ids.update(ids)
+
+
+def forget_parameters():
+    """
+    Сбрасываем кеш имен параметров во всех процессах
+    """
+    bump_version(PARAMETERS_VERSION_KEY)
+    with _lock:
+        _parameter_ids.clear()
+
+
+def refresh_attributes(info_ids):
+    """
+    Пересобираем ProductInfo.attributes позиций по их ProductParameter одним UPDATE
+    """
+    pairs = ProductParameter.objects.filter(product_info_id=OuterRef('pk')).order_by().values(
+        'product_info_id').annotate(items=JSONBAgg(Func(F('parameter__name'), F('value'), function='jsonb_build_array',
+                                                        output_field=JSONField()), ordering='id')).values('items')
+    ProductInfo.objects.filter(id__in=info_ids).update(
+        attributes=Coalesce(Subquery(pairs), Value([], output_field=JSONField())))
+
+
+def product_parameters(attributes):
+    """
+    Параметры позиции в формате API: [{'parameter': имя, 'value': значение}]
+    """
+    return [{'parameter': name, 'value': value} for name, value in attributes]
@@ -0,0 +1,175 @@
+"""
+Потоковое чтение прайсов поставщиков.
+Прайс читается из файлоподобного объекта, последовательность goods отдается по одному товару,
+поэтому в памяти одновременно находится только текущая пачка, а не весь документ. Товары импортируются
+по мере чтения, поэтому ключи заголовка HEADER_KEYS должны идти в прайсе до goods.
+"""
+from ujson import loads as json_load
+from yaml import AliasEvent, ScalarEvent, SequenceStartEvent, SequenceEndEvent, MappingStartEvent, \
+    MappingEndEvent, ScalarNode, SequenceNode, MappingNode
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-lines')
+NDJSON_SUFFIXES = ('.jsonl', '.ndjson')
+# ключи заголовка, без которых товары импортировать нельзя
+HEADER_KEYS = ('shop', 'categories')
+# якорей YAML в одном прайсе не больше: каждый держит в памяти свой узел до конца документа
+MAX_ANCHORS = 1000
+# узлов, подставленных ссылками на якоря, в одном значении верхнего уровня (товаре) не больше:
+# вложенные ссылки раскрываются экспоненциально
+MAX_ALIAS_NODES = 10000
+
+
+def check_header(header):
+    """
+    Проверяем, что заголовок прочитан до товаров и содержит HEADER_KEYS
+    """
+    if not isinstance(header, dict):
+        raise ValueError('Заголовок прайса должен быть словарем')
+    missing = [key for key in HEADER_KEYS if header.get(key) in (None, '')]
+    if missing:
+        raise ValueError(f'В заголовке прайса до goods не указаны: {", ".join(missing)}')
+    return header
+
+
+class YamlCatalogReader:
+    """
+    Читаем YAML-прайс формата shop1.yaml через событийный API (libyaml, если доступен).
+    Ключи верхнего уровня до goods собираются в header, goods отдаются генератором.
+    """
+
+    def __init__(self, stream):
+        self.loader = SafeLoader(stream)
+        # имя якоря -> (узел, число узлов в нем с раскрытыми ссылками)
+        self.anchors = {}
+        self.header = {}
+        self._started = False
+        self._alias_nodes = 0
+
+    def read_header(self):
+        # StreamStart, DocumentStart, MappingStart
+        for _ in range(3):
+            self.loader.get_event()
+        self._started = True
+        while not self.loader.check_event(MappingEndEvent):
+            key = self._construct(self._compose())
+            if key == 'goods':
+                break
+            self.header[key] = self._construct(self._compose())
+        return check_header(self.header)
+
+    def goods(self):
+        if not self._started:
+            self.read_header()
+        if not self.loader.check_event(SequenceStartEvent):
+            return
+        self.loader.get_event()
+        while not self.loader.check_event(SequenceEndEvent):
+            yield self._construct(self._compose())
+        self.loader.get_event()
+        # ключи после goods (например, url) дочитываем в header
+        while not self.loader.check_event(MappingEndEvent):
+            key = self._construct(self._compose())
+            self.header[key] = self._construct(self._compose())
+
+    def _construct(self, node):
+        data = self.loader.construct_object(node, deep=True)
+        # не копим уже построенные объекты между товарами
+        self.loader.constructed_objects = {}
+        self.loader.recursive_objects = {}
+        return data
+
+    def _compose(self):
+        """
+        Узел значения верхнего уровня; узлы, подставленные ссылками, считаются в MAX_ALIAS_NODES
+        """
+        self._alias_nodes = 0
+        return self._compose_node()[0]
+
+    def _compose_node(self):
+        """
+        Возвращаем (узел, число узлов в нем с раскрытыми ссылками)
+        """
+        loader = self.loader
+        event = loader.get_event()
+        if isinstance(event, AliasEvent):
+            if event.anchor not in self.anchors:
+                raise ValueError(f'Неизвестный якорь YAML: {event.anchor}')
+            node, size = self.anchors[event.anchor]
+            self._alias_nodes += size
+            if self._alias_nodes > MAX_ALIAS_NODES:
+                raise ValueError(f'Ссылки на якоря YAML раскрываются больше чем в {MAX_ALIAS_NODES} узлов')
+            return node, size
+        size = 1
+        if isinstance(event, ScalarEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = loader.resolve(ScalarNode, event.value, event.implicit)
+            node = ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+        elif isinstance(event, SequenceStartEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = loader.resolve(SequenceNode, None, event.implicit)
+            node = SequenceNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+            while not loader.check_event(SequenceEndEvent):
+                item, item_size = self._compose_node()
+                node.value.append(item)
+                size += item_size
+            node.end_mark = loader.get_event().end_mark
+        elif isinstance(event, MappingStartEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = loader.resolve(MappingNode, None, event.implicit)
+            node = MappingNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+            while not loader.check_event(MappingEndEvent):
+                key_node, key_size = self._compose_node()
+                value_node, value_size = self._compose_node()
+                node.value.append((key_node, value_node))
+                size += key_size + value_size
+            node.end_mark = loader.get_event().end_mark
+        else:
+            raise ValueError(f'Неожиданное событие YAML: {event}')
+        if event.anchor is not None:
+            if event.anchor not in self.anchors and len(self.anchors) >= MAX_ANCHORS:
+                raise ValueError(f'В прайсе больше {MAX_ANCHORS} якорей YAML')
+            self.anchors[event.anchor] = (node, size)
+        return node, size
+
+
+class NdjsonCatalogReader:
+    """
+    Читаем прайс в формате JSON Lines: первая строка - заголовок {"shop": ..., "categories": [...]},
+    каждая следующая строка - один товар в том же виде, что и элемент goods в YAML
+    """
+
+    def __init__(self, stream):
+        self.lines = iter(stream)
+        self.header = None
+
+    def read_header(self):
+        if self.header is None:
+            self.header = {}
+            for line in self.lines:
+                if line.strip():
+                    self.header = json_load(line)
+                    break
+        return check_header(self.header)
+
+    def goods(self):
+        self.read_header()
+        for line in self.lines:
+            if line.strip():
+                yield json_load(line)
+
+
+def catalog_reader(stream, name='', content_type=''):
+    """
+    Выбираем читателя по расширению файла или Content-Type, по умолчанию - YAML
+    """
+    if content_type.split(';')[0].strip() in NDJSON_CONTENT_TYPES or name.endswith(NDJSON_SUFFIXES):
+        return NdjsonCatalogReader(stream)
+    return YamlCatalogReader(stream)
@@ -0,0 +1,90 @@
+"""
+Быстрая отрисовка товаров и заказов только для чтения.
+Строим ту же структуру, что ProductInfoSerializer и OrderSerializer, прямо из строк .values()
+и кодируем ujson: результат побайтно совпадает с выводом JSONRenderer, но без обхода полей DRF
+для каждой строки. Параметры товара берутся из самой строки (ProductInfo.attributes),
+позиции заказов читаются одним запросом на страницу.
+"""
+from django.http import HttpResponse
+from rest_framework.fields import DateTimeField
+from ujson import dumps as json_dump
+
+from .models import OrderItem
+from .parameters import product_parameters
+
+PRODUCT_INFO_FIELDS = ('id', 'model', 'product__name', 'product__category__name', 'shop_id', 'quantity', 'price',
+                       'price_rrc', 'attributes')
+ORDER_FIELDS = ('id', 'dt', 'state', 'total_sum', 'items_count', 'contact_id', 'contact__city', 'contact__street',
+                'contact__house', 'contact__structure', 'contact__building', 'contact__apartment',
+                'contact__phone')
+# часть заказа одного магазина: те же поля заказа, но сумма и количество позиций - только этого магазина
+SHOP_ORDER_FIELDS = ('order_id', 'dt', 'state', 'total_sum', 'items_count') + tuple(
+    'order__' + name for name in ORDER_FIELDS if name.startswith('contact'))
+ORDER_ITEM_FIELDS = ('order_id', 'id', 'product_info_id', 'product_name', 'model', 'price', 'quantity', 'shop_id')
+
+# то же представление даты, что у OrderSerializer (часовой пояс, формат, Z вместо +00:00)
+datetime_field = DateTimeField()
+
+
+def render_json(data):
+    """
+    Кодируем так же, как JSONRenderer с настройками по умолчанию: UTF-8 без пробелов
+    и с экранированными разделителями строк
+    """
+    return json_dump(data, ensure_ascii=False, escape_forward_slashes=False).replace(
+        '\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+def json_response(data, **kwargs):
+    return HttpResponse(render_json(data), content_type='application/json', **kwargs)
+
+
+def product_infos(rows):
+    """
+    rows - строки queryset.values(*PRODUCT_INFO_FIELDS) в нужном порядке
+    """
+    return [{'id': row['id'],
+             'model': row['model'],
+             'product': {'name': row['product__name'], 'category': row['product__category__name']},
+             'shop': row['shop_id'],
+             'quantity': row['quantity'],
+             'price': row['price'],
+             'price_rrc': row['price_rrc'],
+             'product_parameters': product_parameters(row['attributes'])}
+            for row in rows]
+
+
+def orders(rows, shop_id=None):
+    """
+    rows - строки queryset.values(*ORDER_FIELDS) в нужном порядке; shop_id оставляет в заказах
+    только позиции этого магазина
+    """
+    rows = list(rows)
+    items = {}
+    lines = OrderItem.objects.filter(order_id__in=[row['id'] for row in rows])
+    if shop_id is not None:
+        lines = lines.filter(shop_id=shop_id)
+    for order_id, *values in lines.order_by('id').values_list(*ORDER_ITEM_FIELDS):
+        items.setdefault(order_id, []).append(dict(zip(('id', 'product_info', 'product_name', 'model', 'price',
+                                                        'quantity', 'shop'), values)))
+    return [{'id': row['id'],
+             'dt': datetime_field.to_representation(row['dt']),
+             'state': row['state'],
+             'ordered_items': items.get(row['id'], []),
+             'total_sum': row['total_sum'],
+             'items_count': row['items_count'],
+             'contact': None if row['contact_id'] is None else {
+                 'id': row['contact_id'], 'city': row['contact__city'], 'street': row['contact__street'],
+                 'house': row['contact__house'], 'structure': row['contact__structure'],
+                 'building': row['contact__building'], 'apartment': row['contact__apartment'],
+                 'phone': row['contact__phone']}}
+            for row in rows]
+
+
+def shop_orders(rows, shop_id):
+    """
+    rows - строки ShopOrder.objects.values(*SHOP_ORDER_FIELDS) в нужном порядке. Структура та же, что у orders(),
+    id - номер заказа, в позициях и сумме только товары магазина shop_id
+    """
+    return orders(({'id': row['order_id'], **{name[len('order__'):] if name.startswith('order__') else name: value
+                                              for name, value in row.items()}} for row in rows), shop_id)
@@ -0,0 +1,123 @@
+"""
+Бэкенд PostgreSQL с пулом соединений процесса.
+Вместо закрытия соединение возвращается в пул и достается следующим запросом, поэтому рабочий процесс
+держит не больше POOL_SIZE соединений на любое число потоков. Соединение, простоявшее в пуле дольше
+POOL_CHECK_AFTER секунд, перед выдачей проверяется запросом SELECT 1.
+Настройки в DATABASES: ENGINE = 'shop_backend.postgresql_pool', POOL_SIZE, POOL_TIMEOUT (сколько ждать
+свободное соединение), POOL_CHECK_AFTER; CONN_MAX_AGE должен быть 0.
+"""
+import os
+import threading
+from collections import deque
+from time import monotonic
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from psycopg2 import extensions
+
+Database = base.Database
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Не больше size выданных соединений; get ждет освободившееся не дольше timeout секунд
+    """
+
+    def __init__(self, size, timeout, check_after):
+        self.slots = threading.BoundedSemaphore(size)
+        self.timeout = timeout
+        self.check_after = check_after
+        self.idle = deque()
+
+    def get(self, connect):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise Database.OperationalError(f'Нет свободного соединения в пуле за {self.timeout} с')
+        try:
+            while True:
+                try:
+                    connection, returned_at = self.idle.pop()
+                except IndexError:
+                    return connect()
+                if self._usable(connection, returned_at):
+                    return connection
+                self._discard(connection)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def put(self, connection):
+        try:
+            if not connection.closed:
+                try:
+                    if connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                        connection.rollback()
+                except Database.Error:
+                    self._discard(connection)
+                else:
+                    self.idle.append((connection, monotonic()))
+        finally:
+            self.slots.release()
+
+    def clear(self):
+        while self.idle:
+            self._discard(self.idle.pop()[0])
+
+    def _usable(self, connection, returned_at):
+        if connection.closed:
+            return False
+        if monotonic() - returned_at < self.check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Database.Error:
+            return False
+        return True
+
+    @staticmethod
+    def _discard(connection):
+        try:
+            connection.close()
+        except Database.Error:
+            pass
+
+
+def get_pool(settings_dict, conn_params):
+    # после fork соединения родителя не используются: пул у каждого процесса свой
+    key = (os.getpid(), tuple(sorted((name, str(value)) for name, value in conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(settings_dict.get('POOL_SIZE') or 10,
+                                                settings_dict.get('POOL_TIMEOUT', 10),
+                                                settings_dict.get('POOL_CHECK_AFTER', 30))
+        return pool
+
+
+def close_pools():
+    """
+    Закрываем простаивающие соединения всех пулов процесса
+    """
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.clear()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.settings_dict, conn_params)
+        connection = self.pool.get(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # уровень изоляции задается при физическом подключении, для соединения из пула берем его заново
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED))
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.put(self.connection)
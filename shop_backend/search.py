@@ -0,0 +1,90 @@
+"""
+Полнотекстовый и фасетный поиск товаров.
+ProductInfo.search_vector хранит название продукта (русская морфология) и модель,
+ProductFacet - значения параметров вместе с магазином и категорией; оба поддерживаются импортом.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Q, F, Count, Exists, OuterRef, Window
+from django.db.models.functions import RowNumber
+
+from .models import ProductInfo, ProductFacet
+
+SEARCH_VECTOR_SQL = """
+    UPDATE shop_backend_productinfo AS info
+    SET search_vector = setweight(to_tsvector('russian', product.name), 'A') ||
+                        setweight(to_tsvector('simple', info.model), 'B')
+    FROM shop_backend_product AS product
+    WHERE product.id = info.product_id AND info.id = ANY(%s)
+"""
+
+# сколько самых частых значений возвращать для каждого параметра
+FACET_VALUES_LIMIT = 20
+
+
+def update_search_vectors(info_ids):
+    if info_ids:
+        with connection.cursor() as cursor:
+            cursor.execute(SEARCH_VECTOR_SQL, [list(info_ids)])
+
+
+def rebuild_facets(facets, info_ids):
+    """
+    Заменяем фасеты позиций info_ids на переданные объекты ProductFacet
+    """
+    ProductFacet.objects.filter(product_info_id__in=info_ids).delete()
+    ProductFacet.objects.bulk_create(facets)
+
+
+def parse_parameter_filters(values):
+    """
+    Фильтры по параметрам передаются как parameter=<имя>:<значение>, например parameter=Цвет:черный
+    """
+    filters = {}
+    for item in values:
+        name, separator, value = item.partition(':')
+        if separator and name and value:
+            filters.setdefault(name, []).append(value)
+    return filters
+
+
+def search_products(text=None, shop_id=None, category_id=None, price_min=None, price_max=None, parameters=None):
+    """
+    Возвращаем (queryset найденных позиций, queryset счетчиков фасетов по тем же позициям)
+    """
+    query = Q(shop__state=True)
+    if shop_id:
+        query &= Q(shop_id=shop_id)
+    if category_id:
+        query &= Q(product__category_id=category_id)
+    if price_min is not None:
+        query &= Q(price__gte=price_min)
+    if price_max is not None:
+        query &= Q(price__lte=price_max)
+    queryset = ProductInfo.objects.filter(query)
+
+    for name, values in (parameters or {}).items():
+        queryset = queryset.filter(Exists(ProductFacet.objects.filter(
+            product_info_id=OuterRef('pk'), parameter__name=name, value__in=values)))
+
+    if text:
+        search_query = SearchQuery(text, config='russian', search_type='websearch') | \
+                       SearchQuery(text, config='simple', search_type='websearch')
+        queryset = queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)).order_by('-rank', 'id')
+    else:
+        queryset = queryset.order_by('id')
+
+    # FACET_VALUES_LIMIT самых частых значений каждого параметра отбирает сама база
+    facets = ProductFacet.objects.filter(product_info_id__in=queryset.values('id')).values(
+        'parameter__name', 'value').annotate(count=Count('id')).annotate(
+        place=Window(RowNumber(), partition_by=F('parameter__name'), order_by=(F('count').desc(), F('value').asc())),
+    ).filter(place__lte=FACET_VALUES_LIMIT).order_by('parameter__name', '-count', 'value')
+    return queryset, facets
+
+
+def group_facets(rows):
+    result = {}
+    for row in rows:
+        result.setdefault(row['parameter__name'], []).append({'value': row['value'], 'count': row['count']})
+    return result
@@ -1,5 +1,7 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import User, Contact, Category, Shop, ProductInfo, Product, ProductParameter, Order, OrderItem
+from .models import User, Contact, Category, Shop, ProductInfo, Product, ProductParameter, Order, OrderItem, \
+    ImportJob
 
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -70,16 +72,33 @@ class OrderItemSerializer(serializers.ModelSerializer):
         }
 
 
-class OrderItemCreateSerializer(OrderItemSerializer):
-    product_info = ProductInfoSerializer(read_only=True)
+class OrderItemSnapshotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderItem
+        fields = ('id', 'product_info', 'product_name', 'model', 'price', 'quantity', 'shop',)
+        read_only_fields = fields
 
 
 class OrderSerializer(serializers.ModelSerializer):
-    ordered_items = OrderItemCreateSerializer(many=True, read_only=True)
-    total_sum = serializers.IntegerField()
+    ordered_items = OrderItemSnapshotSerializer(many=True, read_only=True)
     contact = ContactSerializer(read_only=True)
 
     class Meta:
         model = Order
-        fields = ('id', 'dt', 'state', 'ordered_items', 'total_sum', 'contact',)
-        read_only_fields = ('id',)
+        fields = ('id', 'dt', 'state', 'ordered_items', 'total_sum', 'items_count', 'contact',)
+        read_only_fields = ('id', 'total_sum', 'items_count',)
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    duration = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'url', 'state', 'created_at', 'started_at', 'finished_at', 'rows_processed', 'errors',
+                  'stats', 'duration',)
+        read_only_fields = fields
+
+    def get_duration(self, obj):
+        if obj.started_at is None:
+            return None
+        return ((obj.finished_at or timezone.now()) - obj.started_at).total_seconds()
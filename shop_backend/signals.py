@@ -1,13 +1,20 @@
-from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver, Signal
 from django_rest_passwordreset.signals import reset_password_token_created
-from .models import User, ConfirmEmailToken
+from rest_framework.authtoken.models import Token
+from .authentication import invalidate_user, invalidate_token
+from .cache import bump_catalog_version, bump_directory_version
+from .mailer import queue_email, queue_emails
+from .models import STATE_CHOICES, User, ConfirmEmailToken, Shop, Category, Parameter, ProductParameter, ProductInfo
+from .parameters import forget_parameters, refresh_attributes
 
 user_registered = Signal()
 
 new_order = Signal()
 
+orders_state_changed = Signal()
+
 
 @receiver(reset_password_token_created)
 def password_reset_token_created(sender, instance, reset_password_token, **kwargs):
@@ -20,19 +27,15 @@ def password_reset_token_created(sender, instance, reset_password_token, **kwarg
     :param kwargs:
     :return:
     """
-    # send an e-mail to the user
-
-    msg = EmailMultiAlternatives(
+    # ставим письмо в очередь, отправит его воркер send_emails
+    queue_email(
         # title:
         f"Password Reset Token for {reset_password_token.user}",
         # message:
         reset_password_token.key,
-        # from:
-        settings.EMAIL_HOST_USER,
         # to:
         [reset_password_token.user.email]
     )
-    msg.send()
 
 
 @receiver(user_registered)
@@ -40,20 +43,17 @@ def new_user_registered_signal(user_id, **kwargs):
     """
     отправляем письмо с подтрердждением почты
     """
-    # send an e-mail to the user
+    # ставим письмо в очередь, отправит его воркер send_emails
     token, _ = ConfirmEmailToken.objects.get_or_create(user_id=user_id)
 
-    msg = EmailMultiAlternatives(
+    queue_email(
         # title:
         f"Password Reset Token for {token.user.email}",
         # message:
         token.key,
-        # from:
-        settings.EMAIL_HOST_USER,
         # to:
         [token.user.email]
     )
-    msg.send()
 
 
 @receiver(new_order)
@@ -61,19 +61,98 @@ def new_order_signal(user_id, **kwargs):
     """
     отправяем письмо при изменении статуса заказа
     """
-    # send an e-mail to the user
+    # ставим письмо в очередь, отправит его воркер send_emails
     user = User.objects.get(id=user_id)
 
-    msg = EmailMultiAlternatives(
+    queue_email(
         # title:
         f"Обновление статуса заказа",
         # message:
         'Заказ сформирован',
-        # from:
-        settings.EMAIL_HOST_USER,
         # to:
         [user.email]
     )
-    msg.send()
 
 
+@receiver(orders_state_changed)
+def orders_state_changed_signal(state, orders, **kwargs):
+    """
+    отправляем каждому покупателю одно письмо со всеми его заказами из пачки, orders - {user_id: [order_id]}
+    """
+    state_name = dict(STATE_CHOICES)[state]
+    emails = dict(User.objects.filter(id__in=orders).values_list('id', 'email'))
+    queue_emails(
+        (
+            # title:
+            "Обновление статуса заказа" if len(order_ids) == 1 else "Обновление статуса заказов",
+            # message:
+            f'Статус "{state_name}": ' + ', '.join(f'заказ №{order_id}' for order_id in sorted(order_ids)),
+            # to:
+            [emails[user_id]]
+        )
+        for user_id, order_ids in orders.items() if emails.get(user_id)
+    )
+
+
+@receiver(post_save, sender=Shop)
+@receiver(post_delete, sender=Shop)
+def shop_changed_signal(instance, **kwargs):
+    """
+    сбрасываем кеш каталога и кеш аутентификации владельца при изменении магазина (например, из админки)
+    """
+    bump_catalog_version(instance.id)
+    bump_directory_version()
+    if instance.user_id:
+        invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed_signal(**kwargs):
+    """
+    сбрасываем кеш справочника категорий
+    """
+    bump_directory_version()
+
+
+@receiver(post_save, sender=ProductParameter)
+def product_parameter_saved_signal(instance, **kwargs):
+    """
+    пересобираем параметры позиции в ProductInfo.attributes при правке параметра (например, из админки).
+    post_delete не слушаем: обработчик отключил бы быстрое каскадное удаление параметров при импорте,
+    удаление из админки обрабатывает ProductParameterAdmin
+    """
+    refresh_attributes([instance.product_info_id])
+
+
+@receiver(post_save, sender=Parameter)
+def parameter_saved_signal(instance, created, **kwargs):
+    """
+    при переименовании параметра сбрасываем кеш имен и пересобираем параметры позиций
+    """
+    if not created:
+        forget_parameters()
+        # и еще раз после фиксации: другой процесс мог успеть закешировать старое имя
+        transaction.on_commit(forget_parameters)
+        refresh_attributes(ProductParameter.objects.filter(parameter_id=instance.id).values('product_info_id'))
+
+
+@receiver(post_delete, sender=Parameter)
+def parameter_deleted_signal(instance, **kwargs):
+    forget_parameters()
+    transaction.on_commit(forget_parameters)
+    refresh_attributes(ProductInfo.objects.filter(attributes__contains=[[instance.name]]).values('id'))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed_signal(instance, **kwargs):
+    """
+    сбрасываем кеш аутентификации при изменении или деактивации пользователя
+    """
+    invalidate_user(instance.id)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted_signal(instance, **kwargs):
+    invalidate_token(instance.key)
@@ -0,0 +1,48 @@
+"""
+Поддержка сводки заказа: снимок позиций (название, модель, цена) и итоговые сумма и количество позиций.
+Списки заказов читают сохраненные значения и не агрегируют текущий прайс на каждом запросе.
+"""
+from django.db.models import F, Sum, Count, Subquery, OuterRef, Value
+from django.db.models.functions import Coalesce
+
+from .models import Order, OrderItem, ProductInfo, ShopOrder
+
+
+def refresh_order_items(order_ids):
+    """
+    Переносим в позиции заказов актуальные название, модель и цену из прайса
+    """
+    info = ProductInfo.objects.filter(id=OuterRef('product_info_id'))
+    OrderItem.objects.filter(order_id__in=order_ids).update(
+        price=Subquery(info.values('price')[:1]),
+        model=Subquery(info.values('model')[:1]),
+        product_name=Subquery(info.values('product__name')[:1]))
+
+
+def refresh_order_totals(order_ids):
+    """
+    Пересчитываем сумму и количество позиций заказов по уже сохраненному снимку позиций
+    """
+    items = OrderItem.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id')
+    Order.objects.filter(id__in=order_ids).update(
+        total_sum=Coalesce(Subquery(items.annotate(total=Sum(F('quantity') * F('price'))).values('total')),
+                           Value(0)),
+        items_count=Coalesce(Subquery(items.annotate(count=Count('id')).values('count')), Value(0)))
+
+
+def refresh_order_summary(order_ids):
+    refresh_order_items(order_ids)
+    refresh_order_totals(order_ids)
+
+
+def refresh_shop_orders(order_ids):
+    """
+    Раскладываем заказы по магазинам: по строке ShopOrder на магазин с его суммой и количеством позиций
+    """
+    ShopOrder.objects.filter(order_id__in=order_ids).delete()
+    rows = OrderItem.objects.filter(order_id__in=order_ids).values(
+        'order_id', 'shop_id', 'order__state', 'order__dt').annotate(
+        total=Sum(F('quantity') * F('price')), count=Count('id')).order_by('order_id', 'shop_id')
+    ShopOrder.objects.bulk_create([ShopOrder(order_id=row['order_id'], shop_id=row['shop_id'], state=row['order__state'],
+                                             dt=row['order__dt'], total_sum=row['total'], items_count=row['count'])
+                                   for row in rows])
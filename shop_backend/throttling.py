@@ -0,0 +1,163 @@
+"""
+Ограничение частоты запросов алгоритмом token bucket.
+Корзины жетонов общие для всех процессов-воркеров машины: они лежат в отображенном в память файле
+THROTTLE_FILE (открытая адресация, слот - хеш ключа, жетоны, время пополнения), изменение идет
+под flock файла. Решение - несколько операций с памятью и два системных вызова, без обращений к базе,
+кешу или сети. Время - монотонные часы системы, одни для всех процессов.
+Частоты задаются в THROTTLE_RATES по throttle_scope представления в формате DRF ('120/min'):
+запас корзины - число запросов, пополнение - равномерно за период.
+"""
+import fcntl
+import mmap
+import os
+import struct
+from hashlib import blake2b
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+# слот корзины: хеш ключа (0 - свободен), жетоны, время последнего пополнения
+SLOT = struct.Struct('=Qdd')
+# сколько соседних слотов просматривается в поисках ключа; при переполнении вытесняется самый давний из них
+PROBES = 8
+
+
+class TokenBuckets:
+    """
+    Набор корзин в общем для процессов файле path на maxsize слотов. Вытесненная корзина равносильна
+    полной - за время простоя она все равно успела бы наполниться
+    """
+
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.maxsize = maxsize
+        # flock не разделяет потоки одного процесса, их разделяет блокировка процесса
+        self.lock = Lock()
+        self.pid = None
+        self.file = self.data = None
+
+    def _open(self):
+        # после fork открываем файл заново: унаследованный дескриптор делил бы flock с родителем
+        if self.pid != os.getpid():
+            file = open(self.path, 'a+b')
+            if os.fstat(file.fileno()).st_size != self.maxsize * SLOT.size:
+                fcntl.flock(file, fcntl.LOCK_EX)
+                os.ftruncate(file.fileno(), self.maxsize * SLOT.size)
+                fcntl.flock(file, fcntl.LOCK_UN)
+            self.file, self.data, self.pid = file, mmap.mmap(file.fileno(), self.maxsize * SLOT.size), os.getpid()
+        return self.data
+
+    def _slot(self, data, key_hash):
+        """
+        Номер слота ключа: его собственный, свободный или самый давно пополненный среди PROBES соседних
+        """
+        start = key_hash % self.maxsize
+        oldest, oldest_at = None, None
+        for probe in range(min(PROBES, self.maxsize)):
+            index = (start + probe) % self.maxsize
+            slot_hash, _, updated = SLOT.unpack_from(data, index * SLOT.size)
+            if slot_hash in (key_hash, 0):
+                return index
+            if oldest is None or updated < oldest_at:
+                oldest, oldest_at = index, updated
+        return oldest
+
+    def take(self, keys, capacity, rate, now=None):
+        """
+        Забираем по жетону из каждой корзины keys. Если хоть в одной жетонов нет, ничего не списываем
+        и возвращаем, через сколько секунд появится жетон; иначе 0
+        """
+        now = monotonic() if now is None else now
+        hashes = [int.from_bytes(blake2b(str(key).encode(), digest_size=8).digest(), 'little') or 1 for key in keys]
+        with self.lock:
+            data = self._open()
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+            try:
+                levels, wait = [], 0.0
+                for key_hash in hashes:
+                    index = self._slot(data, key_hash)
+                    slot_hash, tokens, updated = SLOT.unpack_from(data, index * SLOT.size)
+                    # чужой слот или время из прошлой загрузки системы - корзина полна
+                    if slot_hash != key_hash or updated > now:
+                        tokens, updated = capacity, now
+                    tokens = min(capacity, tokens + (now - updated) * rate)
+                    levels.append((index, key_hash, tokens))
+                    if tokens < 1:
+                        wait = max(wait, (1 - tokens) / rate)
+                for index, key_hash, tokens in levels:
+                    SLOT.pack_into(data, index * SLOT.size, key_hash, tokens if wait else tokens - 1, now)
+            finally:
+                fcntl.flock(self.file, fcntl.LOCK_UN)
+        return wait
+
+    def clear(self):
+        with self.lock:
+            data = self._open()
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+            data[:] = bytes(len(data))
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+
+
+buckets = TokenBuckets(settings.THROTTLE_FILE, settings.THROTTLE_BUCKETS)
+
+
+def parse_rate(rate):
+    """
+    '120/min' -> (запас корзины, жетонов в секунду)
+    """
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / DURATIONS[period[0]]
+
+
+def throttle_anonymous(scope, request):
+    """
+    Проверка частоты для представлений вне DRF: та же корзина, что у анонимного клиента в UserThrottle.
+    Возвращаем, через сколько секунд повторить запрос, или 0
+    """
+    rate = settings.THROTTLE_RATES.get(scope)
+    if rate is None:
+        return 0
+    capacity, per_second = parse_rate(rate)
+    return buckets.take([f'{scope}:{UserThrottle.prefix}:ip-{BaseThrottle().get_ident(request)}'],
+                        capacity, per_second)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Базовый класс: корзина на ключ из get_key, частота - THROTTLE_RATES[view.throttle_scope]
+    """
+    prefix = None
+
+    def __init__(self):
+        self.delay = None
+
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        rate = settings.THROTTLE_RATES.get(getattr(view, 'throttle_scope', None))
+        key = self.get_key(request)
+        if rate is None or key is None:
+            return True
+        capacity, per_second = parse_rate(rate)
+        self.delay = buckets.take([f'{view.throttle_scope}:{self.prefix}:{key}'], capacity, per_second)
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+class UserThrottle(TokenBucketThrottle):
+    """
+    Корзина на пользователя, для анонимных запросов - на адрес клиента
+    """
+    prefix = 'user'
+
+    def get_key(self, request):
+        if request.user.is_authenticated:
+            return request.user.id
+        return 'ip-' + self.get_ident(request)
@@ -1,12 +1,14 @@
 from django.urls import path
 from django_rest_passwordreset.views import reset_password_request_token, reset_password_confirm
 from .views import ProductUpdate, RegisterAccount, AccountVerification, AccountDetails, LoginAccount, CategoryView, \
-    ShopView, ProductInfoView, BasketView, PartnerState, PartnerOrders, ContactView, OrderView
+    ShopView, ProductInfoView, BasketView, PartnerState, PartnerOrders, ContactView, OrderView, ImportJobView, \
+    ProductSearchView, AsyncProductSearchView, ExportOrders, ExportProducts, ProductHistoryView, ShopHistoryView
 
 
 app_name = "shop_backend"
 urlpatterns = [
     path('product/update', ProductUpdate.as_view(), name='product_update'),
+    path('product/update/<int:job_id>', ImportJobView.as_view(), name='product_update_job'),
     path('user/register', RegisterAccount.as_view(), name='user-register'),
     path('user/register/verification', AccountVerification.as_view(), name='user-register-verification'),
     path('user/details', AccountDetails.as_view(), name='user-details'),
@@ -17,8 +19,14 @@ urlpatterns = [
     path('categories', CategoryView.as_view(), name='categories'),
     path('shops', ShopView.as_view(), name='shops'),
     path('product', ProductInfoView.as_view(), name='products'),
+    path('product/search', ProductSearchView.as_view(), name='product-search'),
+    path('product/search/async', AsyncProductSearchView.as_view(), name='product-search-async'),
+    path('product/<int:product_info_id>/history', ProductHistoryView.as_view(), name='product-history'),
+    path('shops/<int:shop_id>/history', ShopHistoryView.as_view(), name='shop-history'),
     path('basket', BasketView.as_view(), name='basket'),
     path('partner/state', PartnerState.as_view(), name='partner-state'),
     path('partner/orders', PartnerOrders.as_view(), name='partner-orders'),
     path('order', OrderView.as_view(), name='order'),
+    path('export/orders', ExportOrders.as_view(), name='export-orders'),
+    path('export/products', ExportProducts.as_view(), name='export-products'),
 ]
\ No newline at end of file
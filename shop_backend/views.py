@@ -1,25 +1,45 @@
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.core.cache import cache
 from django.core.validators import URLValidator
-from django.db.models import Q, F, Sum
-from django.db import IntegrityError
-from django.http import JsonResponse
+from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 from django.core.exceptions import ValidationError
-from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+from django.utils.http import http_date
+from django.views import View
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
-from requests import get
-from ujson import loads as json_load
-from yaml import load as yaml_load, Loader
+from ujson import loads as json_load, dumps as json_dump
 from distutils.util import strtobool
-
-from .models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, OrderItem, Contact, \
-    ConfirmEmailToken
-from .serializers import UserSerializer, CategorySerializer, ShopSerializer, ProductInfoSerializer, OrderSerializer, \
-    OrderItemSerializer, ContactSerializer
-from .signals import user_registered, new_order
+from hashlib import md5
+from math import ceil
+import gzip
+
+from .models import Shop, Category, ProductInfo, Order, OrderItem, Contact, ConfirmEmailToken, ImportJob, ShopOrder
+from .payloads import PRODUCT_INFO_FIELDS, ORDER_FIELDS, SHOP_ORDER_FIELDS, product_infos, orders, shop_orders, \
+    render_json, json_response
+from .serializers import UserSerializer, CategorySerializer, ShopSerializer, ContactSerializer, ImportJobSerializer
+from .authentication import invalidate_user
+from .basket import add_items, update_items, request_basket
+from .cache import bump_catalog_version, bump_directory_version, directory_version, product_page_key
+from .checkout import checkout, CheckoutError
+from .workflow import transition_orders, TransitionError
+from .history import price_at, shop_changes, history_entry
+from .export import ORDER_COLUMNS, SHOP_ORDER_COLUMNS, PRODUCT_COLUMNS, FORMATS, order_rows, shop_order_rows, \
+    product_rows, export, content_type, file_name
+from .jobs import admit_import, ImportLimitExceeded
+from .throttling import UserThrottle, throttle_anonymous
+from .pagination import ProductCursorPagination, encode_feed_cursor, decode_feed_cursor, parse_limit
+from .search import search_products, parse_parameter_filters, group_facets
+from .summary import refresh_order_totals
+from .signals import user_registered
 
 
 class RegisterAccount(APIView):
@@ -46,11 +66,12 @@ class RegisterAccount(APIView):
                 request.data.update([])
                 user_serializer = UserSerializer(data=request.data)
                 if user_serializer.is_valid():
-                    # сохраняем пользователя
-                    user = user_serializer.save()
-                    user.set_password(request.data['password'])
-                    user.save()
-                    user_registered.send(sender=self.__class__, user_id=user.id)
+                    # сохраняем пользователя и ставим письмо с подтверждением в очередь одной транзакцией
+                    with transaction.atomic():
+                        user = user_serializer.save()
+                        user.set_password(request.data['password'])
+                        user.save()
+                        user_registered.send(sender=self.__class__, user_id=user.id)
                     return JsonResponse({'Status': True})
                 else:
                     return JsonResponse({'Status': False, 'Error': user_serializer.errors})
@@ -135,26 +156,70 @@ class LoginAccount(APIView):
         return JsonResponse({'Status': False, 'Error': 'Не указаны все необходимые аргументы'})
 
 
-class CategoryView(ListAPIView):
+class CachedDirectoryMixin:
+    """
+    Примесь для справочников: ответы кешируются по версии справочников, клиент может перепроверить
+    их по ETag/Last-Modified и получить 304, а с ?full=true получает весь справочник одним заранее
+    сжатым ответом без пагинации
+    """
+    directory_name = None
+
+    def list(self, request, *args, **kwargs):
+        version, modified = directory_version()
+        full = request.query_params.get('full', '').lower() in ('1', 'true')
+        gzipped = full and 'gzip' in request.headers.get('Accept-Encoding', '')
+        etag = '"{}-{}-{}"'.format(self.directory_name, version, md5(
+            f'{request.get_full_path()}|{gzipped}'.encode()).hexdigest())
+        not_modified = get_conditional_response(request, etag=etag, last_modified=modified)
+        if not_modified is not None:
+            return not_modified
+
+        cache_key = f'directory:{self.directory_name}:{version}:{full}:{request.GET.urlencode()}'
+        cached = cache.get(cache_key)
+        if full:
+            if cached is None:
+                raw = json_dump(self.get_serializer(self.get_queryset(), many=True).data,
+                                ensure_ascii=False).encode()
+                cached = (raw, gzip.compress(raw))
+                cache.set(cache_key, cached, timeout=settings.DIRECTORY_CACHE_TIMEOUT)
+            response = HttpResponse(cached[1] if gzipped else cached[0], content_type='application/json')
+            if gzipped:
+                response['Content-Encoding'] = 'gzip'
+            patch_vary_headers(response, ('Accept-Encoding',))
+        else:
+            if cached is None:
+                cached = super().list(request, *args, **kwargs).data
+                cache.set(cache_key, cached, timeout=settings.DIRECTORY_CACHE_TIMEOUT)
+            response = Response(cached)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(modified)
+        return response
+
+
+class CategoryView(CachedDirectoryMixin, ListAPIView):
     """
     Класс для просмотра категорий
     """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    directory_name = 'categories'
 
 
-class ShopView(ListAPIView):
+class ShopView(CachedDirectoryMixin, ListAPIView):
     """
     Класс для просмотра магазинов
     """
     queryset = Shop.objects.filter(state=True)
     serializer_class = ShopSerializer
+    directory_name = 'shops'
 
 
 class ProductInfoView(APIView):
     """
     Класс для поиска товаров
     """
+    throttle_classes = (UserThrottle,)
+    throttle_scope = 'products'
 
     def get(self, request, *args, **kwargs):
         query = Q(shop__state=True)
@@ -166,12 +231,133 @@ class ProductInfoView(APIView):
         if category_id:
             query = query & Q(product__category_id=category_id)
 
-        # фильтруем и отсеиваем дубликаты
-        queryset = ProductInfo.objects.filter(query).select_related(
-            'shop', 'product__category').prefetch_related(
-            'product_parameters__parameter').distinct()
-        serializer = ProductInfoSerializer(queryset, many=True)
-        return Response(serializer.data)
+        paginator = ProductCursorPagination()
+        cache_key = product_page_key(shop_id, category_id, request.query_params.get(paginator.cursor_query_param),
+                                     paginator.get_page_size(request))
+        body = cache.get(cache_key)
+        if body is None:
+            # связи один-к-одному не дают дубликатов, поэтому distinct не нужен
+            queryset = ProductInfo.objects.filter(query).values(*PRODUCT_INFO_FIELDS)
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            body = render_json(paginator.get_paginated_response(product_infos(page)).data)
+            cache.set(cache_key, body, settings.PRODUCT_CACHE_TIMEOUT)
+        return HttpResponse(body, content_type='application/json')
+
+
+class ProductHistoryView(APIView):
+    """
+    Класс для получения цены и остатка позиции на момент времени at (по умолчанию - текущих)
+    """
+
+    def get(self, request, product_info_id, *args, **kwargs):
+        at = timezone.now()
+        if request.query_params.get('at'):
+            at = parse_datetime(request.query_params['at'])
+            if at is None:
+                return JsonResponse({'Status': False, 'Error': 'Неверный формат at'}, status=400)
+        row = price_at(product_info_id, at)
+        if row is None:
+            return JsonResponse({'Status': False, 'Error': 'Нет данных на этот момент'}, status=404)
+        return json_response(history_entry(row))
+
+
+class ShopHistoryView(APIView):
+    """
+    Класс для получения изменений цен и остатков магазина за окно [since, until) - владельцу магазина
+    и персоналу. Лента упорядочена по (dt, id) и листается курсором
+    """
+    max_limit = 1000
+
+    def get(self, request, shop_id, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Login required'}, status=403)
+        if not request.user.is_staff and getattr(getattr(request.user, 'shop', None), 'id', None) != shop_id:
+            return JsonResponse({'Status': False, 'Error': 'Доступ только для владельца магазина'}, status=403)
+
+        params = request.query_params
+        try:
+            limit = parse_limit(params, self.max_limit)
+            bounds = {}
+            for name in ('since', 'until'):
+                if params.get(name):
+                    bounds[name] = parse_datetime(params[name])
+                    if bounds[name] is None:
+                        raise ValueError(f'Неверный формат {name}')
+            if 'since' not in bounds:
+                raise ValueError('Не указано начало периода since')
+            after = decode_feed_cursor(params['cursor']) if params.get('cursor') else None
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Error': str(error)}, status=400)
+
+        rows = list(shop_changes(shop_id, bounds['since'], bounds.get('until', timezone.now()), after, limit + 1))
+        page, has_next = rows[:limit], len(rows) > limit
+        return json_response({'next': encode_feed_cursor(page[-1]['dt'], page[-1]['id']) if has_next else None,
+                              'results': [history_entry(row) for row in page]})
+
+
+class ProductSearchView(APIView):
+    """
+    Класс для полнотекстового поиска товаров с фильтрами по цене и параметрам и подсчетом фасетов
+    """
+    max_limit = 200
+    throttle_classes = (UserThrottle,)
+    throttle_scope = 'products'
+
+    @classmethod
+    def parse_query(cls, params):
+        """
+        Параметры поиска из строки запроса: (аргументы search_products, offset, limit); ValueError при ошибке
+        """
+        search = {'text': params.get('q'), 'shop_id': params.get('shop_id'),
+                  'category_id': params.get('category_id'),
+                  'price_min': int(params['price_min']) if params.get('price_min') else None,
+                  'price_max': int(params['price_max']) if params.get('price_max') else None,
+                  'parameters': parse_parameter_filters(params.getlist('parameter'))}
+        offset = int(params.get('offset', 0))
+        if offset < 0:
+            raise ValueError('offset не может быть отрицательным')
+        return search, offset, parse_limit(params, cls.max_limit)
+
+    @staticmethod
+    def search_response(hits, facets, offset, limit):
+        return json_response({'next': offset + limit if len(hits) > limit else None,
+                              'results': product_infos(hits[:limit]),
+                              'facets': group_facets(facets)})
+
+    def get(self, request, *args, **kwargs):
+        try:
+            search, offset, limit = self.parse_query(request.query_params)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Error': str(error)}, status=400)
+
+        queryset, facets = search_products(**search)
+        # берем на одну запись больше, чтобы узнать о следующей странице без count(*)
+        hits = list(queryset.values(*PRODUCT_INFO_FIELDS)[offset:offset + limit + 1])
+        return self.search_response(hits, facets, offset, limit)
+
+
+class AsyncProductSearchView(View):
+    """
+    Поиск товаров для ASGI-развертывания: параметры и ответ как у ProductSearchView, запросы к базе идут
+    через асинхронный ORM. Запрос не аутентифицируется, частота ограничивается по адресу клиента.
+    Сравнение с ProductSearchView под WSGI - benchmarks/bench_asgi.py
+    """
+    throttle_scope = 'products'
+
+    async def get(self, request, *args, **kwargs):
+        delay = throttle_anonymous(self.throttle_scope, request)
+        if delay:
+            return JsonResponse({'Status': False, 'Error': 'Слишком много запросов'}, status=429,
+                                headers={'Retry-After': str(ceil(delay))})
+        try:
+            search, offset, limit = ProductSearchView.parse_query(request.GET)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Error': str(error)}, status=400)
+
+        queryset, facets = search_products(**search)
+        hits = [row async for row in queryset.values(*PRODUCT_INFO_FIELDS)[offset:offset + limit + 1]]
+        facets = [row async for row in facets]
+        return ProductSearchView.search_response(hits, facets, offset, limit)
 
 
 class BasketView(APIView):
@@ -183,12 +369,8 @@ class BasketView(APIView):
     def get(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({'Status': False, 'Error': 'Login required'}, status=403)
-        basket = Order.objects.filter(user_id=request.user.id, state='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-        serializer = OrderSerializer(basket, many=True)
-        return Response(serializer.data)
+        basket = Order.objects.filter(user_id=request.user.id, state='basket').values(*ORDER_FIELDS)
+        return json_response(orders(basket))
 
     # Редактируем корзину
     def post(self, request, *args, **kwargs):
@@ -199,22 +381,14 @@ class BasketView(APIView):
             try:
                 items_dict = json_load(items_set)
             except ValueError:
-                JsonResponse({'Status': False, 'Error': 'Ошибка в запросе'})
+                return JsonResponse({'Status': False, 'Error': 'Ошибка в запросе'})
             else:
-                basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
-                position_created = 0
-                for order_item in items_dict:
-                    order_item.update({'order': basket.id})
-                    serializer = OrderItemSerializer(data=order_item)
-                    if serializer.is_valid():
-                        try:
-                            serializer.save()
-                        except IntegrityError as error:
-                            return JsonResponse({'Status': False, 'Error': str(error)})
-                        else:
-                            position_created += 1
-                    else:
-                        return JsonResponse({'Status': False, 'Error': serializer.errors})
+                try:
+                    position_created, errors = add_items(request_basket(request), items_dict)
+                except IntegrityError as error:
+                    return JsonResponse({'Status': False, 'Error': str(error)})
+                if errors:
+                    return JsonResponse({'Status': False, 'Error': errors})
                 return JsonResponse({'Status': True, 'Создано позиций': position_created})
         return JsonResponse({'Status': False, 'Error': 'Не указаны все необходимые аргументы'})
 
@@ -225,15 +399,16 @@ class BasketView(APIView):
         items_set = request.data.get('items')
         if items_set:
             items_list = items_set.split(',')
-            basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
+            basket_id = request_basket(request)
             query = Q()
             position_delete = False
             for item_id in items_list:
                 if item_id.isdigit():
-                    query = query | Q(order_id=basket.id, id=item_id)
+                    query = query | Q(order_id=basket_id, id=item_id)
                     position_delete = True
             if position_delete:
                 count_deleted = OrderItem.objects.filter(query).delete()[0]
+                refresh_order_totals([basket_id])
                 return JsonResponse({'Status': True, 'Удалено  позиций': count_deleted})
         return JsonResponse({'Status': False, 'Error': 'Не указаны все необходимые аргументы'})
 
@@ -246,22 +421,23 @@ class BasketView(APIView):
             try:
                 items_dict = json_load(items_set)
             except ValueError:
-                JsonResponse({'Status': False, 'Error': 'Неверный запрос'})
+                return JsonResponse({'Status': False, 'Error': 'Неверный запрос'})
             else:
-                basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
-                position_updated = 0
-                for order_item in items_dict:
-                    if type(order_item['id']) == int and type(order_item['quantity']) == int:
-                        position_updated += OrderItem.objects.filter(order_id=basket.id, id=order_item['id']).update(
-                            quantity=order_item['quantity'])
+                position_updated, errors = update_items(request_basket(request), items_dict)
+                if errors:
+                    return JsonResponse({'Status': False, 'Error': errors})
                 return JsonResponse({'Status': True, 'Обновлено позиций': position_updated})
         return JsonResponse({'Status': False, 'Error': 'Не указаны все необходимые аргументы'})
 
 
 class ProductUpdate(APIView):
     """
-    Класс для обновления прайса от поставщика
+    Класс для обновления прайса от поставщика.
+    Загрузка выполняется в фоне воркером import_worker, в ответ возвращается номер задачи.
+    Число активных задач ограничено (admit_import), сверх лимита - 429 с Retry-After
     """
+    throttle_classes = (UserThrottle,)
+    throttle_scope = 'import'
 
     def post(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
@@ -276,33 +452,30 @@ class ProductUpdate(APIView):
             except ValidationError as e:
                 return JsonResponse({"Status": False, "Error": str(e)})
             else:
-                data_block = get(url).content
-                data = yaml_load(data_block, Loader=Loader)
-                """
-                Далее, запросы формата request.data.get('***') - для работы непосредственно с yaml-файлом, для работы с
-                yaml-данными с сайта необходимы запросы формата data['***']
-                """
-                shop, _ = Shop.objects.get_or_create(name=request.data.get('shop'), user_id=request.user.id)
-                for category in request.data.get('categories'):
-                    object_on_category, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-                    object_on_category.shops.add(shop.id)
-                    object_on_category.save()
-                ProductInfo.objects.filter(shop_id=shop.id).delete()
-                for meaning in request.data.get('goods'):
-                    product, _ = Product.objects.get_or_create(name=meaning['name'], category_id=meaning['category'])
-                    product_info = ProductInfo.objects.create(product_id=product.id, external_id=meaning['id'],
-                                                              model=meaning['model'], price=meaning['price'],
-                                                              price_rrc=meaning['price_rrc'],
-                                                              quantity=meaning['quantity'],
-                                                              shop_id=shop.id)
-                    for name, value in meaning['parameters'].items():
-                        params_object, _ = Parameter.objects.get_or_create(name=name)
-                        ProductParameter.objects.create(product_info_id=product_info.id,
-                                                        parameter_id=params_object.id, value=value)
-                return JsonResponse({'Status': True})
+                try:
+                    job = admit_import(request.user, url)
+                except ImportLimitExceeded as error:
+                    return JsonResponse({'Status': False, 'Error': str(error)}, status=429,
+                                        headers={'Retry-After': str(error.retry_after)})
+                return JsonResponse({'Status': True, 'Job': job.id}, status=202)
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
 
 
+class ImportJobView(APIView):
+    """
+    Класс для отслеживания хода импорта прайса
+    """
+
+    def get(self, request, job_id, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"Status": False, "Error": 'Login required'}, status=403)
+        job = ImportJob.objects.filter(id=job_id, user_id=request.user.id).first()
+        if job is None:
+            return JsonResponse({'Status': False, 'Error': 'Задача не найдена'}, status=404)
+        serializer = ImportJobSerializer(job)
+        return Response(serializer.data)
+
+
 class PartnerState(APIView):
     """
     Класс для работы со статусом поставщика
@@ -327,7 +500,10 @@ class PartnerState(APIView):
         state = request.data.get('state')
         if state:
             try:
-                Shop.objects.filter(user_id=request.user.id).update(state=strtobool(state))
+                if Shop.objects.filter(user_id=request.user.id).update(state=strtobool(state)):
+                    bump_catalog_version(request.user.shop.id)
+                    bump_directory_version()
+                    invalidate_user(request.user.id)
                 return JsonResponse({'Status': True})
             except ValueError as error:
                 return JsonResponse({'Status': False, 'Error': str(error)})
@@ -336,8 +512,14 @@ class PartnerState(APIView):
 
 class PartnerOrders(APIView):
     """
-    Класс для получения заказов поставщиками
+    Класс для получения заказов поставщиками.
+    Лента строится по частям заказов магазина (ShopOrder): только его позиции и его сумма.
+    Лента упорядочена по (dt, id) и листается курсором; since отсекает заказы не новее указанного времени,
+    state (через запятую) фильтрует по статусам, If-None-Match с прошлым ETag вернет 304 без тела
     """
+    max_limit = 200
+    throttle_classes = (UserThrottle,)
+    throttle_scope = 'partner_orders'
 
     def get(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
@@ -345,14 +527,134 @@ class PartnerOrders(APIView):
         if request.user.type != 'shop':
             return JsonResponse({'Status': False, 'Error': 'Сервис только для магазинов'}, status=403)
 
-        # фильтруем и отсеиваем дубликаты
-        order = Order.objects.filter(ordered_items__product_info__shop__user_id=request.user.id).exclude(
-            state='basket').prefetch_related('ordered_items__product_info__product__category',
-                                             'ordered_items__product_info__product_parameters__parameter'). \
-            select_related('contact').annotate(total_sum=Sum(
-            F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        # магазин пользователя уже загружен вместе с ним при аутентификации
+        shop = getattr(request.user, 'shop', None)
+        if shop is None:
+            return json_response({'next': None, 'results': []})
+        params = request.query_params
+        query = Q(shop_id=shop.id)
+        try:
+            limit = parse_limit(params, self.max_limit)
+            if params.get('since'):
+                since = parse_datetime(params['since'])
+                if since is None:
+                    raise ValueError('Неверный формат since')
+                query &= Q(dt__gt=since)
+            if params.get('cursor'):
+                dt, pk = decode_feed_cursor(params['cursor'])
+                query &= Q(dt__gt=dt) | Q(dt=dt, id__gt=pk)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Error': str(error)}, status=400)
+        if params.get('state'):
+            query &= Q(state__in=params['state'].split(','))
+
+        # сначала дешево выбираем ключи страницы: по ним считаем ETag и курсор
+        keys = list(ShopOrder.objects.filter(query).order_by('dt', 'id').values_list(
+            'id', 'dt', 'state', 'total_sum')[:limit + 1])
+        page, has_next = keys[:limit], len(keys) > limit
+        etag = '"{}"'.format(md5(repr((page, has_next)).encode()).hexdigest())
+        if etag in request.headers.get('If-None-Match', ''):
+            return HttpResponseNotModified(headers={'ETag': etag})
+
+        rows = ShopOrder.objects.filter(id__in=[key[0] for key in page]).order_by('dt', 'id').values(
+            *SHOP_ORDER_FIELDS)
+        return json_response({'next': encode_feed_cursor(page[-1][1], page[-1][0]) if has_next else None,
+                              'results': shop_orders(rows, shop.id)}, headers={'ETag': etag})
+
+    # Переводим пачку заказов в новый статус: orders - id через запятую, state - целевой статус
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Login required'}, status=403)
+        if not request.user.is_staff and request.user.type != 'shop':
+            return JsonResponse({'Status': False, 'Error': 'Сервис только для магазинов'}, status=403)
+        order_ids, state = request.data.get('orders'), request.data.get('state')
+        if not order_ids or not state:
+            return JsonResponse({'Status': False, 'Error': 'Не указаны все необходимые аргументы'})
+        order_ids = str(order_ids).split(',')
+        if not all(order_id.strip().isdigit() for order_id in order_ids):
+            return JsonResponse({'Status': False, 'Error': 'Неверный список заказов'}, status=400)
+        # персонал переводит любые заказы, магазин - только заказы со своими товарами
+        shop = getattr(request.user, 'shop', None)
+        try:
+            moved, errors = transition_orders([int(order_id) for order_id in order_ids], state,
+                                              user_id=request.user.id,
+                                              shop_id=None if request.user.is_staff else getattr(shop, 'id', 0),
+                                              sender=self.__class__)
+        except TransitionError as error:
+            return JsonResponse({'Status': False, 'Error': str(error)}, status=400)
+        return JsonResponse({'Status': not errors, 'Обновлено заказов': len(moved), 'Errors': errors})
+
+
+class ExportView(APIView):
+    """
+    Базовый класс потоковых выгрузок: output=csv|ndjson, gzip=true сжимает выгрузку на лету
+    """
+    export_name = None
+    columns = None
+    throttle_classes = (UserThrottle,)
+    throttle_scope = 'export'
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Login required'}, status=403)
+        if not request.user.is_staff and request.user.type != 'shop':
+            return JsonResponse({'Status': False, 'Error': 'Сервис только для магазинов'}, status=403)
+        export_format = request.query_params.get('output', 'csv')
+        if export_format not in FORMATS:
+            return JsonResponse({'Status': False, 'Error': f'Формат выгрузки: {", ".join(FORMATS)}'}, status=400)
+        try:
+            compress = bool(strtobool(request.query_params.get('gzip', 'false')))
+            rows = self.get_rows(request)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Error': str(error)}, status=400)
+        response = StreamingHttpResponse(export(self.get_columns(request), rows, export_format, compress),
+                                         content_type=content_type(export_format, compress))
+        response['Content-Disposition'] = \
+            f'attachment; filename="{file_name(self.export_name, export_format, compress)}"'
+        return response
+
+    def get_columns(self, request):
+        return self.columns
+
+    def get_rows(self, request):
+        raise NotImplementedError
+
+
+class ExportOrders(ExportView):
+    """
+    Выгрузка позиций оформленных заказов; персоналу - все позиции со сводкой заказа, магазину - только его
+    позиции со сводкой его части заказа и без данных покупателя. since и until ограничивают дату заказа
+    """
+    export_name = 'orders'
+    columns = ORDER_COLUMNS
+
+    def get_columns(self, request):
+        return self.columns if request.user.is_staff else SHOP_ORDER_COLUMNS
+
+    def get_rows(self, request):
+        bounds = {}
+        for name in ('since', 'until'):
+            if request.query_params.get(name):
+                bounds[name] = parse_datetime(request.query_params[name])
+                if bounds[name] is None:
+                    raise ValueError(f'Неверный формат {name}')
+        if request.user.is_staff:
+            return order_rows(**bounds)
+        return shop_order_rows(request.user.id, **bounds)
+
+
+class ExportProducts(ExportView):
+    """
+    Выгрузка каталога с параметрами; магазину - его каталог, персоналу - весь или shop_id
+    """
+    export_name = 'products'
+    columns = PRODUCT_COLUMNS
+
+    def get_rows(self, request):
+        if not request.user.is_staff:
+            return product_rows(shop_user_id=request.user.id)
+        shop_id = request.query_params.get('shop_id')
+        return product_rows(shop_id=int(shop_id) if shop_id else None)
 
 
 class ContactView(APIView):
@@ -429,12 +731,8 @@ class OrderView(APIView):
     def get(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({'Status': False, 'Error': 'Login required'}, status=403)
-        order = Order.objects.filter(user_id=request.user.id).exclude(state='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').select_related('contact').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        order = Order.objects.filter(user_id=request.user.id).exclude(state='basket').values(*ORDER_FIELDS)
+        return json_response(orders(order))
 
     # разместить заказ из корзины
     def post(self, request, *args, **kwargs):
@@ -443,13 +741,13 @@ class OrderView(APIView):
         if {'id', 'contact'}.issubset(request.data):
             if request.data['id'].isdigit():
                 try:
-                    order_updated = Order.objects.filter(
-                        user_id=request.user.id, id=request.data['id']).update(
-                            contact_id=request.data['contact'], state='new')
+                    order_updated = checkout(request.user.id, request.data['id'], request.data['contact'],
+                                             sender=self.__class__)
+                except CheckoutError as error:
+                    return JsonResponse({'Status': False, 'Error': str(error)}, status=409)
                 except IntegrityError as error:
                     return JsonResponse({'Status': False, 'Error': str(error)})
                 else:
                     if order_updated:
-                        new_order.send(sender=self.__class__, user_id=request.user.id)
                         return JsonResponse({'Status': True})
             return JsonResponse({'Status': False, 'Error': 'Не указаны все необходимые аргументы'})
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Жизненный цикл заказа: basket -> new -> confirmed -> assembled -> sent -> delivered, отмена до отправки.
+Статус меняют части заказа по магазинам (ShopOrder): магазин переводит только свою часть, персонал - все
+части заказа. Статус заказа выводится из частей - это статус наименее продвинутой неотмененной части,
+заказ отменен, когда отменены все части. Пачка частей переводится одним UPDATE с условием на допустимые
+исходные статусы; каждая смена статуса части и заказа пишется в журнал OrderTransition, а покупатель
+получает одно письмо на всю пачку заказов, сменивших статус.
+"""
+from django.db import transaction
+from django.db.models import Case, When, Exists, OuterRef, F, Q, Sum, Value
+from django.utils import timezone
+
+from .models import STATE_CHOICES, Order, OrderItem, OrderTransition, ProductInfo, ShopOrder
+from .signals import orders_state_changed
+
+TRANSITIONS = {
+    'basket': ('new',),
+    'new': ('confirmed', 'canceled'),
+    'confirmed': ('assembled', 'canceled'),
+    'assembled': ('sent', 'canceled'),
+    'sent': ('delivered',),
+}
+# статусы, в которые заказ переводит магазин или персонал; basket -> new выполняет только checkout
+PARTNER_STATES = ('confirmed', 'assembled', 'sent', 'delivered', 'canceled')
+# порядок продвижения заказа по статусам
+PROGRESS = ('new', 'confirmed', 'assembled', 'sent', 'delivered')
+STATE_NAMES = dict(STATE_CHOICES)
+
+
+class TransitionError(Exception):
+    pass
+
+
+def source_states(state):
+    return tuple(source for source, targets in TRANSITIONS.items() if state in targets)
+
+
+def order_state(states):
+    """
+    Статус заказа по статусам его частей
+    """
+    active = [state for state in states if state != 'canceled']
+    return min(active, key=PROGRESS.index) if active else 'canceled'
+
+
+def log_transitions(entries, state, user_id=None):
+    """
+    Пишем в журнал переход [(id заказа, id магазина, прежний статус)] в статус state;
+    id магазина None - сменился статус заказа целиком
+    """
+    now = timezone.now()
+    OrderTransition.objects.bulk_create([OrderTransition(order_id=order_id, shop_id=shop_id, from_state=from_state,
+                                                         to_state=state, user_id=user_id, dt=now)
+                                         for order_id, shop_id, from_state in entries])
+
+
+def return_stock(items):
+    """
+    Возвращаем на склад товар позиций items (queryset OrderItem) одним UPDATE ... CASE. Позиции магазинов,
+    прайс которых импортирован после оформления заказа, пропускаются: импорт записал остатки поставщика,
+    где товар заказа уже списан, и возврат посчитал бы его дважды. Строки товара блокируются заранее
+    в порядке возрастания id, как при оформлении заказа, чтобы не взаимоблокироваться с checkout
+    """
+    items = items.filter(Q(shop__stock_updated_at__isnull=True) | Q(shop__stock_updated_at__lte=F('order__dt')))
+    returned = dict(items.values('product_info_id').annotate(total=Sum('quantity')).order_by().values_list(
+        'product_info_id', 'total'))
+    if not returned:
+        return
+    list(ProductInfo.objects.select_for_update().filter(id__in=returned).order_by('id').values_list('id'))
+    ProductInfo.objects.filter(id__in=returned).update(quantity=F('quantity') + Case(
+        *[When(id=info_id, then=Value(total)) for info_id, total in returned.items()]))
+
+
+def move_shop_orders(orders, state, user_id=None, shop_id=None, sources=None):
+    """
+    Переводим в статус state части заказов orders (магазина shop_id или все) из статусов sources
+    и пересчитываем статус заказов. orders - {id заказа: статус} заказов, заблокированных вызывающим.
+    Возвращаем (id заказов с переведенными частями, {новый статус: [id заказа]} для сменивших статус)
+    """
+    moving = ShopOrder.objects.filter(order_id__in=orders, state__in=sources or source_states(state))
+    if shop_id is not None:
+        moving = moving.filter(shop_id=shop_id)
+    parts = list(moving.values_list('order_id', 'shop_id', 'state'))
+    if not parts:
+        return set(), {}
+    moved = {order_id for order_id, _, _ in parts}
+
+    if state == 'canceled':
+        # на склад возвращается только товар отменяемых частей
+        return_stock(OrderItem.objects.filter(order_id__in=moved).filter(Exists(moving.filter(
+            order_id=OuterRef('order_id'), shop_id=OuterRef('shop_id')))))
+    moving.update(state=state)
+    log_transitions(parts, state, user_id)
+
+    part_states = {}
+    for order_id, part_state in ShopOrder.objects.filter(order_id__in=moved).values_list('order_id', 'state'):
+        part_states.setdefault(order_id, []).append(part_state)
+    changed = {}
+    for order_id, states in part_states.items():
+        new_state = order_state(states)
+        if new_state != orders[order_id]:
+            changed.setdefault(new_state, []).append(order_id)
+    for new_state, order_ids in changed.items():
+        # части только продвигаются вперед, поэтому заказ, сменивший статус, уже не новый и не держит резерв
+        Order.objects.filter(id__in=order_ids).update(state=new_state, reserved_until=None)
+        log_transitions([(order_id, None, orders[order_id]) for order_id in order_ids], new_state, user_id)
+    return moved, changed
+
+
+def transition_orders(order_ids, state, user_id=None, shop_id=None, sender=None):
+    """
+    Переводим части заказов магазина shop_id (персонал - все части) в статус state.
+    Возвращаем (id заказов с переведенными частями, ошибки по id заказа)
+    """
+    if state not in PARTNER_STATES:
+        raise TransitionError(f'Недопустимый статус: {state}')
+    sources = source_states(state)
+    order_ids = set(order_ids)
+    orders = Order.objects.filter(id__in=order_ids).exclude(state='basket')
+    parts = ShopOrder.objects.filter(order_id__in=order_ids)
+    if shop_id is not None:
+        orders = orders.filter(Exists(ShopOrder.objects.filter(order_id=OuterRef('pk'), shop_id=shop_id)))
+        parts = parts.filter(shop_id=shop_id)
+
+    with transaction.atomic():
+        # заказ блокируется целиком: его статус пересчитывается по всем частям
+        current = {order_id: (from_state, owner_id) for order_id, from_state, owner_id in
+                   orders.select_for_update().order_by('id').values_list('id', 'state', 'user_id')}
+        errors = {order_id: 'Заказ не найден' for order_id in order_ids - current.keys()}
+        part_states = {}
+        for order_id, part_state in parts.filter(order_id__in=current).values_list('order_id', 'state'):
+            part_states.setdefault(order_id, []).append(part_state)
+        for order_id in current:
+            states = part_states.get(order_id, [])
+            if not any(part_state in sources for part_state in states):
+                from_state = order_state(states) if states else current[order_id][0]
+                errors[order_id] = f'Переход из статуса "{STATE_NAMES[from_state]}" ' \
+                                   f'в "{STATE_NAMES[state]}" недоступен'
+        movable = {order_id: from_state for order_id, (from_state, _) in current.items() if order_id not in errors}
+        if not movable:
+            return [], errors
+
+        moved, changed = move_shop_orders(movable, state, user_id, shop_id, sources)
+        # одно письмо покупателю на пачку заказов, сменивших статус, в очередь в той же транзакции
+        for new_state, changed_ids in changed.items():
+            orders_by_user = {}
+            for order_id in changed_ids:
+                orders_by_user.setdefault(current[order_id][1], []).append(order_id)
+            orders_state_changed.send(sender=sender, state=new_state, orders=orders_by_user)
+    return sorted(moved), errors
@@ -0,0 +1,45 @@
+import pytest
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from shop_backend.models import User, Shop
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    user = User.objects.create_user(email='shop@store.ru', password='jskdjdn2421234564$hhv', type='shop')
+    Shop.objects.create(user=user, name='Store', state=True)
+    return user
+
+
+@pytest.fixture
+def headers(user):
+    return {'Authorization': 'Token ' + Token.objects.create(user=user).key}
+
+
+@pytest.mark.django_db
+def test_cached_token_authentication(client, headers, user, django_assert_num_queries):
+    assert client.get('/api/v1/partner/state', headers=headers).json()['state'] is True
+    with django_assert_num_queries(0):
+        assert client.get('/api/v1/partner/state', headers=headers).json()['name'] == 'Store'
+
+    client.post('/api/v1/partner/state', headers=headers, data={'state': 'false'})
+    assert client.get('/api/v1/partner/state', headers=headers).json()['state'] is False
+
+    client.post('/api/v1/user/details', headers=headers, data={'company': 'Ecoles'})
+    assert client.get('/api/v1/user/details', headers=headers).json()['company'] == 'Ecoles'
+
+    user.is_active = False
+    user.save()
+    assert client.get('/api/v1/partner/state', headers=headers).status_code == 401
+
+
+@pytest.mark.django_db
+def test_cached_token_deleted(client, headers, user):
+    assert client.get('/api/v1/user/details', headers=headers).status_code == 200
+    Token.objects.filter(user=user).delete()
+    assert client.get('/api/v1/user/details', headers=headers).status_code == 401
@@ -0,0 +1,164 @@
+import gzip
+import json
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+from rest_framework.test import APIClient
+from yaml import load as yaml_load, Loader
+from shop_backend.importer import CatalogImporter
+from shop_backend import search
+from shop_backend.history import record_history
+from shop_backend.models import User, Shop, Category, Product, ProductInfo
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(email='shop@store.ru', password='jskdjdn2421234564$hhv', type='shop')
+
+
+@pytest.fixture
+def headers(user, client):
+    response = client.post('/api/v1/user/login', data={'email': user.email, 'password': 'jskdjdn2421234564$hhv'})
+    return {'Authorization': 'Token ' + response.json()['Token']}
+
+
+@pytest.fixture
+def shop(user):
+    return Shop.objects.create(user_id=user.id, name='Store', state=True)
+
+
+@pytest.fixture
+def products(shop):
+    category = Category.objects.create(name='smart')
+    product = Product.objects.create(name='phone', category=category)
+    return [ProductInfo.objects.create(model=f'model {index}', product=product, shop=shop, quantity=5,
+                                       external_id=index, price=1000 + index, price_rrc=1100)
+            for index in range(5)]
+
+
+@pytest.mark.django_db
+def test_product_keyset_pagination(client, shop, products):
+    response = client.get('/api/v1/product', {'shop_id': shop.id, 'limit': 2})
+    data = response.json()
+    ids = [item['id'] for item in data['results']]
+    while data['next']:
+        data = client.get(data['next']).json()
+        assert len(data['results']) <= 2
+        ids += [item['id'] for item in data['results']]
+    assert ids == sorted(info.id for info in products)
+
+
+@pytest.mark.django_db
+def test_product_cache_invalidation(client, headers, shop, products, django_assert_num_queries):
+    client.get('/api/v1/product', {'shop_id': shop.id})
+    with django_assert_num_queries(0):
+        response = client.get('/api/v1/product', {'shop_id': shop.id})
+    assert len(response.json()['results']) == len(products)
+
+    client.post('/api/v1/partner/state', headers=headers, data={'state': 'false'})
+    assert client.get('/api/v1/product', {'shop_id': shop.id}).json()['results'] == []
+
+
+@pytest.fixture
+def imported_shop(shop):
+    with open('shop1.yaml') as f:
+        price_list = yaml_load(f, Loader=Loader)
+    CatalogImporter(shop).run(price_list['categories'], price_list['goods'])
+    return shop
+
+
+@pytest.mark.django_db
+def test_product_search(client, imported_shop):
+    data = client.get('/api/v1/product/search', {'q': 'смартфоны красный'}).json()
+    assert [item['product']['name'] for item in data['results']] == ['Смартфон Apple iPhone XR 256GB (красный)']
+
+    data = client.get('/api/v1/product/search', {'q': 'iPhone XR', 'parameter': 'Цвет:черный'}).json()
+    assert len(data['results']) == 1
+    assert data['facets']['Цвет'] == [{'value': 'черный', 'count': 1}]
+
+    data = client.get('/api/v1/product/search', {'price_max': 65000, 'limit': 2}).json()
+    assert len(data['results']) == 2
+    assert data['next'] == 2
+    assert {facet['value']: facet['count'] for facet in data['facets']['Встроенная память (Гб)']} == {'256': 3}
+    for params in ({'offset': -1}, {'limit': 0}):
+        assert client.get('/api/v1/product/search', params).status_code == 400
+
+
+@pytest.mark.django_db
+def test_search_facet_values_limit(client, imported_shop, monkeypatch):
+    facets = client.get('/api/v1/product/search').json()['facets']
+    monkeypatch.setattr(search, 'FACET_VALUES_LIMIT', 1)
+    # база отдает только самое частое значение каждого параметра
+    assert client.get('/api/v1/product/search').json()['facets'] == {
+        name: values[:1] for name, values in facets.items()}
+
+
+@pytest.mark.django_db
+def test_async_product_search(client, imported_shop):
+    for params in ({'q': 'iPhone XR', 'parameter': 'Цвет:черный'}, {'price_max': 65000, 'limit': 2}):
+        response = client.get('/api/v1/product/search/async', params)
+        assert response.status_code == 200
+        assert response.json() == client.get('/api/v1/product/search', params).json()
+    assert client.get('/api/v1/product/search/async', {'limit': 'all'}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_directory_conditional_get(client, shop, products, django_assert_num_queries):
+    response = client.get('/api/v1/categories')
+    assert response.status_code == 200
+    assert response.json()['count'] == 1
+    etag = response['ETag']
+
+    with django_assert_num_queries(0):
+        assert client.get('/api/v1/categories', HTTP_IF_NONE_MATCH=etag).status_code == 304
+        assert client.get('/api/v1/categories', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code == 304
+        assert client.get('/api/v1/categories').json()['count'] == 1
+
+    Category.objects.create(name='tablets')
+    response = client.get('/api/v1/categories', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.json()['count'] == 2
+
+
+@pytest.mark.django_db
+def test_directory_full_gzip(client, shop):
+    response = client.get('/api/v1/shops', {'full': 'true'}, HTTP_ACCEPT_ENCODING='gzip')
+    assert response['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.content)) == [{'id': shop.id, 'name': 'Store', 'state': True}]
+    plain = client.get('/api/v1/shops', {'full': 'true'})
+    assert not plain.has_header('Content-Encoding')
+    assert plain['ETag'] != response['ETag']
+
+
+@pytest.mark.django_db
+def test_price_history_api(client, headers, shop, products):
+    start = timezone.now() - timedelta(days=3)
+    for day in range(3):
+        for info in products:
+            info.price += 10
+        record_history(products, now=start + timedelta(days=day))
+
+    at = (start + timedelta(days=1, hours=1)).isoformat()
+    data = client.get(f'/api/v1/product/{products[0].id}/history', {'at': at}).json()
+    assert (data['product_info'], data['price']) == (products[0].id, 1020)
+    assert client.get(f'/api/v1/product/{products[0].id}/history', {'at': start.isoformat()}).json()['price'] == 1010
+    assert client.get(f'/api/v1/product/{products[0].id}/history',
+                      {'at': (start - timedelta(days=1)).isoformat()}).status_code == 404
+
+    window = {'since': (start + timedelta(days=1)).isoformat(), 'until': (start + timedelta(days=2)).isoformat(),
+              'limit': 3}
+    url = f'/api/v1/shops/{shop.id}/history'
+    assert client.get(url, window).status_code == 403
+    first = client.get(url, window, headers=headers).json()
+    second = client.get(url, dict(window, cursor=first['next']), headers=headers).json()
+    assert second['next'] is None
+    assert [row['product_info'] for row in first['results'] + second['results']] == [info.id for info in products]
+    assert {row['price'] for row in first['results']} == {1020 + index for index in range(3)}
+    assert client.get(url, {}, headers=headers).status_code == 400
+    assert client.get(url, dict(window, limit=0), headers=headers).status_code == 400
@@ -0,0 +1,23 @@
+import pytest
+from django.core.cache import cache
+from shop_backend.authentication import local_cache
+from shop_backend.parameters import forget_parameters
+from shop_backend.throttling import buckets
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    local_cache.clear()
+    forget_parameters()
+    buckets.clear()
+    yield
+    cache.clear()
+    local_cache.clear()
+    forget_parameters()
+    buckets.clear()
+
+
+@pytest.fixture(autouse=True)
+def query_budget_raise(settings):
+    settings.QUERY_BUDGET_RAISE = True
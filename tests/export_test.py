@@ -0,0 +1,123 @@
+import csv
+import gzip
+import io
+
+import pytest
+import ujson
+from django.core.management import call_command
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from shop_backend import export
+from shop_backend.models import User, Shop, Category, Product, Parameter, ProductInfo, ProductParameter, Order, \
+    OrderItem
+from shop_backend.summary import refresh_order_summary, refresh_shop_orders
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+def create_user(email, **kwargs):
+    user = User.objects.create(email=email, is_active=True, **kwargs)
+    return user, {'Authorization': 'Token ' + Token.objects.create(user=user).key}
+
+
+@pytest.fixture
+def catalog():
+    category = Category.objects.create(name='smart')
+    product = Product.objects.create(name='phone', category=category)
+    color, memory = Parameter.objects.create(name='Цвет'), Parameter.objects.create(name='Память')
+    shops, infos = [], []
+    for index in range(2):
+        owner, headers = create_user(f'shop{index}@store.ru', type='shop')
+        shop = Shop.objects.create(user=owner, name=f'Store {index}', state=True)
+        info = ProductInfo.objects.create(model=f'model "{index}", new', product=product, shop=shop, quantity=10,
+                                          external_id=index, price=1000, price_rrc=1200)
+        ProductParameter.objects.create(product_info=info, parameter=color, value='черный')
+        ProductParameter.objects.create(product_info=info, parameter=memory, value='128')
+        shops.append((shop, headers))
+        infos.append(info)
+    buyer, _ = create_user('buyer@mail.ru', type='buyer')
+    orders = Order.objects.bulk_create([Order(user=buyer, state='new'), Order(user=buyer, state='basket')])
+    OrderItem.objects.bulk_create([OrderItem(order=order, product_info=info, shop=info.shop, quantity=2)
+                                   for order in orders for info in infos])
+    refresh_order_summary([order.id for order in orders])
+    refresh_shop_orders([order.id for order in orders])
+    return shops, infos, orders
+
+
+def read_csv(content):
+    return list(csv.DictReader(io.StringIO(content.decode())))
+
+
+@pytest.mark.django_db
+def test_export_orders_csv(client, catalog):
+    shops, infos, orders = catalog
+    response = client.get('/api/v1/export/orders', headers=shops[0][1])
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'text/csv; charset=utf-8'
+    assert response['Content-Disposition'] == 'attachment; filename="orders.csv"'
+    rows = read_csv(b''.join(response.streaming_content))
+    # корзины не выгружаются, магазин видит только свои позиции
+    assert [(int(row['order_id']), int(row['product_info_id'])) for row in rows] == [(orders[0].id, infos[0].id)]
+    assert rows[0]['model'] == 'model "0", new'
+    assert rows[0]['state'] == 'new'
+    # сумма и число позиций - части заказа этого магазина, данных покупателя нет
+    assert list(rows[0]) == list(export.SHOP_ORDER_COLUMNS)
+    assert (rows[0]['total_sum'], rows[0]['items_count']) == ('2000', '1')
+
+
+@pytest.mark.django_db
+def test_export_orders_staff_gzip_ndjson(client, catalog):
+    _, infos, orders = catalog
+    _, headers = create_user('admin@mail.ru', is_staff=True)
+    response = client.get('/api/v1/export/orders', {'output': 'ndjson', 'gzip': 'true'}, headers=headers)
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/gzip'
+    assert response['Content-Disposition'] == 'attachment; filename="orders.ndjson.gz"'
+    lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+    rows = [ujson.loads(line) for line in lines]
+    assert [row['product_info_id'] for row in rows] == [info.id for info in infos]
+    assert set(rows[0]) == set(export.ORDER_COLUMNS)
+    assert rows[0]['total_sum'] == 4000
+
+    response = client.get('/api/v1/export/orders', {'since': '2100-01-01T00:00:00Z'}, headers=headers)
+    assert read_csv(b''.join(response.streaming_content)) == []
+
+
+@pytest.mark.django_db
+def test_export_products(client, catalog):
+    shops, infos, _ = catalog
+    response = client.get('/api/v1/export/products', {'output': 'ndjson'}, headers=shops[1][1])
+    assert response.status_code == 200
+    rows = [ujson.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+    assert [row['id'] for row in rows] == [infos[1].id]
+    assert rows[0]['parameters'] == [{'parameter': 'Цвет', 'value': 'черный'}, {'parameter': 'Память', 'value': '128'}]
+
+
+@pytest.mark.django_db
+def test_export_rejects_buyers_and_bad_params(client, catalog):
+    _, buyer_headers = create_user('other@mail.ru', type='buyer')
+    assert client.get('/api/v1/export/orders', headers=buyer_headers).status_code == 403
+    shop_headers = catalog[0][0][1]
+    assert client.get('/api/v1/export/orders', {'output': 'xml'}, headers=shop_headers).status_code == 400
+    assert client.get('/api/v1/export/orders', {'since': 'вчера'}, headers=shop_headers).status_code == 400
+
+
+@pytest.mark.django_db
+def test_export_streams_in_chunks(catalog, monkeypatch):
+    monkeypatch.setattr(export, 'BUFFER_SIZE', 16)
+    chunks = list(export.export(export.PRODUCT_COLUMNS, export.product_rows(), 'csv', compress=True))
+    assert len(chunks) > 1
+    rows = read_csv(gzip.decompress(b''.join(chunks)))
+    assert [int(row['id']) for row in rows] == [info.id for info in catalog[1]]
+
+
+@pytest.mark.django_db
+def test_export_command(catalog, tmp_path):
+    target = tmp_path / 'products.csv.gz'
+    call_command('export_data', 'products', '--gzip', '--output', str(target), '--shop-id', str(catalog[0][0][0].id))
+    rows = read_csv(gzip.decompress(target.read_bytes()))
+    assert [int(row['id']) for row in rows] == [catalog[1][0].id]
+    assert ujson.loads(rows[0]['parameters'])[0] == {'parameter': 'Цвет', 'value': 'черный'}
@@ -0,0 +1,173 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection, IntegrityError
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from yaml import load as yaml_load, Loader
+from shop_backend.cache import PARAMETERS_VERSION_KEY, bump_version
+from shop_backend.checkout import release_expired_reservations
+from shop_backend.history import price_at
+from shop_backend.importer import CatalogImporter
+from shop_backend.parameters import parameter_ids
+from shop_backend.models import User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, \
+    OrderItem, PriceHistory
+from shop_backend.summary import refresh_shop_orders
+
+
+@pytest.fixture
+def shop():
+    user = User.objects.create_user(email='shop@store.ru', password='jskdjdn2421234564$hhv', type='shop')
+    return Shop.objects.create(user_id=user.id, name='Связной')
+
+
+@pytest.fixture
+def price_list():
+    with open('shop1.yaml') as f:
+        return yaml_load(f, Loader=Loader)
+
+
+@pytest.mark.django_db
+def test_import_catalog(shop, price_list):
+    stats = CatalogImporter(shop, batch_size=2).run(price_list['categories'], price_list['goods'])
+    assert stats['goods'] == len(price_list['goods'])
+    assert ProductInfo.objects.filter(shop=shop).count() == len(price_list['goods'])
+    assert set(Category.objects.filter(shops=shop).values_list('id', flat=True)) == \
+           {item['id'] for item in price_list['categories']}
+    assert Parameter.objects.count() == 4
+    info = ProductInfo.objects.get(shop=shop, external_id=4216292)
+    assert info.product.name == 'Смартфон Apple iPhone XS Max 512GB (золотистый)'
+    assert info.product_parameters.get(parameter__name='Диагональ (дюйм)').value == '6.5'
+
+
+@pytest.mark.django_db
+def test_import_catalog_upsert(shop, price_list):
+    CatalogImporter(shop).run(price_list['categories'], price_list['goods'])
+    price_list['goods'][0]['price'] = 1000
+    price_list['goods'][0]['parameters']['Цвет'] = 'черный'
+    CatalogImporter(shop).run(price_list['categories'], price_list['goods'])
+    assert ProductInfo.objects.filter(shop=shop).count() == len(price_list['goods'])
+    assert Product.objects.count() == len({item['name'] for item in price_list['goods']})
+    info = ProductInfo.objects.get(shop=shop, external_id=price_list['goods'][0]['id'])
+    assert info.price == 1000
+    assert ProductParameter.objects.get(product_info=info, parameter__name='Цвет').value == 'черный'
+
+
+@pytest.mark.django_db
+def test_import_catalog_sync(shop, price_list):
+    CatalogImporter(shop).run(price_list['categories'], price_list['goods'])
+    ids = dict(ProductInfo.objects.filter(shop=shop).values_list('external_id', 'id'))
+    goods = price_list['goods']
+    ordered = ProductInfo.objects.get(id=ids[goods[1]['id']])
+    order = Order.objects.create(user=shop.user, state='basket')
+    OrderItem.objects.create(order=order, product_info=ordered, shop=shop, quantity=1)
+
+    goods[0]['quantity'] = 1
+    goods[2]['parameters']['Цвет'] = 'белый'
+    new_item = dict(goods[3], id=1, parameters={'Цвет': 'серый'})
+    stats = CatalogImporter(shop).run(price_list['categories'], [goods[0], goods[2], goods[3], new_item])
+
+    assert (stats['inserted'], stats['updated'], stats['unchanged'], stats['removed']) == (1, 2, 1, 1)
+    # первичные ключи сохраняются, а позиция из корзины снимается с продажи вместо удаления
+    assert ProductInfo.objects.get(shop=shop, external_id=goods[0]['id']).id == ids[goods[0]['id']]
+    ordered.refresh_from_db()
+    assert ordered.quantity == 0
+    assert OrderItem.objects.filter(order=order).count() == 1
+
+    # уже снятая с продажи позиция при следующем импорте не считается удаленной и не пишется в историю
+    history = PriceHistory.objects.count()
+    stats = CatalogImporter(shop).run(price_list['categories'], [goods[0], goods[2], goods[3], new_item])
+    assert stats['removed'] == 0
+    assert PriceHistory.objects.count() == history
+
+    with pytest.raises(IntegrityError):
+        ProductInfo.objects.create(product=ordered.product, shop=shop, external_id=goods[0]['id'], price=1,
+                                   price_rrc=1, quantity=1)
+
+
+@pytest.mark.django_db
+def test_import_price_history(shop, price_list):
+    goods = price_list['goods']
+    CatalogImporter(shop).run(price_list['categories'], goods)
+    assert PriceHistory.objects.count() == len(goods)
+    ids = dict(ProductInfo.objects.filter(shop=shop).values_list('external_id', 'id'))
+    before = timezone.now()
+    old_price = goods[0]['price']
+
+    # повторный импорт без изменений цен и остатков историю не пополняет
+    goods[1]['model'] = 'new model'
+    CatalogImporter(shop).run(price_list['categories'], goods)
+    assert PriceHistory.objects.count() == len(goods)
+
+    goods[0]['price'] = 1000
+    CatalogImporter(shop).run(price_list['categories'], goods)
+    ordered = ProductInfo.objects.get(id=ids[goods[2]['id']])
+    OrderItem.objects.create(order=Order.objects.create(user=shop.user, state='new'), product_info=ordered, shop=shop,
+                             quantity=1)
+    CatalogImporter(shop).run(price_list['categories'], goods[:2] + goods[3:])
+    assert list(PriceHistory.objects.filter(dt__gt=before).order_by('id').values_list(
+        'product_info_id', 'price', 'quantity')) == [(ids[goods[0]['id']], 1000, goods[0]['quantity']),
+                                                     (ordered.id, ordered.price, 0)]
+
+    assert price_at(ids[goods[0]['id']], before)['price'] == old_price
+    assert price_at(ids[goods[0]['id']], timezone.now())['price'] == 1000
+    assert price_at(ids[goods[0]['id']], before - timedelta(days=1)) is None
+
+
+@pytest.mark.django_db
+def test_reimport_keeps_reserved_stock(shop, price_list):
+    goods = price_list['goods']
+    CatalogImporter(shop).run(price_list['categories'], goods)
+    info = ProductInfo.objects.get(shop=shop, external_id=goods[0]['id'])
+    order = Order.objects.create(user=shop.user, state='new', reserved_until=timezone.now())
+    OrderItem.objects.create(order=order, product_info=info, shop=shop, quantity=1)
+    refresh_shop_orders([order.id])
+    ProductInfo.objects.filter(id=info.id).update(quantity=info.quantity - 1)
+
+    # в прайсе, выгруженном после оформления, поставщик уже списал товар заказа
+    goods[0]['quantity'] = info.quantity - 1
+    CatalogImporter(shop).run(price_list['categories'], goods)
+    assert release_expired_reservations(now=timezone.now() + timedelta(seconds=1)) == 1
+    assert ProductInfo.objects.get(id=info.id).quantity == info.quantity - 1
+
+
+@pytest.mark.django_db
+def test_import_parameter_attributes(shop, price_list, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        CatalogImporter(shop).run(price_list['categories'], price_list['goods'])
+    item = price_list['goods'][0]
+    info = ProductInfo.objects.get(shop=shop, external_id=item['id'])
+    assert info.attributes == [[name, str(value)] for name, value in item['parameters'].items()]
+    assert ProductInfo.objects.filter(attributes__contains=[['Цвет', str(item['parameters']['Цвет'])]]).exists()
+
+    # имена параметров уже в кеше процесса: повторный импорт не ищет их в базе
+    item['parameters']['Цвет'] = 'черный'
+    with CaptureQueriesContext(connection) as queries:
+        CatalogImporter(shop).run(price_list['categories'], price_list['goods'])
+    assert not [query for query in queries if 'FROM "shop_backend_parameter"' in query['sql']]
+    info.refresh_from_db()
+    assert ['Цвет', 'черный'] in info.attributes
+
+    # переименование и удаление имени параметра пересобирают параметры позиций
+    parameter = Parameter.objects.get(name='Цвет')
+    parameter.name = 'Окраска'
+    parameter.save()
+    info.refresh_from_db()
+    assert ['Окраска', 'черный'] in info.attributes
+    parameter.delete()
+    info.refresh_from_db()
+    assert all(name != 'Окраска' for name, _ in info.attributes)
+
+
+@pytest.mark.django_db
+def test_parameter_cache_shared_version(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        color_id = parameter_ids(['Цвет'])['Цвет']
+    assert Parameter.objects.filter(name='Цвет').count() == 1
+    # другой процесс удалил параметр и поднял общую версию: кеш процесса больше не отдает старый id
+    Parameter.objects.filter(id=color_id).delete()
+    bump_version(PARAMETERS_VERSION_KEY)
+    with django_capture_on_commit_callbacks(execute=True):
+        assert parameter_ids(['Цвет'])['Цвет'] == Parameter.objects.get(name='Цвет').id != color_id
+    with pytest.raises(IntegrityError):
+        Parameter.objects.create(name='Цвет')
@@ -0,0 +1,127 @@
+import asyncio
+import io
+from datetime import timedelta
+
+import httpx
+import pytest
+from django.utils import timezone
+from rest_framework.test import APIClient
+from shop_backend import jobs
+from shop_backend.models import User, Shop, ProductInfo, ImportJob
+
+
+class FakeResponse:
+    def __init__(self, path):
+        self.raw = open(path, 'rb')
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.raw.close()
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(email='shop@store.ru', password='jskdjdn2421234564$hhv', type='shop')
+
+
+@pytest.fixture
+def headers(user, client):
+    response = client.post('/api/v1/user/login', data={'email': user.email, 'password': 'jskdjdn2421234564$hhv'})
+    return {'Authorization': 'Token ' + response.json()['Token']}
+
+
+@pytest.mark.django_db
+def test_import_job(client, headers, user, monkeypatch):
+    monkeypatch.setattr(jobs, 'get', lambda url, **kwargs: FakeResponse('shop1.yaml'))
+    response = client.post('/api/v1/product/update', headers=headers, data={'url': 'https://8.8.8.8/'})
+    assert response.status_code == 202
+    job_id = response.json()['Job']
+    assert client.get(f'/api/v1/product/update/{job_id}', headers=headers).json()['state'] == 'queued'
+
+    jobs.run_job(jobs.claim_job())
+
+    status = client.get(f'/api/v1/product/update/{job_id}', headers=headers).json()
+    assert status['state'] == 'done'
+    assert status['rows_processed'] == 4
+    job = ImportJob.objects.get(id=job_id)
+    assert job.heartbeat_at > job.started_at
+    assert status['stats']['inserted'] == 4
+    assert status['duration'] >= 0
+    shop = Shop.objects.get(user=user)
+    assert shop.name == 'Связной'
+    assert ProductInfo.objects.filter(shop=shop).count() == 4
+
+
+@pytest.mark.django_db
+def test_import_job_failed(user, monkeypatch):
+    def fail(url, **kwargs):
+        raise ConnectionError('supplier is down')
+
+    monkeypatch.setattr(jobs, 'get', fail)
+    job = jobs.enqueue_import(user, 'https://8.8.8.8/')
+    jobs.run_job(jobs.claim_job())
+    assert jobs.claim_job() is None
+    job.refresh_from_db()
+    assert job.state == 'failed'
+    assert job.errors == 'supplier is down'
+    assert ImportJob.objects.filter(state='queued').count() == 0
+
+
+@pytest.mark.django_db
+def test_import_catalog_without_shop(user):
+    job = jobs.enqueue_import(user, 'https://8.8.8.8/price.jsonl')
+    with pytest.raises(ValueError, match='shop'):
+        jobs.import_catalog(job, io.BytesIO(b'{"categories": []}\n'))
+    assert not Shop.objects.filter(user=user).exists()
+
+
+@pytest.mark.django_db
+def test_claim_stale_job(user, settings):
+    job = jobs.enqueue_import(user, 'https://8.8.8.8/')
+    assert jobs.claim_job().id == job.id
+    assert jobs.claim_job() is None
+
+    # длинный импорт со свежей отметкой о работе не забирается, даже если начат давно
+    settings.IMPORT_STALE_AFTER = 60
+    ImportJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(hours=2),
+                                               heartbeat_at=timezone.now())
+    assert jobs.claim_job() is None
+
+    # воркер упал, не завершив задачу: по истечении IMPORT_STALE_AFTER ее забирает другой
+    ImportJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(minutes=2))
+    assert jobs.claim_job().id == job.id
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_job_async(user):
+    with open('shop1.yaml', 'rb') as file:
+        catalog = file.read()
+
+    def supplier(request):
+        if request.url.host == 'down.example':
+            return httpx.Response(503)
+        return httpx.Response(200, content=catalog, headers={'Content-Type': 'application/x-yaml'})
+
+    done = jobs.enqueue_import(user, 'https://supplier.example/shop1.yaml')
+    failed = jobs.enqueue_import(user, 'https://down.example/shop1.yaml')
+    client = httpx.AsyncClient(transport=httpx.MockTransport(supplier))
+    asyncio.run(jobs.work_async(once=True, client=client))
+
+    done.refresh_from_db()
+    failed.refresh_from_db()
+    assert done.state == 'done'
+    assert done.stats['inserted'] == 4
+    assert failed.state == 'failed'
+    assert '503' in failed.errors
+    assert ProductInfo.objects.filter(shop__user=user).count() == 4
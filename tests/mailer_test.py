@@ -0,0 +1,69 @@
+import pytest
+from django.core import mail
+from django.utils import timezone
+from rest_framework.test import APIClient
+from shop_backend.mailer import claim_pending, send_pending, MAX_ATTEMPTS
+from shop_backend.models import EmailOutbox, User
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+class BrokenConnection:
+    def open(self):
+        raise ConnectionRefusedError('smtp is down')
+
+    def close(self):
+        pass
+
+
+@pytest.mark.django_db
+def test_registration_email_outbox(client):
+    data = {'first_name': 'Andrey', 'last_name': 'Jun', 'email': 'buyer@mail.ru', 'password': 'jskdjdn2421234564$hhv',
+            'company': 'Ecoles', 'position': 'manager', 'contacts': {}}
+    assert client.post('/api/v1/user/register', data=data).json()['Status'] is True
+    assert len(mail.outbox) == 0
+    message = EmailOutbox.objects.get()
+    assert message.to == ['buyer@mail.ru']
+
+    assert send_pending() == 1
+    assert len(mail.outbox) == 1
+    assert mail.outbox[0].body == User.objects.get(email='buyer@mail.ru').confirm_email_tokens.get().key
+    message.refresh_from_db()
+    assert message.state == 'sent'
+    assert send_pending() == 0
+
+
+@pytest.mark.django_db
+def test_email_outbox_retry():
+    message = EmailOutbox.objects.create(subject='subject', body='body', to=['buyer@mail.ru'])
+    assert send_pending(connection=BrokenConnection()) == 1
+    message.refresh_from_db()
+    assert (message.state, message.attempts) == ('pending', 1)
+    assert message.send_after > timezone.now()
+    assert 'smtp is down' in message.last_error
+    assert send_pending() == 0
+
+    EmailOutbox.objects.filter(id=message.id).update(send_after=timezone.now(), attempts=MAX_ATTEMPTS - 1)
+    send_pending(connection=BrokenConnection())
+    message.refresh_from_db()
+    assert message.state == 'failed'
+    assert len(mail.outbox) == 0
+
+
+@pytest.mark.django_db
+def test_email_outbox_lease():
+    message = EmailOutbox.objects.create(subject='subject', body='body', to=['buyer@mail.ru'])
+    assert [claimed.id for claimed in claim_pending()] == [message.id]
+    message.refresh_from_db()
+    assert (message.state, message.attempts) == ('sending', 1)
+    assert send_pending() == 0
+
+    # воркер упал до отправки: по истечении аренды письмо забирает другой
+    EmailOutbox.objects.filter(id=message.id).update(send_after=timezone.now())
+    assert send_pending() == 1
+    message.refresh_from_db()
+    assert (message.state, message.attempts) == ('sent', 2)
+    assert len(mail.outbox) == 1
@@ -0,0 +1,61 @@
+import pytest
+from django.db import connection, OperationalError
+from rest_framework.test import APIClient
+from shop_backend.middleware import QueryBudgetExceeded
+from shop_backend.models import User
+from shop_backend.postgresql_pool.base import DatabaseWrapper, close_pools
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def headers(client):
+    user = User.objects.create_user(email='buyer@mail.ru', password='jskdjdn2421234564$hhv', is_active=True)
+    response = client.post('/api/v1/user/login', data={'email': user.email, 'password': 'jskdjdn2421234564$hhv'})
+    return {'Authorization': 'Token ' + response.json()['Token']}
+
+
+@pytest.mark.django_db
+def test_query_budget(client, headers, settings, caplog):
+    settings.DEBUG = True
+    response = client.get('/api/v1/basket', headers=headers)
+    assert response['Server-Timing'].startswith('db;dur=')
+
+    settings.QUERY_BUDGET = 0
+    settings.QUERY_BUDGET_RAISE = False
+    client.get('/api/v1/basket', headers=headers)
+    assert 'GET /api/v1/basket' in caplog.text
+
+    settings.QUERY_BUDGET_RAISE = True
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/api/v1/basket', headers=headers)
+
+    # изменяющий запрос уже зафиксирован - только предупреждение
+    caplog.clear()
+    response = client.post('/api/v1/basket', data={'items': '[{"product_info": 1, "quantity": 1}]'}, headers=headers)
+    assert response.status_code != 500
+    assert 'POST /api/v1/basket' in caplog.text
+
+
+@pytest.mark.django_db
+def test_connection_pool():
+    settings_dict = {**connection.settings_dict, 'POOL_SIZE': 1, 'POOL_TIMEOUT': 0.1}
+    first, second = DatabaseWrapper(settings_dict), DatabaseWrapper(settings_dict)
+    try:
+        first.ensure_connection()
+        raw = first.connection
+        with pytest.raises(OperationalError):
+            second.ensure_connection()
+        first.close()
+
+        second.ensure_connection()
+        assert second.connection is raw
+        with second.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            assert cursor.fetchone() == (1,)
+        second.close()
+    finally:
+        close_pools()
@@ -166,7 +166,7 @@ def test_get_categories(category_factory, client):
 def test_ProductInfoView(client, shop, category, product, productinfo):
     response = client.get('/api/v1/product', kwargs={'shop_id': productinfo.shop_id,
                                                      'category_id': category.id})
-    data = response.json()
+    data = response.json()['results']
     assert productinfo.model == data[0]['model']
     assert productinfo.quantity == data[0]['quantity']
 
@@ -175,7 +175,7 @@ def test_ProductInfoView(client, shop, category, product, productinfo):
 def test_BasketView(token_return, order, client, shop, productinfo):
     response_get_1 = client.get('/api/v1/basket', headers=token_return)
     res_get_1 = response_get_1.json()
-    assert res_get_1[0]['total_sum'] is None
+    assert res_get_1[0]['total_sum'] == 0
     data = {"items": ujson.dumps([{"order": order.id, "product_info": productinfo.id, "shop": shop.id, "quantity": 5}])}
     response_post = client.post('/api/v1/basket', headers=token_return, data=data)
     res_post = response_post.json()
@@ -184,16 +184,17 @@ def test_BasketView(token_return, order, client, shop, productinfo):
     response_get = client.get('/api/v1/basket', headers=token_return)
     res_get = response_get.json()
     assert res_get[0]['ordered_items'][0]['quantity'] == ujson.loads(data["items"])[0]['quantity']
-    data_2 = {"items": ujson.dumps([{"id": order.id, "product_info": productinfo.id, "shop": shop.id, "quantity": 2}])}
+    item_id = res_get[0]['ordered_items'][0]['id']
+    data_2 = {"items": ujson.dumps([{"id": item_id, "product_info": productinfo.id, "shop": shop.id, "quantity": 2}])}
     response_put = client.put('/api/v1/basket', headers=token_return, data=data_2)
     res_put = response_put.json()
     assert res_put['Status'] is True
     assert res_put['Обновлено позиций'] == len(ujson.loads(data_2["items"]))
-    data_3 = {"items": f"{order.id}"}
+    data_3 = {"items": f"{item_id}"}
     response_delete = client.delete('/api/v1/basket', headers=token_return, data=data_3)
     res_del = response_delete.json()
     assert res_del['Status'] is True
-    assert res_del['Удалено  позиций'] == len(data_3["items"])
+    assert res_del['Удалено  позиций'] == len(data_3["items"].split(','))
 
 
 @pytest.mark.django_db
@@ -253,7 +254,7 @@ def test_ContactView(client, token_return):
 
 @pytest.mark.django_db(transaction=True)
 def test_OrderView(client, token_return, order_item, contact):
-    data1 = {'id': str(order_item.id), 'contact': contact.id}
+    data1 = {'id': str(order_item.order_id), 'contact': contact.id}
     response_post = client.post('/api/v1/order', headers=token_return, data=data1)
     res_post = response_post.json()
     assert res_post['Status'] is True
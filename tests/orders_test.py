@@ -0,0 +1,312 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pytest
+import ujson
+from django.db import connection, IntegrityError
+from django.utils import timezone
+from rest_framework.test import APIClient
+from shop_backend.basket import resolve_basket
+from shop_backend.checkout import release_expired_reservations
+from shop_backend.models import User, Shop, Category, Product, ProductInfo, Contact, Order, OrderItem, \
+    OrderTransition, EmailOutbox, ShopOrder
+from shop_backend.summary import refresh_shop_orders
+from shop_backend.workflow import transition_orders
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(email='buyer@mail.ru', password='jskdjdn2421234564$hhv', type='buyer')
+
+
+@pytest.fixture
+def headers(user, client):
+    response = client.post('/api/v1/user/login', data={'email': user.email, 'password': 'jskdjdn2421234564$hhv'})
+    return {'Authorization': 'Token ' + response.json()['Token']}
+
+
+@pytest.fixture
+def contact(user):
+    return Contact.objects.create(user=user, city='Moskow', street='Lenin', house=7, phone='+7777777777')
+
+
+@pytest.fixture
+def shop():
+    user = User.objects.create_user(email='shop@store.ru', password='jskdjdn2421234564$hhv', type='shop')
+    return Shop.objects.create(user=user, name='Store', state=True)
+
+
+@pytest.fixture
+def products(shop):
+    category = Category.objects.create(name='smart')
+    product = Product.objects.create(name='phone', category=category)
+    return [ProductInfo.objects.create(model=f'model {index}', product=product, shop=shop, quantity=10,
+                                       external_id=index, price=1000 * (index + 1), price_rrc=5000)
+            for index in range(3)]
+
+
+def add_to_basket(client, headers, shop, items):
+    data = {'items': ujson.dumps([{'product_info': info.id, 'shop': shop.id, 'quantity': quantity}
+                                  for info, quantity in items])}
+    return client.post('/api/v1/basket', headers=headers, data=data).json()
+
+
+@pytest.mark.django_db
+def test_order_summary_frozen_at_checkout(client, headers, contact, shop, products):
+    add_to_basket(client, headers, shop, [(products[0], 2), (products[1], 1)])
+    basket = client.get('/api/v1/basket', headers=headers).json()[0]
+    assert (basket['total_sum'], basket['items_count']) == (4000, 2)
+
+    response = client.post('/api/v1/order', headers=headers, data={'id': str(basket['id']), 'contact': contact.id})
+    assert response.json()['Status'] is True
+    ProductInfo.objects.filter(id=products[0].id).update(price=99999)
+
+    order = client.get('/api/v1/order', headers=headers).json()[0]
+    assert order['total_sum'] == 4000
+    assert {item['product_info']: item['price'] for item in order['ordered_items']} == \
+           {products[0].id: 1000, products[1].id: 2000}
+    assert order['ordered_items'][0]['product_name'] == 'phone'
+    assert Order.objects.get(id=basket['id']).state == 'new'
+
+
+@pytest.fixture
+def shop_headers(shop, client):
+    response = client.post('/api/v1/user/login', data={'email': shop.user.email, 'password': 'jskdjdn2421234564$hhv'})
+    return {'Authorization': 'Token ' + response.json()['Token']}
+
+
+def place_order(client, headers, contact, shop, items):
+    add_to_basket(client, headers, shop, items)
+    basket = client.get('/api/v1/basket', headers=headers).json()[0]
+    client.post('/api/v1/order', headers=headers, data={'id': str(basket['id']), 'contact': contact.id})
+    return basket['id']
+
+
+@pytest.mark.django_db
+def test_partner_order_feed(client, headers, shop_headers, contact, shop, products):
+    order_ids = [place_order(client, headers, contact, shop, [(products[index], 1)]) for index in range(3)]
+
+    first = client.get('/api/v1/partner/orders', {'limit': 2}, headers=shop_headers)
+    data = first.json()
+    assert [order['id'] for order in data['results']] == order_ids[:2]
+    data = client.get('/api/v1/partner/orders', {'limit': 2, 'cursor': data['next']}, headers=shop_headers).json()
+    assert [order['id'] for order in data['results']] == order_ids[2:]
+    assert data['next'] is None
+
+    not_modified = client.get('/api/v1/partner/orders', {'limit': 2}, headers=shop_headers,
+                              HTTP_IF_NONE_MATCH=first['ETag'])
+    assert not_modified.status_code == 304
+
+    since = Order.objects.get(id=order_ids[0]).dt.isoformat()
+    data = client.get('/api/v1/partner/orders', {'since': since, 'state': 'new'}, headers=shop_headers).json()
+    assert [order['id'] for order in data['results']] == order_ids[1:]
+    assert client.get('/api/v1/partner/orders', {'state': 'sent'}, headers=shop_headers).json()['results'] == []
+    for limit in (0, -1, 'all'):
+        assert client.get('/api/v1/partner/orders', {'limit': limit}, headers=shop_headers).status_code == 400
+
+
+@pytest.mark.django_db
+def test_partner_feed_is_scoped_to_shop(client, headers, shop_headers, contact, shop, products):
+    other_shop = Shop.objects.create(user=User.objects.create(email='other@store.ru', type='shop'), name='Other')
+    other_info = ProductInfo.objects.create(model='other', product=products[0].product, shop=other_shop, quantity=5,
+                                            external_id=100, price=700, price_rrc=900)
+    client.post('/api/v1/basket', headers=headers, data={'items': ujson.dumps([
+        {'product_info': other_info.id, 'quantity': 3}])})
+    # один заказ с товарами двух магазинов раскладывается на две части
+    order_id = place_order(client, headers, contact, shop, [(products[0], 1), (products[1], 2)])
+    assert Order.objects.get(id=order_id).total_sum == 7100
+    assert list(ShopOrder.objects.order_by('shop_id').values_list('order_id', 'shop_id', 'total_sum', 'items_count')) \
+        == [(order_id, shop.id, 5000, 2), (order_id, other_shop.id, 2100, 1)]
+
+    results = client.get('/api/v1/partner/orders', headers=shop_headers).json()['results']
+    assert [(order['id'], order['total_sum'], order['contact']['id']) for order in results] == \
+           [(order_id, 5000, contact.id)]
+    assert {item['shop'] for item in results[0]['ordered_items']} == {shop.id}
+
+
+@pytest.mark.django_db
+def test_basket_batch_mutation(client, headers, shop, products, django_assert_max_num_queries):
+    items = [{'product_info': info.id, 'shop': shop.id, 'quantity': 1} for info in products]
+    with django_assert_max_num_queries(12):
+        response = client.post('/api/v1/basket', headers=headers, data={'items': ujson.dumps(items)}).json()
+    assert response['Создано позиций'] == 3
+
+    bad = [{'product_info': products[0].id, 'quantity': 1}, {'product_info': 0, 'quantity': 1}]
+    response = client.post('/api/v1/basket', headers=headers, data={'items': ujson.dumps(bad)}).json()
+    assert response['Status'] is False
+    assert set(response['Error']) == {'0', '1'}
+
+    unhashable = [{'product_info': [products[0].id], 'quantity': 1}, {'product_info': {}, 'quantity': 1}]
+    response = client.post('/api/v1/basket', headers=headers, data={'items': ujson.dumps(unhashable)}).json()
+    assert response['Error'] == {'0': {'product_info': 'Товар не найден'}, '1': {'product_info': 'Товар не найден'}}
+
+    basket = client.get('/api/v1/basket', headers=headers).json()[0]
+    lines = [{'id': item['id'], 'quantity': 2} for item in basket['ordered_items']]
+    response = client.put('/api/v1/basket', headers=headers, data={'items': ujson.dumps(lines)}).json()
+    assert response['Обновлено позиций'] == 3
+    assert client.get('/api/v1/basket', headers=headers).json()[0]['total_sum'] == 2 * (1000 + 2000 + 3000)
+
+    lines[0]['quantity'] = 0
+    response = client.put('/api/v1/basket', headers=headers, data={'items': ujson.dumps(lines)}).json()
+    assert response['Error'] == {'0': {'quantity': 'Количество должно быть положительным целым числом'}}
+    assert client.get('/api/v1/basket', headers=headers).json()[0]['items_count'] == 3
+
+    response = client.put('/api/v1/basket', headers=headers,
+                          data={'items': ujson.dumps([{'id': [lines[0]['id']], 'quantity': 1}])}).json()
+    assert response['Error'] == {'0': {'id': 'Позиция не найдена в корзине'}}
+
+
+@pytest.mark.django_db
+def test_checkout_reserves_stock(client, headers, contact, shop, products):
+    add_to_basket(client, headers, shop, [(products[0], 4), (products[1], 11)])
+    basket_id = client.get('/api/v1/basket', headers=headers).json()[0]['id']
+    response = client.post('/api/v1/order', headers=headers, data={'id': str(basket_id), 'contact': contact.id})
+    assert response.status_code == 409
+    assert Order.objects.get(id=basket_id).state == 'basket'
+    assert ProductInfo.objects.get(id=products[0].id).quantity == 10
+
+    basket = client.get('/api/v1/basket', headers=headers).json()[0]
+    line = next(item for item in basket['ordered_items'] if item['product_info'] == products[1].id)
+    client.put('/api/v1/basket', headers=headers, data={'items': ujson.dumps([{'id': line['id'], 'quantity': 10}])})
+    response = client.post('/api/v1/order', headers=headers, data={'id': str(basket_id), 'contact': contact.id})
+    assert response.json()['Status'] is True
+    assert [info.quantity for info in ProductInfo.objects.filter(id__in=[products[0].id, products[1].id])
+            .order_by('id')] == [6, 0]
+
+    assert release_expired_reservations() == 0
+    assert release_expired_reservations(now=timezone.now() + timedelta(days=2)) == 1
+    assert Order.objects.get(id=basket_id).state == 'canceled'
+    assert ProductInfo.objects.get(id=products[1].id).quantity == 10
+    assert list(OrderTransition.objects.filter(order_id=basket_id, shop=None).values_list(
+        'from_state', 'to_state', 'user_id')) == [('basket', 'new', contact.user_id), ('new', 'canceled', None)]
+    assert ShopOrder.objects.get(order_id=basket_id).state == 'canceled'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_single_basket_under_concurrency(user):
+    barrier = threading.Barrier(8)
+
+    def resolve():
+        try:
+            barrier.wait()
+            return resolve_basket(user.id)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(8) as executor:
+        basket_ids = list(executor.map(lambda _: resolve(), range(8)))
+    assert len(set(basket_ids)) == 1
+    assert list(Order.objects.filter(user=user, state='basket').values_list('id', flat=True)) == basket_ids[:1]
+    with pytest.raises(IntegrityError):
+        Order.objects.create(user=user, state='basket')
+
+
+@pytest.mark.django_db
+def test_partner_bulk_transitions(client, user, contact, shop, products):
+    response = client.post('/api/v1/user/login', data={'email': 'shop@store.ru', 'password': 'jskdjdn2421234564$hhv'})
+    shop_headers = {'Authorization': 'Token ' + response.json()['Token']}
+    orders = [Order.objects.create(user=user, contact=contact, state='new') for _ in products]
+    OrderItem.objects.bulk_create([OrderItem(order=order, product_info=info, shop=shop, quantity=2)
+                                   for order, info in zip(orders, products)])
+    other_shop = Shop.objects.create(user=User.objects.create(email='other@store.ru', type='shop'), name='Other')
+    foreign = Order.objects.create(user=user, state='new')
+    OrderItem.objects.create(order=foreign, product_info=products[0], shop=other_shop, quantity=1)
+    refresh_shop_orders([order.id for order in orders + [foreign]])
+    EmailOutbox.objects.all().delete()
+
+    def move(order_list, state):
+        return client.post('/api/v1/partner/orders', headers=shop_headers,
+                           data={'orders': ','.join(str(order.id) for order in order_list), 'state': state}).json()
+
+    result = move(orders[:2], 'confirmed')
+    assert result['Status'] is True and result['Обновлено заказов'] == 2
+    # покупатель получает одно письмо на пачку
+    message = EmailOutbox.objects.get()
+    assert message.to == [user.email]
+    assert f'заказ №{orders[0].id}' in message.body and f'заказ №{orders[1].id}' in message.body
+
+    result = move([orders[0], orders[2], foreign], 'assembled')
+    assert result['Обновлено заказов'] == 1
+    assert set(result['Errors']) == {str(orders[2].id), str(foreign.id)}
+
+    result = move(orders, 'canceled')
+    assert result['Обновлено заказов'] == 3
+    assert [info.quantity for info in ProductInfo.objects.order_by('id')] == [12, 12, 12]
+    assert move(orders[:1], 'delivered')['Обновлено заказов'] == 0
+    assert client.post('/api/v1/partner/orders', headers=shop_headers,
+                       data={'orders': str(orders[0].id), 'state': 'basket'}).status_code == 400
+
+    assert list(Order.objects.filter(id__in=[order.id for order in orders]).order_by('id').values_list(
+        'state', flat=True)) == ['canceled'] * 3
+    assert list(OrderTransition.objects.filter(order=orders[0], shop=shop).values_list('from_state', 'to_state')) == [
+        ('new', 'confirmed'), ('confirmed', 'assembled'), ('assembled', 'canceled')]
+    assert Order.objects.get(id=foreign.id).state == 'new'
+
+
+@pytest.mark.django_db
+def test_order_state_follows_shop_orders(user, contact, shop, products):
+    other_shop = Shop.objects.create(user=User.objects.create(email='other@store.ru', type='shop'), name='Other')
+    other_info = ProductInfo.objects.create(model='other', product=products[0].product, shop=other_shop,
+                                            quantity=10, external_id=1, price=500, price_rrc=500)
+    order = Order.objects.create(user=user, contact=contact, state='new', reserved_until=timezone.now())
+    OrderItem.objects.bulk_create([OrderItem(order=order, product_info=products[0], shop=shop, quantity=2),
+                                   OrderItem(order=order, product_info=other_info, shop=other_shop, quantity=3)])
+    refresh_shop_orders([order.id])
+
+    def states():
+        order.refresh_from_db()
+        return order.state, dict(ShopOrder.objects.filter(order=order).values_list('shop_id', 'state'))
+
+    # заказ продвигается, когда до статуса дошли все его части
+    assert transition_orders([order.id], 'confirmed', shop_id=shop.id)[0] == [order.id]
+    assert states() == ('new', {shop.id: 'confirmed', other_shop.id: 'new'})
+    assert transition_orders([order.id], 'assembled', shop_id=other_shop.id)[1] == {
+        order.id: 'Переход из статуса "Новый" в "Собран" недоступен'}
+    transition_orders([order.id], 'confirmed', shop_id=other_shop.id)
+    assert states() == ('confirmed', {shop.id: 'confirmed', other_shop.id: 'confirmed'})
+    assert order.reserved_until is None
+
+    # отмена части возвращает на склад только ее товар, заказ идет дальше по оставшейся части
+    transition_orders([order.id], 'canceled', shop_id=other_shop.id)
+    assert [ProductInfo.objects.get(id=info.id).quantity for info in (products[0], other_info)] == [10, 13]
+    transition_orders([order.id], 'assembled', shop_id=shop.id)
+    assert states() == ('assembled', {shop.id: 'assembled', other_shop.id: 'canceled'})
+    assert list(OrderTransition.objects.filter(order=order, shop=None).values_list('from_state', 'to_state')) == [
+        ('new', 'confirmed'), ('confirmed', 'assembled')]
+
+    # персонал переводит все подходящие части заказа
+    transition_orders([order.id], 'canceled')
+    assert states() == ('canceled', {shop.id: 'canceled', other_shop.id: 'canceled'})
+    assert ProductInfo.objects.get(id=products[0].id).quantity == 12
+
+
+@pytest.mark.django_db
+def test_partner_transition_keeps_other_shop_lines(client, headers, shop_headers, contact, shop, products):
+    owner = User.objects.create_user(email='other@store.ru', password='jskdjdn2421234564$hhv', type='shop')
+    other_shop = Shop.objects.create(user=owner, name='Other', state=True)
+    other_info = ProductInfo.objects.create(model='other', product=products[0].product, shop=other_shop,
+                                            quantity=10, external_id=1, price=500, price_rrc=500)
+    add_to_basket(client, headers, shop, [(products[0], 2)])
+    add_to_basket(client, headers, other_shop, [(other_info, 3)])
+    order_id = client.get('/api/v1/basket', headers=headers).json()[0]['id']
+    assert client.post('/api/v1/order', headers=headers,
+                       data={'id': str(order_id), 'contact': contact.id}).json()['Status'] is True
+
+    response = client.post('/api/v1/partner/orders', headers=shop_headers,
+                           data={'orders': str(order_id), 'state': 'canceled'}).json()
+    assert response['Status'] is True and response['Обновлено заказов'] == 1
+    # отмена своей части не трогает позиции и резерв другого магазина
+    assert [ProductInfo.objects.get(id=info.id).quantity for info in (products[0], other_info)] == [10, 7]
+    assert dict(ShopOrder.objects.filter(order_id=order_id).values_list('shop_id', 'state')) == {
+        shop.id: 'canceled', other_shop.id: 'new'}
+    assert Order.objects.get(id=order_id).state == 'new'
+    response = client.post('/api/v1/partner/orders', headers=shop_headers,
+                           data={'orders': str(order_id), 'state': 'confirmed'}).json()
+    assert response['Обновлено заказов'] == 0
+    assert ShopOrder.objects.get(order_id=order_id, shop=other_shop).state == 'new'
@@ -0,0 +1,55 @@
+import io
+
+import pytest
+import ujson
+from yaml import load as yaml_load, Loader
+from shop_backend.parsers import YamlCatalogReader, NdjsonCatalogReader, catalog_reader, MAX_ANCHORS, \
+    MAX_ALIAS_NODES
+
+
+def test_yaml_catalog_reader():
+    with open('shop1.yaml') as f:
+        expected = yaml_load(f, Loader=Loader)
+    with open('shop1.yaml', 'rb') as f:
+        reader = YamlCatalogReader(f)
+        header = reader.read_header()
+        assert header == {'shop': expected['shop'], 'categories': expected['categories']}
+        assert list(reader.goods()) == expected['goods']
+        assert reader.header['url'] == expected['url']
+
+
+def test_ndjson_catalog_reader():
+    with open('shop1.yaml') as f:
+        expected = yaml_load(f, Loader=Loader)
+    lines = [ujson.dumps({'shop': expected['shop'], 'categories': expected['categories']})]
+    lines += [ujson.dumps(item) for item in expected['goods']]
+    stream = io.BytesIO('\n'.join(lines).encode())
+    reader = catalog_reader(stream, name='https://store.ru/price.jsonl')
+    assert isinstance(reader, NdjsonCatalogReader)
+    assert reader.read_header()['categories'] == expected['categories']
+    assert list(reader.goods()) == expected['goods']
+
+
+def test_yaml_anchors_limit():
+    goods = ''.join(f'  - &item{index} {{id: {index}}}\n' for index in range(MAX_ANCHORS + 1))
+    reader = YamlCatalogReader(io.StringIO(f'shop: Связной\ncategories: []\ngoods:\n{goods}'))
+    reader.read_header()
+    with pytest.raises(ValueError):
+        list(reader.goods())
+
+    reader = YamlCatalogReader(io.StringIO('shop: Связной\ncategories: []\ngoods:\n  - *missing\n'))
+    with pytest.raises(ValueError):
+        list(reader.goods())
+
+    # каждый уровень удесятеряет раскрытие ссылок: немного якорей дают миллионы узлов
+    levels = [f'l0: &l0 [{", ".join(["x"] * 10)}]']
+    levels += [f'l{level}: &l{level} [{", ".join([f"*l{level - 1}"] * 10)}]' for level in range(1, 7)]
+    reader = YamlCatalogReader(io.StringIO('shop: Связной\ncategories: []\ngoods:\n  - {' + ', '.join(levels) + '}\n'))
+    with pytest.raises(ValueError, match=str(MAX_ALIAS_NODES)):
+        list(reader.goods())
+
+
+def test_yaml_header_after_goods():
+    reader = YamlCatalogReader(io.StringIO('shop: Связной\ngoods:\n  - {id: 1}\ncategories:\n  - {id: 1, name: A}\n'))
+    with pytest.raises(ValueError, match='categories'):
+        reader.read_header()
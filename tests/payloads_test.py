@@ -0,0 +1,50 @@
+import pytest
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from shop_backend.models import User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Contact, \
+    Order, OrderItem
+from shop_backend.payloads import PRODUCT_INFO_FIELDS, ORDER_FIELDS, product_infos, orders, render_json
+from shop_backend.serializers import ProductInfoSerializer, OrderSerializer
+
+
+@pytest.fixture
+def catalog():
+    user = User.objects.create_user(email='shop@store.ru', password='jskdjdn2421234564$hhv', type='shop')
+    shop = Shop.objects.create(user_id=user.id, name='Store', state=True)
+    category = Category.objects.create(name='Смартфоны/телефоны')
+    color = Parameter.objects.create(name='Цвет')
+    size = Parameter.objects.create(name='Диагональ "экрана"')
+    infos = [ProductInfo.objects.create(product=Product.objects.create(name=name, category=category), shop=shop,
+                                        model=model, external_id=index, quantity=index, price=1000 + index,
+                                        price_rrc=1200)
+             for index, (name, model) in enumerate([('Телефон', 'model/1'), ('Phone   line\tbreak', ''),
+                                                    ('Планшет 😀', 'tab\\2')])]
+    ProductParameter.objects.create(product_info=infos[0], parameter=size, value='6.1')
+    ProductParameter.objects.create(product_info=infos[0], parameter=color, value='черный')
+    ProductParameter.objects.create(product_info=infos[2], parameter=color, value='<b>&</b>\u2028')
+    return user, shop, infos
+
+
+@pytest.mark.django_db
+def test_product_infos_match_serializer(catalog):
+    queryset = ProductInfo.objects.order_by('id')
+    expected = JSONRenderer().render(ProductInfoSerializer(
+        queryset.select_related('product__category').prefetch_related(Prefetch(
+            'product_parameters', ProductParameter.objects.select_related('parameter').order_by('id'))),
+        many=True).data)
+    assert render_json(product_infos(queryset.values(*PRODUCT_INFO_FIELDS))) == expected
+
+
+@pytest.mark.django_db
+def test_orders_match_serializer(catalog):
+    user, shop, infos = catalog
+    contact = Contact.objects.create(user=user, city='Москва', street='Тверская/1', phone='+7 900')
+    orders_ = [Order.objects.create(user=user, state='new', contact=contact, total_sum=3000, items_count=2),
+               Order.objects.create(user=user, state='basket')]
+    for info in infos[:2]:
+        OrderItem.objects.create(order=orders_[0], product_info=info, shop=shop, quantity=2,
+                                 product_name=info.product.name, model=info.model, price=info.price)
+    queryset = Order.objects.all()
+    expected = JSONRenderer().render(OrderSerializer(queryset.prefetch_related(
+        Prefetch('ordered_items', OrderItem.objects.order_by('id'))).select_related('contact'), many=True).data)
+    assert render_json(orders(queryset.values(*ORDER_FIELDS))) == expected
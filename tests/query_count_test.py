@@ -0,0 +1,136 @@
+"""
+Регрессионные тесты количества SQL-запросов.
+Каждый эндпоинт вызывается на маленькой и большой выборке из одних и тех же данных: число запросов
+должно совпадать (нет N+1) и не превышать бюджет. Если задан PERF_TIMINGS_FILE, время ответов пишется
+в этот файл под текущим коммитом, чтобы сравнивать тренды между коммитами.
+Объем данных масштабируется переменной окружения PERF_SCALE (по умолчанию 1).
+"""
+import os
+import subprocess
+import time
+
+import pytest
+import ujson
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from benchmarks.catalog import generate_catalog
+from shop_backend.authentication import local_cache
+from shop_backend.importer import CatalogImporter
+from shop_backend.models import User, Shop, ProductInfo, Contact, Order, OrderItem
+from shop_backend.summary import refresh_order_summary, refresh_shop_orders
+
+SCALE = int(os.environ.get('PERF_SCALE', 1))
+SHOPS = 5 * SCALE
+GOODS_PER_SHOP = 400 * SCALE
+ORDERS = 30 * SCALE
+ITEMS_PER_ORDER = 20
+TIMINGS_FILE = os.environ.get('PERF_TIMINGS_FILE')
+
+timings = {}
+
+
+def create_user(email, **kwargs):
+    user = User.objects.create(email=email, is_active=True, **kwargs)
+    return user, {'Authorization': 'Token ' + Token.objects.create(user=user).key}
+
+
+def create_orders(user, contact, infos, count, items_per_order, state='new'):
+    orders = Order.objects.bulk_create([Order(user=user, contact=contact, state=state) for _ in range(count)])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product_info_id=info_id, shop_id=shop_id, quantity=1)
+        for index, order in enumerate(orders)
+        for info_id, shop_id in infos[index * items_per_order:(index + 1) * items_per_order]])
+    refresh_order_summary([order.id for order in orders])
+    if state != 'basket':
+        refresh_shop_orders([order.id for order in orders])
+
+
+@pytest.fixture(scope='module')
+def dataset(django_db_setup, django_db_blocker):
+    """
+    Данные создаются один раз на модуль: большой магазин и покупатель с длинной историей
+    соседствуют с маленькими, поэтому обе выборки снимаются с одной базы. Все создается во внешней
+    транзакции, которая откатывается после тестов модуля; транзакции тестов вложены в нее
+    """
+    with django_db_blocker.unblock(), transaction.atomic():
+        shops = []
+        for index in range(SHOPS):
+            owner, headers = create_user(f'shop{index}@store.ru', type='shop')
+            shop = Shop.objects.create(user=owner, name=f'Магазин {index}', state=True)
+            catalog = generate_catalog(GOODS_PER_SHOP if index else 5, seed=index)
+            CatalogImporter(shop).run(catalog['categories'], catalog['goods'])
+            shops.append((shop, headers))
+        infos = list(ProductInfo.objects.order_by('shop_id', 'id').values_list('id', 'shop_id'))
+        (small_shop, small_shop_headers), (big_shop, big_shop_headers) = shops[0], shops[-1]
+
+        small, small_headers = create_user('small@mail.ru', type='buyer')
+        big, big_headers = create_user('big@mail.ru', type='buyer')
+        for buyer, shop, orders, items in ((small, small_shop, 1, 2), (big, big_shop, ORDERS, ITEMS_PER_ORDER)):
+            shop_infos = [info for info in infos if info[1] == shop.id]
+            contact = Contact.objects.create(user=buyer, city='Москва', street='Ленина', phone='+79990000000')
+            create_orders(buyer, contact, shop_infos, orders, items)
+            create_orders(buyer, None, shop_infos, 1, min(items * 5, len(shop_infos)), state='basket')
+
+        yield {
+            'small': {'shop': small_shop.id, 'shop_headers': small_shop_headers, 'buyer_headers': small_headers,
+                      'limit': 5},
+            'big': {'shop': big_shop.id, 'shop_headers': big_shop_headers, 'buyer_headers': big_headers,
+                    'limit': 200},
+        }
+        transaction.set_rollback(True)
+
+    if TIMINGS_FILE:
+        write_timings(TIMINGS_FILE)
+
+
+def write_timings(path):
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    try:
+        with open(path) as file:
+            history = ujson.load(file)
+    except (OSError, ValueError):
+        history = {}
+    history[commit or 'unknown'] = {'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'scale': SCALE,
+                                    'endpoints': timings}
+    with open(path, 'w') as file:
+        ujson.dump(history, file, indent=2, ensure_ascii=False)
+
+
+# (имя, путь, параметры запроса, чьи заголовки, бюджет запросов)
+ENDPOINTS = [
+    ('products', '/api/v1/product', lambda data: {'shop_id': data['shop'], 'limit': data['limit']}, None, 1),
+    ('products_all', '/api/v1/product', lambda data: {'limit': data['limit']}, None, 1),
+    ('search', '/api/v1/product/search', lambda data: {'shop_id': data['shop'], 'limit': data['limit']}, None, 3),
+    ('categories', '/api/v1/categories', lambda data: {}, None, 2),
+    ('categories_full', '/api/v1/categories', lambda data: {'full': 'true'}, None, 1),
+    ('shops', '/api/v1/shops', lambda data: {}, None, 2),
+    ('shops_full', '/api/v1/shops', lambda data: {'full': 'true'}, None, 1),
+    ('basket', '/api/v1/basket', lambda data: {}, 'buyer_headers', 3),
+    ('orders', '/api/v1/order', lambda data: {}, 'buyer_headers', 3),
+    ('partner_orders', '/api/v1/partner/orders', lambda data: {'limit': data['limit']}, 'shop_headers', 4),
+    ('contacts', '/api/v1/user/contact', lambda data: {}, 'buyer_headers', 2),
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name, path, params, headers, budget', ENDPOINTS, ids=[item[0] for item in ENDPOINTS])
+def test_query_count(dataset, name, path, params, headers, budget):
+    client = APIClient()
+    counts = {}
+    for scale, data in dataset.items():
+        # меряем холодный путь: без кеша ответов и аутентификации
+        cache.clear()
+        local_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(path, params(data), headers=data[headers] if headers else None)
+            elapsed = time.perf_counter() - start
+        assert response.status_code == 200
+        counts[scale] = len(queries)
+        timings.setdefault(name, {})[scale] = {'queries': len(queries), 'seconds': round(elapsed, 4),
+                                               'bytes': len(response.content)}
+    assert counts['small'] == counts['big'], f'{name}: число запросов зависит от объема данных: {counts}'
+    assert counts['big'] <= budget, f'{name}: {counts["big"]} запросов при бюджете {budget}'
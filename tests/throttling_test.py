@@ -0,0 +1,89 @@
+import os
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from shop_backend.models import User, Shop, ImportJob
+from shop_backend.throttling import TokenBuckets
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def shop_headers():
+    user = User.objects.create(email='shop@store.ru', type='shop', is_active=True)
+    Shop.objects.create(user=user, name='Store', state=True)
+    return {'Authorization': 'Token ' + Token.objects.create(user=user).key}
+
+
+def test_token_bucket(tmp_path):
+    buckets = TokenBuckets(tmp_path / 'throttle', maxsize=2)
+    # запас 2 жетона, пополнение 1 жетон в секунду
+    assert buckets.take(['a'], 2, 1.0, now=0) == 0
+    assert buckets.take(['a'], 2, 1.0, now=0) == 0
+    assert buckets.take(['a'], 2, 1.0, now=0.25) == pytest.approx(0.75)
+    assert buckets.take(['a'], 2, 1.0, now=1) == 0
+    # отказ в одной корзине не списывает жетон из другой
+    assert buckets.take(['a', 'b'], 2, 1.0, now=1) > 0
+    assert buckets.take(['b'], 2, 1.0, now=1) == 0
+    assert buckets.take(['b'], 2, 1.0, now=1) == 0
+    # корзина c вытесняет давнюю a, вытесненная корзина снова полна
+    assert buckets.take(['b'], 2, 1.0, now=2) == 0
+    assert buckets.take(['c'], 2, 1.0, now=2) == 0
+    assert buckets.take(['a'], 2, 1.0, now=2) == 0
+    assert buckets.take(['a'], 2, 1.0, now=2) == 0
+
+
+def test_token_bucket_shared(tmp_path):
+    buckets = TokenBuckets(tmp_path / 'throttle', maxsize=16)
+    buckets.take(['a'], 2, 1.0, now=0)
+    # корзины общие для процессов: жетон, взятый дочерним процессом, виден родителю
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if buckets.take(['a'], 2, 1.0, now=0) == 0 else 1)
+    assert os.waitpid(pid, 0)[1] == 0
+    assert buckets.take(['a'], 2, 1.0, now=0) > 0
+
+
+@pytest.mark.django_db
+def test_throttled_endpoint(client, shop_headers, settings):
+    settings.THROTTLE_RATES = dict(settings.THROTTLE_RATES, products='2/min', partner_orders='1/min')
+    assert [client.get('/api/v1/product').status_code for _ in range(3)] == [200, 200, 429]
+    response = client.get('/api/v1/product')
+    assert response.status_code == 429
+    assert 0 < int(response['Retry-After']) <= 30
+    # корзины отдельные у каждого пользователя
+    assert client.get('/api/v1/product', headers=shop_headers).status_code == 200
+
+    assert client.get('/api/v1/partner/orders', headers=shop_headers).status_code == 200
+    assert client.get('/api/v1/partner/orders', headers=shop_headers).status_code == 429
+
+
+@pytest.mark.django_db
+def test_import_admission(client, shop_headers, settings):
+    settings.IMPORT_MAX_ACTIVE = 2
+    response = client.post('/api/v1/product/update', headers=shop_headers, data={'url': 'https://8.8.8.8/'})
+    assert response.status_code == 202
+    response = client.post('/api/v1/product/update', headers=shop_headers, data={'url': 'https://8.8.8.8/'})
+    assert response.status_code == 429
+    assert response['Retry-After'] == str(settings.IMPORT_RETRY_AFTER)
+
+    # глобальный лимит: вместе с выполняющейся задачей другого магазина активных задач уже две
+    other = User.objects.create(email='other@store.ru', type='shop', is_active=True)
+    running = ImportJob.objects.create(user=other, url='https://8.8.8.8/', state='running', started_at=timezone.now(),
+                                     heartbeat_at=timezone.now())
+    third = User.objects.create(email='third@store.ru', type='shop', is_active=True)
+    headers = {'Authorization': 'Token ' + Token.objects.create(user=third).key}
+    response = client.post('/api/v1/product/update', headers=headers, data={'url': 'https://8.8.8.8/'})
+    assert response.status_code == 429
+    assert ImportJob.objects.count() == 2
+
+    # зависшая задача не учитывается
+    ImportJob.objects.filter(id=running.id).update(heartbeat_at=timezone.now() - timedelta(
+        seconds=settings.IMPORT_STALE_AFTER + 1))
+    assert client.post('/api/v1/product/update', headers=headers, data={'url': 'https://8.8.8.8/'}).status_code == 202